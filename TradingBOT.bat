@@ -1,10 +1,18 @@
 @echo off
 cd /d "C:\Users\ARTO3\Documents\Trading\ProyectoBotTrading\executor_mt5"
 
-echo [INFO] Iniciando Trading BOT Executor
+:: MODO=single  -> un executor para el terminal MT5 por defecto
+:: MODO=multi   -> supervisor.py: un worker por cuenta de TERMINALS (ver .env)
+if "%MODO%"=="" set MODO=single
 
-:: Ejecutar mt5_executor.py en nueva ventana
-start "MT5 Executor" py mt5_executor.py
+echo [INFO] Iniciando Trading BOT Executor (modo %MODO%)
+
+if /I "%MODO%"=="multi" (
+    start "MT5 Supervisor" py supervisor.py
+) else (
+    :: Ejecutar mt5_executor.py en nueva ventana
+    start "MT5 Executor" py mt5_executor.py
+)
 
 
 echo [INFO] Ambos procesos se han lanzado. Monitoreando cada 5 segundos.
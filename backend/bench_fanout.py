@@ -0,0 +1,124 @@
+# bench_fanout.py
+"""
+Benchmark del fan-out del /webhook: loop legacy (get_active_counts + insert_order
+por cuenta) vs insert_orders_fanout (INSERT ... SELECT en una sentencia).
+
+Corre contra una base de PRUEBAS (crea/vacía las tablas counts y orders ahí):
+
+    MYSQL_BENCH_DATABASE=trading_bench python bench_fanout.py --sizes 5,50,500,5000
+
+Usa el mismo host/usuario que db.py (MYSQL_* o DB_*).
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+BENCH_DB = os.getenv("MYSQL_BENCH_DATABASE")
+if not BENCH_DB:
+    sys.exit("Define MYSQL_BENCH_DATABASE (base de pruebas, NO la de producción).")
+if BENCH_DB == (os.getenv("MYSQL_DATABASE") or os.getenv("DB_NAME")):
+    sys.exit("MYSQL_BENCH_DATABASE no puede ser la misma base que MYSQL_DATABASE.")
+# db.py lee la base al importarse
+os.environ["MYSQL_DATABASE"] = BENCH_DB
+
+import db  # noqa: E402
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS counts (
+        account_login VARCHAR(32) PRIMARY KEY,
+        enabled TINYINT NOT NULL DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        order_type VARCHAR(64),
+        price DOUBLE,
+        symbol VARCHAR(32),
+        account_login VARCHAR(32),
+        status VARCHAR(20),
+        source_order_id VARCHAR(64) NULL,
+        created_at DATETIME,
+        updated_at DATETIME NULL
+    )
+    """,
+]
+
+
+def _exec(sql, params=None, many=False):
+    conn = db.get_db()
+    try:
+        cur = conn.cursor()
+        if many:
+            cur.executemany(sql, params)
+        else:
+            cur.execute(sql, params)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+def preparar(n_accounts: int):
+    for stmt in SCHEMA:
+        _exec(stmt)
+    _exec("DELETE FROM counts")
+    _exec("DELETE FROM orders")
+    rows = [(f"BENCH{i:06d}", 1) for i in range(n_accounts)]
+    _exec("INSERT INTO counts (account_login, enabled) VALUES (%s, %s)", rows, many=True)
+
+
+def fanout_legacy():
+    accounts = db.get_active_counts()
+    for acc in accounts:
+        db.insert_order("Buy/Compra Normal o Smart", 2400.5, "XAUUSD",
+                        account_login=str(acc), status='pending')
+    return len(accounts)
+
+
+def fanout_bulk():
+    return db.insert_orders_fanout("Buy/Compra Normal o Smart", 2400.5, "XAUUSD", status='pending')
+
+
+def medir(fn, reps: int):
+    tiempos = []
+    filas = 0
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # silencia los [DB] por fila
+            filas = fn()
+        tiempos.append((time.perf_counter() - t0) * 1000.0)
+    return filas, statistics.median(tiempos), max(tiempos)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="5,50,500,5000", help="cantidades de cuentas activas")
+    ap.add_argument("--reps", type=int, default=5)
+    ap.add_argument("--legacy-max", type=int, default=500,
+                    help="no correr el loop legacy por encima de N cuentas (tarda demasiado)")
+    args = ap.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    print(f"{'cuentas':>8} | {'modo':>7} | {'filas':>6} | {'p50 ms':>9} | {'max ms':>9}")
+    print("-" * 52)
+    for n in sizes:
+        preparar(n)
+        # Calienta el pool para no medir el primer connect
+        db.get_active_counts()
+        modos = [("bulk", fanout_bulk)]
+        if n <= args.legacy_max:
+            modos.insert(0, ("legacy", fanout_legacy))
+        for nombre, fn in modos:
+            filas, p50, mx = medir(fn, args.reps)
+            print(f"{n:>8} | {nombre:>7} | {filas:>6} | {p50:>9.2f} | {mx:>9.2f}")
+    print("\nPool:", db.get_pool_stats())
+
+
+if __name__ == "__main__":
+    main()
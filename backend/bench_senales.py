@@ -0,0 +1,96 @@
+# bench_senales.py
+"""
+Throughput del clasificador de señales (senales.clasificar) sobre un corpus de
+alertas reales de TradingView, contra las dos clasificaciones que existían antes
+(cadena de substrings de main.py y regex sin compilar de main_notify.py, copiadas
+abajo como referencia).
+
+    python bench_senales.py --n 200000
+    python bench_senales.py --vocab 200   # + N señales sintéticas desconocidas
+"""
+import argparse
+import random
+import re
+import time
+import unicodedata
+
+from senales import clasificar
+
+CORPUS = [
+    "Buy/Compra Normal o Smart",
+    "Sell/Venta Normal o Smart",
+    "BUY/COMPRA NORMAL O SMART",
+    "sell/venta normal o smart",
+    "Posible Buy",
+    "Posible Sell",
+    "POSIBLE BUY",
+    "Take Profit Buy TP1",
+    "Take Profit Buy TP2",
+    "Take Profit Sell TP1",
+    "Take Profit Sell TP3",
+    "TAKE PROFIT LONG",
+    "TAKE PROFIT SHORT TP4",
+    "Compra Normal o Smart",
+    "Venta  normal  o  smart",
+    "buy",
+    "sell",
+]
+
+
+# ---------------- Referencias (implementaciones anteriores) ----------------
+def _ref_main(order_type_raw: str) -> str:
+    side_lc = order_type_raw.lower()
+    if "buy/compra normal" in side_lc:
+        return "COMPRA CONFIRMADA"
+    elif "sell/venta normal" in side_lc:
+        return "VENTA CONFIRMADA"
+    elif "posible buy" in side_lc:
+        return "POSIBLE COMPRA"
+    elif "posible sell" in side_lc:
+        return "POSIBLE VENTA"
+    elif "take profit buy" in side_lc or "take profit long" in side_lc:
+        return "TAKE PROFIT BUY"
+    elif "take profit sell" in side_lc or "take profit short" in side_lc:
+        return "TAKE PROFIT SELL"
+    return "SEÑAL"
+
+
+def _ref_notify(signal_raw: str) -> str:
+    t = ''.join(c for c in unicodedata.normalize('NFD', signal_raw) if unicodedata.category(c) != 'Mn')
+    t = re.sub(r'\s+', ' ', t.lower().strip())
+    if re.search(r'^(sell|venta)\s*/?\s*(venta|sell)?\s*normal\s*o\s*smart$', t):
+        return "SELL_NORMAL_SMART"
+    if re.search(r'^(buy|compra)\s*/?\s*(compra|buy)?\s*normal\s*o\s*smart$', t):
+        return "BUY_NORMAL_SMART"
+    return "UNKNOWN"
+
+
+def _medir(nombre, fn, textos):
+    t0 = time.perf_counter()
+    for t in textos:
+        fn(t)
+    secs = time.perf_counter() - t0
+    print(f"{nombre:<34} {len(textos) / secs / 1000:10.1f} k señales/s  {secs / len(textos) * 1e6:7.2f} µs/señal")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200_000)
+    ap.add_argument("--vocab", type=int, default=0, help="señales sintéticas desconocidas extra en el corpus")
+    args = ap.parse_args()
+
+    rnd = random.Random(7)
+    corpus = CORPUS + [f"Alerta custom {i} {rnd.choice(('up', 'down'))}" for i in range(args.vocab)]
+    textos = [rnd.choice(corpus) for _ in range(args.n)]
+    print(f"Corpus: {len(corpus)} textos distintos, {args.n} señales\n")
+
+    _medir("main.py (substrings, anterior)", _ref_main, textos)
+    _medir("main_notify (re sin compilar)", _ref_notify, textos)
+    _medir("senales.clasificar sin cache", clasificar.__wrapped__, textos)
+    clasificar.cache_clear()
+    _medir("senales.clasificar (cache)", clasificar, textos)
+    print(f"\ncache: {clasificar.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
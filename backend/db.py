@@ -1,6 +1,9 @@
 import os
+import threading
 from datetime import datetime
-import mysql.connector
+
+from db_pool import MySQLPool
+from rollups import refrescar_rollups, leer_rollups
 
 try:
     from dotenv import load_dotenv
@@ -17,16 +20,45 @@ MYSQL_USER     = os.getenv("MYSQL_USER")     or os.getenv("DB_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD") or os.getenv("DB_PASS") or os.getenv("DB_PASSWORD")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE") or os.getenv("DB_NAME")
 
+# Pool de conexiones (compartido por todos los helpers y threads del proceso)
+MYSQL_POOL_SIZE      = int(os.getenv("MYSQL_POOL_SIZE", "5"))
+MYSQL_POOL_TIMEOUT   = float(os.getenv("MYSQL_POOL_TIMEOUT", "5"))
+MYSQL_POOL_IDLE_SEC  = float(os.getenv("MYSQL_POOL_IDLE_SEC", "300"))
+MYSQL_POOL_PING_SEC  = float(os.getenv("MYSQL_POOL_PING_SEC", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> MySQLPool:
+    # Perezoso: gunicorn importa en cada worker, el pool nace después del fork
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = MySQLPool(
+                    dict(
+                        host=MYSQL_HOST,
+                        port=MYSQL_PORT,
+                        user=MYSQL_USER,
+                        password=MYSQL_PASSWORD,
+                        database=MYSQL_DATABASE,
+                        # Timeout corto para evitar 502 si la DB no responde
+                        connection_timeout=5,
+                    ),
+                    max_size=MYSQL_POOL_SIZE,
+                    timeout=MYSQL_POOL_TIMEOUT,
+                    idle_timeout=MYSQL_POOL_IDLE_SEC,
+                    ping_interval=MYSQL_POOL_PING_SEC,
+                )
+    return _pool
+
 def get_db():
-    # Timeout corto para evitar 502 si la DB no responde
-    return mysql.connector.connect(
-        host=MYSQL_HOST,
-        port=MYSQL_PORT,
-        user=MYSQL_USER,
-        password=MYSQL_PASSWORD,
-        database=MYSQL_DATABASE,
-        connection_timeout=5,
-    )
+    """ Conexión del pool. conn.close() la devuelve al pool (no la cierra). """
+    return _get_pool().acquire()
+
+def get_pool_stats() -> dict:
+    """ Métricas del pool: checkouts, esperas, tamaño, conexiones en uso/ociosas. """
+    return _get_pool().stats()
 
 # ---------- ORDERS ----------
 def insert_order(order_type, price, symbol, account_login=None, status='pending', source_order_id=None):
@@ -53,18 +85,57 @@ def insert_order(order_type, price, symbol, account_login=None, status='pending'
         except:
             pass
 
-def get_pending_orders(account_login: str):
-    """ Devuelve SOLO las órdenes 'pending' de ESA cuenta (lo usa mt5_executor). """
+def insert_orders_fanout(order_type, price, symbol, status='pending', source_order_id=None) -> int:
+    """
+    Fan-out en UNA sentencia: INSERT ... SELECT sobre counts (enabled=1).
+    Un round trip y un commit por señal, sin importar cuántas cuentas haya.
+    Devuelve cuántas órdenes se insertaron (0 si falla).
+    """
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO orders (order_type, price, symbol, account_login, status, source_order_id, created_at)
+            SELECT %s, %s, %s, c.account_login, %s, %s, NOW()
+              FROM counts c
+             WHERE c.enabled = 1
+            """,
+            (order_type, float(price), symbol, status, source_order_id)
+        )
+        inserted = cur.rowcount
+        conn.commit()
+        print(f"[DB] Fan-out -> {inserted} cuentas {order_type} {symbol} @ {price} (status={status})")
+        return inserted
+    except Exception as e:
+        print(f"[DB ERROR] insert_orders_fanout: {e}")
+        return 0
+    finally:
+        try:
+            cur.close(); conn.close()
+        except:
+            pass
+
+# Columnas que usa el executor (evita SELECT *)
+PENDING_ORDER_COLUMNS = "id, order_type, price, symbol, account_login, created_at"
+
+def get_pending_orders(account_login: str, after_id: int = None):
+    """ Devuelve SOLO las órdenes 'pending' de ESA cuenta; con after_id, solo id > after_id. """
     try:
         conn = get_db()
         cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT *
+        query = f"""
+            SELECT {PENDING_ORDER_COLUMNS}
               FROM orders
              WHERE account_login = %s
                AND status = 'pending'
-             ORDER BY created_at ASC
-        """, (account_login,))
+        """
+        params = [account_login]
+        if after_id is not None:
+            query += " AND id > %s"
+            params.append(int(after_id))
+        query += " ORDER BY id ASC"
+        cur.execute(query, params)
         rows = cur.fetchall()
         return rows
     except Exception as e:
@@ -125,6 +196,7 @@ def registrar_trade_abierto(order_id, ticket, symbol, side, volume, entry_price,
             INSERT INTO trades_log (order_id, ticket, symbol, side, volume, entry_price, tp, sl, open_time, status)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'open')
         """, (order_id, ticket, symbol, side, volume, entry_price, tp, sl, open_time))
+        refrescar_rollups(cur, order_ids=[order_id])
         conn.commit()
         print(f"[DB] Trade ABIERTO ticket {ticket} | {side} {symbol} @ {entry_price}")
     except Exception as e:
@@ -144,6 +216,7 @@ def registrar_trade_cerrado(ticket, exit_price, close_time, comment=""):
                SET exit_price=%s, close_time=%s, status='closed', comment=%s
              WHERE ticket=%s
         """, (exit_price, close_time, comment, ticket))
+        refrescar_rollups(cur, tickets=[ticket])
         conn.commit()
         print(f"[DB] Trade CERRADO ticket {ticket} | exit {exit_price}")
     except Exception as e:
@@ -175,6 +248,26 @@ def get_open_trades(symbol=None, side=None):
         except:
             pass
 
+def get_trades_rollups(agrupar=("symbol", "side"), **filtros):
+    """
+    Resumen de trades_rollup (P&L, win rate, slippage) sumado por `agrupar`.
+    filtros: desde, hasta (YYYY-MM-DD), symbol, side, account. ValueError si la dimensión no existe.
+    """
+    try:
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        return leer_rollups(cur, agrupar, **filtros)
+    except ValueError:
+        raise
+    except Exception as e:
+        print(f"[DB ERROR] get_trades_rollups: {e}")
+        return None
+    finally:
+        try:
+            cur.close(); conn.close()
+        except:
+            pass
+
 # ---------- UTIL ----------
 def get_now_str():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
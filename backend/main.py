@@ -1,8 +1,17 @@
 from flask import Flask, request, jsonify
-import requests
 import os
-import threading
 import json
+import threading
+import time
+from datetime import date, timedelta
+
+from signal_queue import SignalWorkerPool, POLICIES as QUEUE_POLICIES
+from telegram_dispatch import TelegramDispatcher
+from order_notify import OrderNotifier
+from signal_dedup import SignalDedup
+from niveles import niveles_dict
+from senales import clasificar
+from metricas import span, snapshot as metricas_snapshot
 
 app = Flask(__name__)
 
@@ -85,47 +94,41 @@ def _to_float(x):
 
 
 def calcular_tps_sl(price, tps, sl, side="buy"):
-    niveles = {}
-    if side == "buy":
-        for i, tp in enumerate(tps, 1):
-            niveles[f"TP{i}"] = round(price * (1 + tp / 100), 2)
-        niveles["SL"] = round(price * (1 - sl / 100), 2)
-    else:
-        for i, tp in enumerate(tps, 1):
-            niveles[f"TP{i}"] = round(price * (1 - tp / 100), 2)
-        niveles["SL"] = round(price * (1 + sl / 100), 2)
-    return niveles
-
-
-def _send_one_telegram(token: str, chat_id: str, message: str):
-    try:
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        r = requests.post(
-            url,
-            json={"chat_id": chat_id, "text": message, "parse_mode": "HTML"},
-            timeout=10
-        )
-        print(f"[TG] -> chat_id={chat_id} status={r.status_code} resp={r.text[:200]}")
-        return r.json()
-    except Exception as e:
-        print(f"[TG] Error chat_id={chat_id}:", e)
-        return None
+    return niveles_dict(price, tps, sl, side=side)
+
+
+# Despacho de Telegram: un thread por destino, sesión keep-alive, rate limit y reintentos
+TG_PER_CHAT_RATE  = float(os.getenv("TG_PER_CHAT_RATE", "1"))    # msg/seg por chat
+TG_PER_CHAT_BURST = float(os.getenv("TG_PER_CHAT_BURST", "3"))
+TG_GLOBAL_RATE    = float(os.getenv("TG_GLOBAL_RATE", "25"))     # msg/seg por bot
+TG_MAX_RETRIES    = int(os.getenv("TG_MAX_RETRIES", "3"))
+
+_tg_dispatcher = TelegramDispatcher(
+    TELEGRAM_DESTINATIONS,
+    per_chat_rate=TG_PER_CHAT_RATE,
+    per_chat_burst=TG_PER_CHAT_BURST,
+    global_rate=TG_GLOBAL_RATE,
+    max_retries=TG_MAX_RETRIES,
+)
 
 
 def send_telegram_message(message: str):
     """
-    Envía a TODOS los destinos definidos. Si no hay destinos, imprime aviso.
-    Esta función puede llamarse desde un thread de background.
+    Encola el mensaje para TODOS los destinos y vuelve de inmediato.
+    El envío real ocurre en los threads del dispatcher (nunca en el camino de órdenes).
     """
-    if not TELEGRAM_DESTINATIONS:
-        print("[TG] No hay destinos configurados; no se envía.")
-        return None
+    return _tg_dispatcher.enqueue(message)
+
+
+# Long-poll para executors: despiertan apenas hay órdenes nuevas (polling queda como fallback)
+ORDERS_WAIT_TOKEN   = os.getenv("ORDERS_WAIT_TOKEN", "")  # opcional; header X-Orders-Token
+ORDERS_WAIT_MAX_SEC = float(os.getenv("ORDERS_WAIT_MAX_SEC", "25"))
+# Cada long-poll retiene un thread de gunicorn (Procfile: --threads 16); por encima de
+# este tope /orders/wait responde 503 al instante para no dejar sin threads al webhook.
+# 0 = sin tope. OrderNotifier vive en memoria: requiere --workers 1.
+ORDERS_WAIT_MAX_WAITERS = int(os.getenv("ORDERS_WAIT_MAX_WAITERS", "8"))
 
-    results = []
-    for d in TELEGRAM_DESTINATIONS:
-        res = _send_one_telegram(d["token"], d["chat_id"], message)
-        results.append(res)
-    return results
+_order_notifier = OrderNotifier(max_waiters=ORDERS_WAIT_MAX_WAITERS)
 
 
 def _parse_json_from_raw(raw_text: str) -> dict:
@@ -137,6 +140,33 @@ def _parse_json_from_raw(raw_text: str) -> dict:
         return {}
 
 
+def _normalizar_symbol(symbol_in: str) -> str:
+    # "BINANCE:BTCUSD" -> "BTCUSD"; corrige XUAUSD
+    symbol = symbol_in.split(":")[-1].upper()
+    return "XAUUSD" if symbol == "XUAUSD" else symbol
+
+
+def _lado_entrada(order_type_raw: str):
+    """'buy'/'sell' para entradas ejecutables (las que se coalescen); None para el resto."""
+    senal = clasificar(order_type_raw)
+    return senal.side if senal.label in _CONFIRMADAS else None
+
+
+# Entradas Normal/Smart: las únicas con niveles en el mensaje y coalescing
+# (un "buy"/"sell" suelto se reenvía igual, pero sale como SEÑAL, como siempre)
+_CONFIRMADAS = {"BUY_NORMAL_SMART", "SELL_NORMAL_SMART"}
+
+# senal.label -> (emoji, título) del mensaje de Telegram
+_TITULOS = {
+    "BUY_NORMAL_SMART":  ("📈", "COMPRA CONFIRMADA"),
+    "SELL_NORMAL_SMART": ("📉", "VENTA CONFIRMADA"),
+    "POSIBLE_BUY":       ("🟡", "POSIBLE COMPRA"),
+    "POSIBLE_SELL":      ("🟠", "POSIBLE VENTA"),
+    "TP_BUY":            ("🎯", "TAKE PROFIT BUY"),
+    "TP_SELL":           ("🎯", "TAKE PROFIT SELL"),
+}
+
+
 def _process_signal_async(data: dict):
     """Procesa la señal en segundo plano: normaliza, fan-out e informa a Telegram."""
     try:
@@ -147,30 +177,15 @@ def _process_signal_async(data: dict):
         symbol_in      = str((data or {}).get("symbol", "")).strip()
         price          = _to_float((data or {}).get("price", 0))
 
-        # Normaliza símbolo: "BINANCE:BTCUSD" -> "BTCUSD"; corrige XUAUSD
-        symbol = symbol_in.split(":")[-1].upper()
-        if symbol == "XUAUSD":
-            symbol = "XAUUSD"
+        symbol = _normalizar_symbol(symbol_in)
 
         # 2) Telegram (decorativo)
-        side_lc = order_type_raw.lower()
+        with span("signal.classify"):
+            senal = clasificar(order_type_raw)
         niveles = None
-        if "buy/compra normal" in side_lc:
-            niveles = calcular_tps_sl(price, TPS, SL_BUY, side="buy")
-            emoji = "📈"; tipo = "COMPRA CONFIRMADA"
-        elif "sell/venta normal" in side_lc:
-            niveles = calcular_tps_sl(price, TPS, SL_SELL, side="sell")
-            emoji = "📉"; tipo = "VENTA CONFIRMADA"
-        elif "posible buy" in side_lc:
-            emoji = "🟡"; tipo = "POSIBLE COMPRA"
-        elif "posible sell" in side_lc:
-            emoji = "🟠"; tipo = "POSIBLE VENTA"
-        elif "take profit buy" in side_lc or "take profit long" in side_lc:
-            emoji = "🎯"; tipo = "TAKE PROFIT BUY"
-        elif "take profit sell" in side_lc or "take profit short" in side_lc:
-            emoji = "🎯"; tipo = "TAKE PROFIT SELL"
-        else:
-            emoji = "❓"; tipo = "SEÑAL"
+        if senal.label in _CONFIRMADAS:
+            niveles = calcular_tps_sl(price, TPS, SL_BUY if senal.side == "buy" else SL_SELL, side=senal.side)
+        emoji, tipo = _TITULOS.get(senal.label, ("❓", "SEÑAL"))
 
         msg = f"{emoji} <b>{tipo}</b> en {symbol}\n• Precio de entrada: <b>{price}</b>\n"
         if niveles:
@@ -181,26 +196,25 @@ def _process_signal_async(data: dict):
             if "SL" in niveles:
                 msg += f"🛡️ SL: {niveles['SL']}\n"
 
-        # Enviar a todos los destinos (ya estamos en background)
-        send_telegram_message(msg)
+        # Encolar para todos los destinos (no bloquea el fan-out)
+        with span("signal.telegram_enqueue"):
+            send_telegram_message(msg)
 
         # 3) Fan-out a cuentas activas
         if price > 0.0 and symbol and order_type_raw:
             try:
-                from db import insert_order, get_active_counts  # import perezoso
-                active_accounts = get_active_counts()
-                print(f"[WEBHOOK] Cuentas activas: {active_accounts}")
-                inserted = 0
-                for acc_login in active_accounts:
-                    insert_order(
+                from db import insert_orders_fanout  # import perezoso
+                # Una sola sentencia/commit para todas las cuentas activas
+                with span("fanout.insert"):
+                    inserted = insert_orders_fanout(
                         order_type=order_type_raw,
                         price=price,
                         symbol=symbol,
-                        account_login=str(acc_login),
                         status='pending'
                     )
-                    inserted += 1
                 print(f"[WEBHOOK] Órdenes insertadas (fan-out): {inserted}")
+                if inserted:
+                    _order_notifier.bump()  # despierta a los executors en long-poll
             except Exception as e:
                 print(f"[WEBHOOK] Error fan-out:", e)
         else:
@@ -211,20 +225,90 @@ def _process_signal_async(data: dict):
         print("[WEBHOOK] Error en procesamiento async:", e)
 
 
+# Pool fijo de workers + cola acotada para procesar señales (en vez de un thread por request)
+WEBHOOK_WORKERS         = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_MAX       = int(os.getenv("WEBHOOK_QUEUE_MAX", "200"))
+WEBHOOK_QUEUE_POLICY    = os.getenv("WEBHOOK_QUEUE_POLICY", "reject").lower()  # reject | drop_oldest | block
+WEBHOOK_QUEUE_BLOCK_SEC = float(os.getenv("WEBHOOK_QUEUE_BLOCK_SEC", "2"))
+if WEBHOOK_QUEUE_POLICY not in QUEUE_POLICIES:
+    print(f"[WEBHOOK] WEBHOOK_QUEUE_POLICY inválida ({WEBHOOK_QUEUE_POLICY}); uso 'reject'")
+    WEBHOOK_QUEUE_POLICY = "reject"
+
+_signal_pool = SignalWorkerPool(
+    _process_signal_async,
+    workers=WEBHOOK_WORKERS,
+    maxsize=WEBHOOK_QUEUE_MAX,
+    policy=WEBHOOK_QUEUE_POLICY,
+    block_timeout=WEBHOOK_QUEUE_BLOCK_SEC,
+    name="webhook",
+)
+
+
+# Dedup de re-disparos de TradingView antes de encolar (ver signal_dedup.py)
+WEBHOOK_DEDUP_SEC       = float(os.getenv("WEBHOOK_DEDUP_SEC", "10"))      # 0 = sin dedup
+WEBHOOK_DEDUP_PRICE_PCT = float(os.getenv("WEBHOOK_DEDUP_PRICE_PCT", "0.05"))
+WEBHOOK_COALESCE_SEC    = float(os.getenv("WEBHOOK_COALESCE_SEC", "0"))    # 0 = sin coalescing
+WEBHOOK_IDEMPOTENCY_TTL = float(os.getenv("WEBHOOK_IDEMPOTENCY_TTL", "3600"))
+
+_dedup = SignalDedup(
+    window_sec=WEBHOOK_DEDUP_SEC,
+    price_pct=WEBHOOK_DEDUP_PRICE_PCT,
+    coalesce_sec=WEBHOOK_COALESCE_SEC,
+    idempotency_ttl=WEBHOOK_IDEMPOTENCY_TTL,
+)
+
+
+def _claves_dedup(data: dict):
+    """Argumentos de _dedup.check/olvidar para este request; None si el payload está incompleto."""
+    signal = str((data or {}).get("signal", "")).strip()
+    symbol = _normalizar_symbol(str((data or {}).get("symbol", "")).strip())
+    if not signal or not symbol:
+        return None
+    idem = request.headers.get("Idempotency-Key") or request.headers.get("X-Idempotency-Key")
+    return dict(symbol=symbol, signal=signal, price=_to_float((data or {}).get("price", 0)),
+                lado=_lado_entrada(signal), idempotency_key=idem)
+
+
+def _filtrar_repetida(data: dict):
+    """(aceptada, motivo) según el dedup; payloads incompletos pasan (los descarta el worker)."""
+    claves = _claves_dedup(data)
+    if claves is None:
+        return True, "ok"
+    return _dedup.check(**claves)
+
+
 @app.post("/webhook")
 def webhook():
     """Recibe la señal; responde de inmediato y procesa en background (evita 502)."""
+    with span("webhook.receive"):
+        return _webhook()
+
+
+def _webhook():
     try:
-        # ¡IMPORTANTE!: cache=True para NO consumir el stream (lo reutilizamos)
-        raw_text = request.get_data(cache=True, as_text=True)
+        with span("webhook.parse"):
+            # ¡IMPORTANTE!: cache=True para NO consumir el stream (lo reutilizamos)
+            raw_text = request.get_data(cache=True, as_text=True)
+            # Usar primero get_json (si el header viene bien); si no, parsear el raw ya leído
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict) or not data:
+                data = _parse_json_from_raw(raw_text)
         print("[WEBHOOK] raw body:", raw_text)
 
-        # Usar primero get_json (si el header viene bien); si no, parsear el raw ya leído
-        data = request.get_json(silent=True)
-        if not isinstance(data, dict) or not data:
-            data = _parse_json_from_raw(raw_text)
-
-        threading.Thread(target=_process_signal_async, args=(data,), daemon=True).start()
+        with span("webhook.dedup"):
+            aceptada, motivo = _filtrar_repetida(data)
+        if not aceptada:
+            # 200 para que TradingView no reintente; no llega a Telegram, DB ni executors
+            print(f"[WEBHOOK] Señal descartada ({motivo}).")
+            return jsonify({"status": motivo}), 200
+
+        if not _signal_pool.submit(data):
+            # No se encoló: el dedup la olvida, así el reintento del emisor entra
+            claves = _claves_dedup(data)
+            if claves is not None:
+                _dedup.olvidar(**claves)
+            print("[WEBHOOK] Cola llena; señal rechazada (backpressure).")
+            return jsonify({"status": "busy"}), 429
         return jsonify({"status": "ok"}), 200
     except Exception as e:
         print("[WEBHOOK] handler error:", e)
@@ -243,6 +327,100 @@ def healthz():
     return {"ok": True}
 
 
+@app.get("/queue")
+def queue_stats():
+    """Profundidad de cola, workers ocupados y tiempos de procesamiento de señales."""
+    return _signal_pool.stats()
+
+
+@app.get("/metrics")
+def metrics():
+    """Latencias por etapa (p50/p95/p99/max en ms) desde el arranque del proceso."""
+    return metricas_snapshot()
+
+
+@app.get("/dedup")
+def dedup_stats():
+    """Señales aceptadas / descartadas por duplicado, idempotencia o coalescing."""
+    return _dedup.stats()
+
+
+@app.get("/orders/wait")
+def orders_wait():
+    """
+    Long-poll: ?since=<seq>&timeout=<seg>. Responde apenas la secuencia supera `since`
+    (hay órdenes nuevas) o al vencer el timeout. Sin `since` devuelve la secuencia actual.
+    """
+    if ORDERS_WAIT_TOKEN and request.headers.get("X-Orders-Token") != ORDERS_WAIT_TOKEN:
+        return jsonify(ok=False, error="unauthorized"), 401
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify(seq=_order_notifier.seq, changed=False)
+    timeout = request.args.get("timeout", default=ORDERS_WAIT_MAX_SEC, type=float)
+    timeout = max(0.0, min(timeout, ORDERS_WAIT_MAX_SEC))
+    res = _order_notifier.wait(since, timeout)
+    if res is None:
+        # Sin cupo: el executor reintenta con backoff y mientras tanto sigue con su polling
+        resp = jsonify(ok=False, error="too many waiters", seq=_order_notifier.seq, changed=False)
+        resp.headers["Retry-After"] = "5"
+        return resp, 503
+    seq, changed = res
+    return jsonify(seq=seq, changed=changed)
+
+
+# Analytics (trades_rollup, ver rollups.py): lecturas de una tabla chica ya agregada,
+# con cache corta por query para que un dashboard refrescando no llegue a la DB cada vez.
+ANALYTICS_TOKEN        = os.getenv("ANALYTICS_TOKEN", "")
+ANALYTICS_CACHE_SEC    = float(os.getenv("ANALYTICS_CACHE_SEC", "15"))
+ANALYTICS_DEFAULT_DAYS = int(os.getenv("ANALYTICS_DEFAULT_DAYS", "30"))
+_analytics_cache = {}
+_analytics_lock = threading.Lock()
+
+
+@app.get("/analytics")
+def analytics():
+    """
+    P&L, win rate y slippage por ?group=symbol,side (day|account|symbol|side).
+    Filtros: from/to (YYYY-MM-DD; por defecto los últimos ANALYTICS_DEFAULT_DAYS días),
+    symbol, side, account.
+    """
+    if ANALYTICS_TOKEN and request.headers.get("X-Analytics-Token") != ANALYTICS_TOKEN:
+        return jsonify(ok=False, error="unauthorized"), 401
+    agrupar = tuple(g.strip() for g in request.args.get("group", "symbol,side").split(",") if g.strip())
+    desde = request.args.get("from") or (date.today() - timedelta(days=ANALYTICS_DEFAULT_DAYS)).isoformat()
+    filtros = dict(
+        desde=desde,
+        hasta=request.args.get("to"),
+        symbol=request.args.get("symbol"),
+        side=(request.args.get("side") or "").lower() or None,
+        account=request.args.get("account"),
+    )
+    clave = (agrupar, tuple(sorted(filtros.items())))
+    ahora = time.monotonic()
+    with _analytics_lock:
+        hit = _analytics_cache.get(clave)
+    if hit and ahora - hit[0] < ANALYTICS_CACHE_SEC:
+        return jsonify(hit[1])
+    from db import get_trades_rollups  # import perezoso
+    try:
+        filas = get_trades_rollups(agrupar, **filtros)
+    except ValueError as e:
+        return jsonify(ok=False, error=str(e)), 400
+    if filas is None:
+        return jsonify(ok=False, error="db"), 500
+    body = {"ok": True, "group": list(agrupar), "filters": filtros, "rows": filas}
+    with _analytics_lock:
+        if len(_analytics_cache) > 256:
+            _analytics_cache.clear()
+        _analytics_cache[clave] = (ahora, body)
+    return jsonify(body)
+
+
+@app.get("/telegram")
+def telegram_stats():
+    return _tg_dispatcher.stats()
+
+
 @app.get("/dbcheck")
 def dbcheck():
     try:
@@ -253,6 +431,15 @@ def dbcheck():
         return {"db": "error", "msg": str(e)}, 500
 
 
+@app.get("/dbpool")
+def dbpool():
+    try:
+        from db import get_pool_stats  # import perezoso
+        return get_pool_stats()
+    except Exception as e:
+        return {"pool": "error", "msg": str(e)}, 500
+
+
 @app.get("/")
 def index():
     return "ok"
@@ -1,8 +1,10 @@
 # main_notify.py
-import os, json, logging, unicodedata, re
+import os, json, logging
 from flask import Flask, request, jsonify
 import requests
 
+from senales import clasificar
+
 # ==== CONFIG POR ENTORNO ====
 TELEGRAM_TOKEN = os.environ["TELEGRAM_TOKEN"]          # token de @BotFather
 TELEGRAM_CHAT_ID = os.environ["TELEGRAM_CHAT_ID"]      # -100... de tu canal
@@ -16,37 +18,18 @@ logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
 
 # ---------------- Utilidades ----------------
-def _strip_accents(s: str) -> str:
-    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
+# Solo se publican estas etiquetas (ver senales.py para la gramática completa)
+_PUBLICABLES = {"SELL_NORMAL_SMART", "BUY_NORMAL_SMART"}
 
 def classify_signal(signal_raw: str) -> str:
     """
     Devuelve una etiqueta canónica en base a cadenas fijas como:
     - "Sell/Venta Normal o Smart"
     - "Buy/Compra Normal o Smart"
-    (Puedes extender con más patrones si luego los necesitas)
+    (Para sumar TPs u otras, ver senales.clasificar y _PUBLICABLES)
     """
-    if not signal_raw:
-        return "UNKNOWN"
-    t = _strip_accents(signal_raw).lower().strip()
-    # Quitar espacios raros
-    t = re.sub(r'\s+', ' ', t)
-
-    # Coincidencia EXACTA o flexible con separadores "/", " - ", etc.
-    # SELL / VENTA
-    if re.search(r'^(sell|venta)\s*/?\s*(venta|sell)?\s*normal\s*o\s*smart$', t):
-        return "SELL_NORMAL_SMART"
-    # BUY / COMPRA
-    if re.search(r'^(buy|compra)\s*/?\s*(compra|buy)?\s*normal\s*o\s*smart$', t):
-        return "BUY_NORMAL_SMART"
-
-    # Si quieres añadir TPs más adelante, ej.:
-    # if re.search(r'^take\s*profit.*sell', t) or re.search(r'^tp.*sell', t):
-    #     return "TP_SELL"
-    # if re.search(r'^take\s*profit.*buy', t) or re.search(r'^tp.*buy', t):
-    #     return "TP_BUY"
-
-    return "UNKNOWN"
+    label = clasificar(signal_raw or "").label
+    return label if label in _PUBLICABLES else "UNKNOWN"
 
 def send_to_telegram(text: str):
     url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
@@ -0,0 +1,156 @@
+# metricas.py
+"""
+Histogramas de latencia por etapa (el mismo archivo vive en backend/ y en
+executor_mt5/, igual que niveles.py y senales.py).
+
+    from metricas import span, observar
+    with span("fanout.insert"):
+        insert_orders_fanout(...)
+    observar("order_send", ms)
+
+Cada etapa es un histograma de buckets geométricos fijos (≈7% de ancho): registrar
+una muestra es un log + un incremento, sin guardar las muestras. Los percentiles
+salen de los buckets (cota superior del bucket, error ≤ ~7%).
+"""
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+_MIN_MS = 0.001
+_FACTOR = 1.07
+_LOG_FACTOR = math.log(_FACTOR)
+_N_BUCKETS = 400  # 0.001 ms * 1.07^400 ≈ 10 min
+
+
+class Histograma:
+    __slots__ = ("_counts", "count", "total", "max")
+
+    def __init__(self):
+        self._counts = [0] * (_N_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def registrar(self, ms: float):
+        if ms <= _MIN_MS:
+            i = 0
+        else:
+            i = min(_N_BUCKETS, int(math.log(ms / _MIN_MS) / _LOG_FACTOR) + 1)
+        self._counts[i] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentil(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        objetivo = max(1, math.ceil(p / 100.0 * self.count))
+        acumulado = 0
+        for i, c in enumerate(self._counts):
+            acumulado += c
+            if acumulado >= objetivo:
+                return min(self.max, _MIN_MS * _FACTOR ** i)
+        return self.max
+
+    def resumen(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50": round(self.percentil(50), 3),
+            "p95": round(self.percentil(95), 3),
+            "p99": round(self.percentil(99), 3),
+            "max": round(self.max, 3),
+        }
+
+
+class Metricas:
+    """Registro de histogramas por nombre de etapa (ms)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist = {}
+        self.desde = time.time()
+
+    def observar(self, etapa: str, ms: float):
+        with self._lock:
+            h = self._hist.get(etapa)
+            if h is None:
+                h = self._hist[etapa] = Histograma()
+            h.registrar(ms)
+
+    @contextmanager
+    def span(self, etapa: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(etapa, (time.perf_counter() - t0) * 1000.0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            etapas = {k: h.resumen() for k, h in sorted(self._hist.items())}
+        return {"since": self.desde, "unit": "ms", "stages": etapas}
+
+    def reset(self):
+        with self._lock:
+            self._hist.clear()
+            self.desde = time.time()
+
+
+registro = Metricas()
+observar = registro.observar
+span = registro.span
+snapshot = registro.snapshot
+
+
+# ---------------- Exportación (executor: sin Flask) ----------------
+def exportar_archivo(path: str, interval: float = 10.0, fuente=None):
+    """
+    Escribe snapshot() como JSON en `path` cada `interval` s (reemplazo atómico).
+    `fuente` reemplaza a snapshot() (el supervisor exporta el consolidado de sus workers).
+    """
+    fuente = fuente or snapshot
+    def _loop():
+        carpeta = os.path.dirname(os.path.abspath(path))
+        while True:
+            time.sleep(interval)
+            try:
+                fd, tmp = tempfile.mkstemp(dir=carpeta, prefix=".metricas-")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(fuente(), f)
+                os.replace(tmp, path)
+            except Exception as e:
+                print(f"[METRICS] Error exportando a {path}: {e}")
+    threading.Thread(target=_loop, name="metricas-archivo", daemon=True).start()
+
+
+def exportar_http(port: int, host: str = "127.0.0.1", fuente=None):
+    """GET /metrics en host:port con snapshot() (o fuente()) en JSON (solo local por defecto)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    fuente = fuente or snapshot
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = json.dumps(fuente()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, int(port)), _Handler)
+    threading.Thread(target=server.serve_forever, name="metricas-http", daemon=True).start()
+    print(f"[METRICS] http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,99 @@
+# niveles.py
+"""
+Motor único de niveles TP/SL (el mismo archivo vive en backend/ y en executor_mt5/,
+igual que db_pool.py). Calcula todos los niveles de N entradas en una sola pasada
+con NumPy y redondea al tick/dígitos del símbolo en lugar de 2 decimales fijos.
+
+    tps, sl = calcular_niveles([2400.0, 2410.5], ["buy", "sell"], [0.2, 0.5, 1], 0.4, digits=2)
+    tps.shape == (2, 3); sl.shape == (2,)
+
+Modos:
+  - "porcentaje": TP/SL como % del precio de entrada
+  - "pips":       TP/SL como distancia absoluta en precio (lo que hacía calcular_tps)
+"""
+import numpy as np
+
+
+def _es_buy(lados, n):
+    arr = np.asarray(lados)
+    if arr.dtype == bool:
+        return np.broadcast_to(arr, (n,))
+    if arr.ndim == 0:
+        return np.full(n, str(arr).lower() == "buy")
+    return np.char.lower(arr.astype(str)) == "buy"
+
+
+def redondear(valores, digits: int = 2, tick_size: float = None):
+    """Redondea al múltiplo de tick_size (si se da) y luego a `digits` decimales."""
+    v = np.asarray(valores, dtype=float)
+    if tick_size:
+        v = np.round(v / tick_size) * tick_size
+    digits = int(digits)
+    r = np.array(np.round(v, digits), dtype=float)
+    # np.round escala por 10**digits antes de redondear: en un empate (x.xx5) puede caer
+    # del otro lado que round() de Python, que redondea el valor exacto. Esos pocos
+    # se rehacen con round() para dar el mismo nivel que los envoltorios escalares.
+    y = v * 10.0 ** digits
+    empates = np.abs(y - np.floor(y) - 0.5) < 1e-6
+    if empates.any():
+        r[empates] = [round(float(x), digits) for x in v[empates]]
+    return r if r.ndim else r[()]
+
+
+def calcular_niveles(entradas, lados, tps, sl, digits: int = 2, tick_size: float = None,
+                     modo: str = "porcentaje", invertir: bool = False):
+    """
+    entradas: escalar o (N,)
+    lados:    "buy"/"sell" escalar, o (N,) de strings / bools (True = buy)
+    tps:      (K,) mismo schedule para todas, o (N, K) uno por entrada
+    sl:       escalar o (N,); None => sin SL (devuelve NaN)
+    Devuelve (tps (N, K), sl (N,)) ya redondeados.
+    """
+    e = np.atleast_1d(np.asarray(entradas, dtype=float))
+    n = e.shape[0]
+    buy = _es_buy(lados, n)
+    if invertir:
+        buy = ~buy
+    signo = np.where(buy, 1.0, -1.0)
+
+    t = np.asarray(tps, dtype=float)
+    if t.ndim == 1:
+        t = np.broadcast_to(t, (n, t.shape[0]))
+
+    if modo == "pips":
+        tp_lvls = e[:, None] + signo[:, None] * t
+    else:
+        tp_lvls = e[:, None] * (1.0 + signo[:, None] * t / 100.0)
+
+    if sl is None:
+        sl_lvls = np.full(n, np.nan)
+    else:
+        s = np.broadcast_to(np.asarray(sl, dtype=float), (n,))
+        sl_lvls = (e - signo * s) if modo == "pips" else e * (1.0 - signo * s / 100.0)
+
+    return redondear(tp_lvls, digits, tick_size), redondear(sl_lvls, digits, tick_size)
+
+
+# ---------------- Envoltorios escalares (firmas de las funciones viejas) ----------------
+# Para UNA entrada armar arrays cuesta más que el cálculo: se usa la misma fórmula con floats.
+def _redondear_uno(v: float, digits: int, tick_size: float = None) -> float:
+    if tick_size:
+        v = round(v / tick_size) * tick_size
+    return round(v, int(digits))
+
+
+def niveles_porcentaje(price, tps_percent, sl_percent, side="buy", digits: int = 2, tick_size: float = None):
+    """(lista de TPs, SL) para una entrada. Reemplaza mt5_utils.calcular_tps_porcentaje."""
+    price = float(price)
+    signo = 1.0 if side == "buy" else -1.0
+    tps = [_redondear_uno(price * (1.0 + signo * tp / 100.0), digits, tick_size) for tp in tps_percent]
+    sl = _redondear_uno(price * (1.0 - signo * float(sl_percent) / 100.0), digits, tick_size)
+    return tps, sl
+
+
+def niveles_dict(price, tps, sl, side="buy", digits: int = 2, tick_size: float = None):
+    """{"TP1": .., ..., "SL": ..} para una entrada. Reemplaza calcular_tps_sl."""
+    tp_lvls, sl_lvl = niveles_porcentaje(price, tps, sl, side=side, digits=digits, tick_size=tick_size)
+    niveles = {f"TP{i}": v for i, v in enumerate(tp_lvls, 1)}
+    niveles["SL"] = sl_lvl
+    return niveles
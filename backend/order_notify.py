@@ -0,0 +1,59 @@
+import threading
+
+
+class OrderNotifier:
+    """
+    Secuencia global de "hay órdenes nuevas" para long-poll de los executors.
+    El fan-out llama bump() después del commit; /orders/wait bloquea en wait()
+    hasta que la secuencia supere la que el executor ya vio.
+
+    Cada wait() ocupa un thread de gunicorn durante todo el long-poll: con
+    max_waiters > 0 un semáforo limita cuántos esperan a la vez y el resto vuelve
+    al instante (el executor cae a su polling). La secuencia vive en memoria del
+    proceso, así que el backend debe correr con UN solo worker (ver Procfile).
+    """
+
+    def __init__(self, max_waiters: int = 0):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._waiters = 0
+        self.max_waiters = max(0, int(max_waiters))
+        self._cupo = threading.BoundedSemaphore(self.max_waiters) if self.max_waiters else None
+        self.rechazados = 0
+
+    @property
+    def seq(self) -> int:
+        with self._cond:
+            return self._seq
+
+    def bump(self) -> int:
+        with self._cond:
+            self._seq += 1
+            self._cond.notify_all()
+            return self._seq
+
+    def wait(self, since: int, timeout: float):
+        """
+        Devuelve (seq, changed). changed=False si venció el timeout sin novedades.
+        Devuelve None sin esperar si ya hay max_waiters esperando.
+        """
+        if self._cupo is not None and not self._cupo.acquire(blocking=False):
+            with self._cond:
+                self.rechazados += 1
+            return None
+        try:
+            with self._cond:
+                self._waiters += 1
+                try:
+                    changed = self._cond.wait_for(lambda: self._seq > since, timeout=timeout)
+                    return self._seq, bool(changed)
+                finally:
+                    self._waiters -= 1
+        finally:
+            if self._cupo is not None:
+                self._cupo.release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"seq": self._seq, "waiters": self._waiters,
+                    "max_waiters": self.max_waiters, "rechazados": self.rechazados}
@@ -0,0 +1,158 @@
+# rollups.py
+"""
+Resúmenes de trades_log ya agregados (el mismo archivo vive en backend/ y en
+executor_mt5/, igual que niveles.py, senales.py y metricas.py).
+
+Tabla trades_rollup (migrations/005), una fila por (día de apertura, cuenta,
+símbolo, lado): trades, abiertas, cerradas, ganadoras, volumen, P&L y slippage.
+Cada escritura a trades_log llama a refrescar_rollups() con los tickets/órdenes
+que tocó, en la MISMA transacción: solo se recalculan esos grupos (un día de un
+símbolo), así que es idempotente ante replays del journal y nunca se desfasa.
+
+    refrescar_rollups(cur, tickets=[...], order_ids=[...])
+    leer_rollups(cur, agrupar=("symbol", "side"), desde="2024-01-01", symbol="XAUUSD")
+
+Unidades: pnl = Σ (salida - entrada) * dirección * volumen (precio × lotes, sin
+tamaño de contrato); pnl_pct y slippage_pct en % del precio. slippage = entrada
+real vs precio de la alerta (orders.price); positivo = peor que la señal.
+"""
+
+# Columnas de agrupación expuestas -> columna en trades_rollup
+DIMENSIONES = {"day": "dia", "account": "account_login", "symbol": "symbol", "side": "side"}
+
+# Dirección del trade: +1 buy / -1 sell (trades_log.side = 'buy' | 'sell')
+_DIR = "(CASE WHEN LOWER(t.side) = 'sell' THEN -1 ELSE 1 END)"
+
+_SELECT_GRUPOS = """
+    SELECT DATE(t.open_time) AS dia, COALESCE(o.account_login, '') AS account_login,
+           t.symbol, t.side,
+           SUM(t.ticket IS NOT NULL) AS trades,
+           SUM(t.ticket IS NULL) AS fallidas,
+           SUM(t.ticket IS NOT NULL AND t.status = 'open') AS abiertas,
+           SUM(t.status = 'closed') AS cerradas,
+           SUM(t.status = 'closed' AND (t.exit_price - t.entry_price) * {dir} > 0) AS ganadoras,
+           COALESCE(SUM(CASE WHEN t.ticket IS NOT NULL THEN t.volume END), 0) AS volumen,
+           COALESCE(SUM(CASE WHEN t.status = 'closed'
+                             THEN (t.exit_price - t.entry_price) * {dir} * t.volume END), 0) AS pnl,
+           COALESCE(SUM(CASE WHEN t.status = 'closed' AND t.entry_price > 0
+                             THEN (t.exit_price - t.entry_price) / t.entry_price * {dir} * 100 END), 0) AS pnl_pct,
+           COALESCE(SUM(CASE WHEN t.ticket IS NOT NULL AND o.price > 0
+                             THEN (t.entry_price - o.price) / o.price * {dir} * 100 END), 0) AS slippage_pct,
+           SUM(t.ticket IS NOT NULL AND o.price > 0) AS slippage_n
+      FROM trades_log t
+      LEFT JOIN orders o ON o.id = t.order_id
+     WHERE t.open_time IS NOT NULL {filtro}
+     GROUP BY 1, 2, 3, 4
+"""
+
+_UPSERT = """
+    INSERT INTO trades_rollup (dia, account_login, symbol, side, trades, fallidas, abiertas, cerradas,
+                               ganadoras, volumen, pnl, pnl_pct, slippage_pct, slippage_n)
+    {select}
+    ON DUPLICATE KEY UPDATE
+        trades=VALUES(trades), fallidas=VALUES(fallidas), abiertas=VALUES(abiertas),
+        cerradas=VALUES(cerradas), ganadoras=VALUES(ganadoras), volumen=VALUES(volumen),
+        pnl=VALUES(pnl), pnl_pct=VALUES(pnl_pct), slippage_pct=VALUES(slippage_pct),
+        slippage_n=VALUES(slippage_n), actualizado=NOW()
+"""
+
+
+def _grupos_afectados(cur, tickets, order_ids):
+    """(día, símbolo, lado) distintos de esos tickets/órdenes (por idx_trades_log_ticket/_order_id)."""
+    conds, params = [], []
+    if tickets:
+        conds.append(f"ticket IN ({', '.join(['%s'] * len(tickets))})")
+        params += tickets
+    if order_ids:
+        conds.append(f"order_id IN ({', '.join(['%s'] * len(order_ids))})")
+        params += order_ids
+    cur.execute(f"""
+        SELECT DISTINCT DATE(open_time) AS dia, symbol, side
+          FROM trades_log
+         WHERE open_time IS NOT NULL AND ({' OR '.join(conds)})
+    """, params)
+    return [tuple(f.values()) if isinstance(f, dict) else tuple(f) for f in cur.fetchall()]
+
+
+def refrescar_rollups(cur, tickets=(), order_ids=(), todo: bool = False) -> bool:
+    """
+    Recalcula los grupos (día, símbolo, lado) de esos tickets/órdenes con un solo
+    INSERT ... SELECT ... ON DUPLICATE KEY UPDATE. todo=True recalcula la tabla entera.
+    Primero lee los grupos afectados y después filtra cada uno por rango de open_time
+    + symbol + side, así el SELECT usa idx_trades_log_open_time en vez de recorrer la tabla.
+    No lanza (salvo deadlock/lock wait): un error acá (p. ej. falta migrations/005) no
+    debe tumbar la escritura del trade; en MySQL la sentencia fallida no aborta la transacción.
+    """
+    tickets = [t for t in tickets if t is not None]
+    order_ids = [o for o in order_ids if o is not None]
+    if not todo and not tickets and not order_ids:
+        return True
+    try:
+        params = []
+        filtro = ""
+        if not todo:
+            grupos = _grupos_afectados(cur, tickets, order_ids)
+            if not grupos:
+                return True
+            rangos = []
+            for dia, symbol, side in grupos:
+                rangos.append("(t.open_time >= %s AND t.open_time < %s + INTERVAL 1 DAY"
+                              " AND t.symbol = %s AND t.side = %s)")
+                params += [dia, dia, symbol, side]
+            filtro = f"AND ({' OR '.join(rangos)})"
+        cur.execute(_UPSERT.format(select=_SELECT_GRUPOS.format(filtro=filtro, dir=_DIR)), params)
+        return True
+    except Exception as e:
+        if getattr(e, "errno", None) in (1205, 1213):
+            raise  # lock wait / deadlock: MySQL deshizo la transacción entera, que reintente el llamador
+        print(f"[DB ERROR] refrescar_rollups: {e}")
+        return False
+
+
+def _agregar(fila: dict) -> dict:
+    cerradas = int(fila.get("cerradas") or 0)
+    slip_n = int(fila.get("slippage_n") or 0)
+    out = {k: fila[k] for k in fila if k not in ("pnl_pct", "slippage_pct", "slippage_n")}
+    for k in ("trades", "fallidas", "abiertas", "cerradas", "ganadoras"):
+        out[k] = int(out.get(k) or 0)
+    for k in ("volumen", "pnl"):
+        out[k] = round(float(out.get(k) or 0), 6)
+    if "dia" in out and out["dia"] is not None:
+        out["dia"] = str(out["dia"])
+    out["win_rate"] = round(out["ganadoras"] / cerradas * 100, 2) if cerradas else None
+    out["pnl_pct_medio"] = round(float(fila["pnl_pct"] or 0) / cerradas, 4) if cerradas else None
+    out["slippage_pct_medio"] = round(float(fila["slippage_pct"] or 0) / slip_n, 4) if slip_n else None
+    return out
+
+
+def leer_rollups(cur, agrupar=("symbol", "side"), desde=None, hasta=None,
+                 symbol=None, side=None, account=None):
+    """
+    Suma filas de trades_rollup por las dimensiones pedidas (day/account/symbol/side).
+    `cur` debe ser un cursor dictionary=True. Lanza ValueError con una dimensión desconocida.
+    """
+    cols = []
+    for d in agrupar:
+        if d not in DIMENSIONES:
+            raise ValueError(f"dimensión desconocida '{d}' (usar {', '.join(DIMENSIONES)})")
+        if DIMENSIONES[d] not in cols:
+            cols.append(DIMENSIONES[d])
+    where, params = [], []
+    for col, op, val in (("dia", ">=", desde), ("dia", "<=", hasta), ("symbol", "=", symbol),
+                         ("side", "=", side), ("account_login", "=", account)):
+        if val:
+            where.append(f"{col} {op} %s")
+            params.append(val)
+    sel = ", ".join(cols + [
+        "SUM(trades) AS trades", "SUM(fallidas) AS fallidas", "SUM(abiertas) AS abiertas",
+        "SUM(cerradas) AS cerradas", "SUM(ganadoras) AS ganadoras", "SUM(volumen) AS volumen",
+        "SUM(pnl) AS pnl", "SUM(pnl_pct) AS pnl_pct", "SUM(slippage_pct) AS slippage_pct",
+        "SUM(slippage_n) AS slippage_n",
+    ])
+    query = f"SELECT {sel} FROM trades_rollup"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    if cols:
+        query += f" GROUP BY {', '.join(cols)} ORDER BY {', '.join(cols)}"
+    cur.execute(query, params)
+    return [_agregar(f) for f in cur.fetchall() if f.get("trades") is not None]
@@ -0,0 +1,106 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class SignalDedup:
+    """
+    Filtro de señales repetidas antes de encolarlas (TradingView re-dispara alertas).
+
+      - duplicado: misma (símbolo, señal, bucket de precio) dentro de `window_sec`
+      - idempotencia: si el request trae Idempotency-Key, esa clave se acepta una
+        sola vez durante `idempotency_ttl`
+      - coalescing: ráfaga de entradas del mismo lado en un símbolo dentro de
+        `coalesce_sec` => pasa solo la primera (aunque el precio cambie)
+
+    check() registra las claves de una señal aceptada; si después no se la pudo encolar
+    (cola llena => 429), olvidar() con los mismos argumentos las borra para que el
+    reintento del emisor no se tome como duplicado.
+    El bucket de precio es relativo (price_pct %), así sirve igual para GOLD y BTC.
+    Las claves vencen por TTL; el dict está ordenado por último uso y se poda desde el frente.
+    window_sec=0 y coalesce_sec=0 desactivan cada filtro.
+    """
+
+    def __init__(self, window_sec: float = 10.0, price_pct: float = 0.05, coalesce_sec: float = 0.0,
+                 idempotency_ttl: float = 3600.0, max_keys: int = 10_000):
+        self.window_sec = float(window_sec)
+        self.price_pct = float(price_pct)
+        self.coalesce_sec = float(coalesce_sec)
+        self.idempotency_ttl = float(idempotency_ttl)
+        self.max_keys = int(max_keys)
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()  # clave -> vence_en (monotonic)
+        self._counts = {"accepted": 0, "duplicate": 0, "idempotent": 0, "coalesced": 0, "released": 0}
+
+    def _bucket(self, price: float):
+        if price <= 0 or self.price_pct <= 0:
+            return price
+        return round(math.log(price) / math.log1p(self.price_pct / 100.0))
+
+    def _visto(self, clave, ttl: float, ahora: float) -> bool:
+        """True si la clave sigue viva; si no, la registra con su TTL."""
+        vence = self._keys.get(clave)
+        if vence is not None and vence > ahora:
+            return True
+        self._keys[clave] = ahora + ttl
+        self._keys.move_to_end(clave)
+        return False
+
+    def _podar(self, ahora: float):
+        # El orden es por última inserción, no por vencimiento (los TTL difieren):
+        # se poda desde el frente mientras haya vencidas, y por tamaño si hace falta.
+        while self._keys:
+            clave, vence = next(iter(self._keys.items()))
+            if vence > ahora and len(self._keys) <= self.max_keys:
+                break
+            self._keys.popitem(last=False)
+
+    def _claves(self, symbol: str, signal: str, price: float, lado: str, idempotency_key: str):
+        return (("idem", idempotency_key) if idempotency_key else None,
+                ("sig", symbol, signal.strip().lower(), self._bucket(price)) if self.window_sec > 0 else None,
+                ("lado", symbol, lado) if lado and self.coalesce_sec > 0 else None)
+
+    def check(self, symbol: str, signal: str, price: float, lado: str = None,
+              idempotency_key: str = None):
+        """
+        Devuelve (aceptada, motivo). motivo: "ok" | "idempotent" | "duplicate" | "coalesced".
+        `lado` ("buy"/"sell") solo para entradas ejecutables; None => no se coalesce.
+        """
+        ahora = time.monotonic()
+        idem, sig, por_lado = self._claves(symbol, signal, price, lado, idempotency_key)
+        with self._lock:
+            self._podar(ahora)
+            if idem and self._visto(idem, self.idempotency_ttl, ahora):
+                motivo = "idempotent"
+            elif sig and self._visto(sig, self.window_sec, ahora):
+                motivo = "duplicate"
+            elif por_lado and self._visto(por_lado, self.coalesce_sec, ahora):
+                motivo = "coalesced"
+            else:
+                motivo = "ok"
+                if lado:
+                    # Cambio de lado: la ráfaga anterior terminó
+                    self._keys.pop(("lado", symbol, "sell" if lado == "buy" else "buy"), None)
+            self._counts["accepted" if motivo == "ok" else motivo] += 1
+            return motivo == "ok", motivo
+
+    def olvidar(self, symbol: str, signal: str, price: float, lado: str = None,
+                idempotency_key: str = None):
+        """Deshace un check() aceptado (mismos argumentos) cuya señal no llegó a encolarse."""
+        with self._lock:
+            for clave in self._claves(symbol, signal, price, lado, idempotency_key):
+                if clave is not None:
+                    self._keys.pop(clave, None)
+            self._counts["accepted"] -= 1
+            self._counts["released"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counts,
+                "keys": len(self._keys),
+                "window_sec": self.window_sec,
+                "price_pct": self.price_pct,
+                "coalesce_sec": self.coalesce_sec,
+            }
@@ -0,0 +1,146 @@
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+from metricas import observar
+
+POLICIES = ("reject", "drop_oldest", "block")
+
+
+def _percentiles(values, pcts=(50, 95, 99)):
+    """Percentiles por rango más cercano (suficiente para métricas operativas)."""
+    if not values:
+        return {f"p{p}": 0.0 for p in pcts}
+    data = sorted(values)
+    n = len(data)
+    out = {}
+    for p in pcts:
+        k = max(0, min(n - 1, math.ceil(p / 100.0 * n) - 1))
+        out[f"p{p}"] = round(data[k], 3)
+    return out
+
+
+class SignalWorkerPool:
+    """
+    Pool fijo de workers alimentado por una cola acotada en memoria.
+    Política cuando la cola está llena:
+      - reject:      se rechaza la señal nueva (submit devuelve False)
+      - drop_oldest: se descarta la más vieja en cola y entra la nueva
+      - block:       se espera hasta block_timeout; si sigue llena, se rechaza
+    """
+
+    def __init__(self, handler, workers: int = 4, maxsize: int = 200,
+                 policy: str = "reject", block_timeout: float = 2.0,
+                 name: str = "signal", sample_size: int = 1000):
+        if policy not in POLICIES:
+            raise ValueError(f"policy inválida: {policy} (usa {', '.join(POLICIES)})")
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.block_timeout = float(block_timeout)
+        self.name = name
+
+        self._q = queue.Queue(maxsize=self.maxsize)
+        self._lock = threading.Lock()
+        self._started = False
+        self._busy = 0
+        self._proc_ms = deque(maxlen=sample_size)   # duración del handler
+        self._wait_ms = deque(maxlen=sample_size)   # tiempo en cola
+        self._counters = {
+            "submitted": 0,
+            "rejected": 0,
+            "dropped": 0,
+            "processed": 0,
+            "failed": 0,
+        }
+
+    # ---------------- API ----------------
+    def submit(self, item) -> bool:
+        """Encola item. Devuelve False si se rechazó por backpressure."""
+        self._ensure_started()
+        entry = (time.monotonic(), item)
+        try:
+            if self.policy == "block":
+                self._q.put(entry, timeout=self.block_timeout)
+            elif self.policy == "drop_oldest":
+                while True:
+                    try:
+                        self._q.put_nowait(entry)
+                        break
+                    except queue.Full:
+                        try:
+                            self._q.get_nowait()
+                            self._q.task_done()
+                            self._count("dropped")
+                        except queue.Empty:
+                            pass
+            else:
+                self._q.put_nowait(entry)
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("submitted")
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+            proc = list(self._proc_ms)
+            wait = list(self._wait_ms)
+            busy = self._busy
+        out.update({
+            "name": self.name,
+            "policy": self.policy,
+            "workers": self.workers,
+            "busy_workers": busy,
+            "queue_depth": self._q.qsize(),
+            "queue_max": self.maxsize,
+            "processing_ms": _percentiles(proc),
+            "queue_wait_ms": _percentiles(wait),
+        })
+        if proc:
+            out["processing_ms"]["max"] = round(max(proc), 3)
+        return out
+
+    # ---------------- internos ----------------
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def _ensure_started(self):
+        # Arranque perezoso: con gunicorn los threads deben nacer en el worker, no en el master
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._worker_loop, name=f"{self.name}-worker-{i+1}",
+                                 daemon=True).start()
+            self._started = True
+
+    def _worker_loop(self):
+        while True:
+            enq_ts, item = self._q.get()
+            t0 = time.monotonic()
+            with self._lock:
+                self._busy += 1
+                self._wait_ms.append((t0 - enq_ts) * 1000.0)
+            observar(f"{self.name}.queue_wait", (t0 - enq_ts) * 1000.0)
+            ok = True
+            try:
+                self.handler(item)
+            except Exception as e:
+                ok = False
+                print(f"[QUEUE] {self.name}: error en handler: {e}")
+            finally:
+                elapsed = (time.monotonic() - t0) * 1000.0
+                with self._lock:
+                    self._busy -= 1
+                    self._proc_ms.append(elapsed)
+                    self._counters["processed" if ok else "failed"] += 1
+                observar(f"{self.name}.process", elapsed)
+                self._q.task_done()
@@ -0,0 +1,192 @@
+import queue
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metricas import observar
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate` tokens/seg con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        """Lanza ValueError si rate <= 0 (acquire dividiría por cero) o capacity < 1 (nunca habría token)."""
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        if not self.rate > 0:
+            raise ValueError(f"TokenBucket: rate debe ser > 0 (recibido {rate})")
+        if not self.capacity >= 1:
+            raise ValueError(f"TokenBucket: capacity debe ser >= 1 (recibido {capacity})")
+        self._tokens = float(capacity)
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Bloquea hasta obtener 1 token. Devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+                self._ts = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                need = (1.0 - self._tokens) / self.rate
+            time.sleep(need)
+            waited += need
+
+
+class _Lane:
+    """Cola + thread por destino: orden garantizado por chat y un chat lento no frena a los demás."""
+
+    def __init__(self, dispatcher, token: str, chat_id: str, maxsize: int):
+        self.dispatcher = dispatcher
+        self.token = token
+        self.chat_id = chat_id
+        self.q = queue.Queue(maxsize=maxsize)
+        self.bucket = TokenBucket(dispatcher.per_chat_rate, dispatcher.per_chat_burst)
+        self.thread = threading.Thread(target=self._loop, name=f"tg-{chat_id}", daemon=True)
+
+    def _loop(self):
+        while True:
+            message = self.q.get()
+            try:
+                self.dispatcher._deliver(self, message)
+            except Exception as e:
+                print(f"[TG] Error lane chat_id={self.chat_id}:", e)
+            finally:
+                self.q.task_done()
+
+
+class TelegramDispatcher:
+    """
+    Envío de Telegram fuera del camino de trading:
+      - enqueue() no bloquea: deja el mensaje en la cola de cada destino
+      - un thread por destino (envíos concurrentes entre chats, en orden dentro de cada chat)
+      - requests.Session compartida con keep-alive
+      - token bucket por chat y otro global por bot (token)
+      - reintentos con backoff exponencial + jitter; respeta retry_after en 429
+    """
+
+    def __init__(self, destinations, per_chat_rate: float = 1.0, per_chat_burst: float = 3.0,
+                 global_rate: float = 25.0, max_retries: int = 3, backoff_base: float = 0.5,
+                 timeout: float = 10.0, queue_max: int = 500):
+        self.destinations = list(destinations or [])
+        self.per_chat_rate = float(per_chat_rate)
+        self.per_chat_burst = max(1.0, float(per_chat_burst))
+        self.global_rate = float(global_rate)
+        # Los buckets nacen recién en start() (primer enqueue): una config inválida falla acá
+        if not (self.per_chat_rate > 0 and self.global_rate > 0):
+            raise ValueError(f"TelegramDispatcher: per_chat_rate y global_rate deben ser > 0 "
+                             f"(recibidos {per_chat_rate}, {global_rate})")
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = float(backoff_base)
+        self.timeout = float(timeout)
+        self.queue_max = max(1, int(queue_max))
+
+        self._lock = threading.Lock()
+        self._started = False
+        self._lanes = []
+        self._global_buckets = {}
+        self._session = None
+        self._counters = {"enqueued": 0, "dropped": 0, "sent": 0, "failed": 0, "retries": 0,
+                          "rate_limited": 0}
+
+    # ---------------- API ----------------
+    def enqueue(self, message: str) -> int:
+        """Encola message para todos los destinos. Devuelve a cuántos destinos entró."""
+        if not self.destinations:
+            print("[TG] No hay destinos configurados; no se envía.")
+            return 0
+        self._ensure_started()
+        accepted = 0
+        for lane in self._lanes:
+            try:
+                lane.q.put_nowait(message)
+                accepted += 1
+            except queue.Full:
+                self._count("dropped")
+                print(f"[TG] Cola llena chat_id={lane.chat_id}; mensaje descartado.")
+        self._count("enqueued", accepted)
+        return accepted
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+        out["destinations"] = len(self.destinations)
+        out["queue_depth"] = {lane.chat_id: lane.q.qsize() for lane in self._lanes}
+        return out
+
+    # ---------------- internos ----------------
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(4, len(self.destinations)))
+            session.mount("https://", adapter)
+            self._session = session
+            for d in self.destinations:
+                tok = d["token"]
+                if tok not in self._global_buckets:
+                    self._global_buckets[tok] = TokenBucket(self.global_rate, max(1.0, self.global_rate))
+                self._lanes.append(_Lane(self, tok, d["chat_id"], self.queue_max))
+            for lane in self._lanes:
+                lane.thread.start()
+            self._started = True
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniforme entre 0 y base * 2^attempt
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    def _deliver(self, lane: _Lane, message: str):
+        url = f"https://api.telegram.org/bot{lane.token}/sendMessage"
+        payload = {"chat_id": lane.chat_id, "text": message, "parse_mode": "HTML"}
+        t_msg = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            lane.bucket.acquire()
+            self._global_buckets[lane.token].acquire()
+            t0 = time.perf_counter()
+            try:
+                r = self._session.post(url, json=payload, timeout=self.timeout)
+                observar("telegram.http", (time.perf_counter() - t0) * 1000.0)
+            except requests.RequestException as e:
+                delay = self._backoff(attempt)
+                print(f"[TG] chat_id={lane.chat_id} error de red ({e}); reintento en {delay:.2f}s")
+            else:
+                if r.status_code == 200:
+                    self._count("sent")
+                    # incluye espera de rate limit y reintentos
+                    observar("telegram.deliver", (time.perf_counter() - t_msg) * 1000.0)
+                    print(f"[TG] -> chat_id={lane.chat_id} status=200")
+                    return
+                if r.status_code == 429:
+                    self._count("rate_limited")
+                    try:
+                        retry_after = float(r.json().get("parameters", {}).get("retry_after", 1))
+                    except Exception:
+                        retry_after = 1.0
+                    delay = retry_after + self._backoff(0)
+                elif r.status_code >= 500:
+                    delay = self._backoff(attempt)
+                else:
+                    # 4xx distinto de 429: no tiene sentido reintentar
+                    self._count("failed")
+                    print(f"[TG] -> chat_id={lane.chat_id} status={r.status_code} resp={r.text[:200]}")
+                    return
+                print(f"[TG] chat_id={lane.chat_id} status={r.status_code}; reintento en {delay:.2f}s")
+            if attempt < self.max_retries:
+                self._count("retries")
+                time.sleep(delay)
+        self._count("failed")
+        print(f"[TG] chat_id={lane.chat_id} sin éxito tras {self.max_retries + 1} intentos.")
@@ -0,0 +1,22 @@
+# test_espejos.py
+"""
+Los módulos compartidos viven copiados en backend/ y en executor_mt5/ (cada uno se
+despliega por separado). Tienen que ser idénticos byte a byte: un cambio va en los dos.
+
+    python -m pytest backend/test_espejos.py -q
+"""
+import os
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXECUTOR_DIR = os.path.join(BASE_DIR, "..", "executor_mt5")
+
+ESPEJOS = ["senales.py", "niveles.py", "rollups.py", "metricas.py", "db_pool.py"]
+
+
+@pytest.mark.parametrize("nombre", ESPEJOS)
+def test_copias_iguales(nombre):
+    with open(os.path.join(BASE_DIR, nombre), "rb") as a, \
+         open(os.path.join(EXECUTOR_DIR, nombre), "rb") as b:
+        assert a.read() == b.read(), f"backend/{nombre} y executor_mt5/{nombre} difieren"
@@ -0,0 +1,77 @@
+# test_senales.py
+"""
+Fija la clasificación de senales.clasificar contra lo que hacían antes main.py y
+main_notify.py (referencias en bench_senales.py). El ruteo del executor está en
+executor_mt5/test_ruteo.py y que las dos copias sean iguales, en test_espejos.py.
+
+    python -m pytest backend/test_senales.py -q
+"""
+import pytest
+
+from bench_senales import CORPUS, _ref_main, _ref_notify
+from senales import clasificar
+
+# Avisos con texto de más: antes los `in` los reconocían igual
+SUFIJOS = [
+    "Posible Buy XAUUSD",
+    "POSIBLE SELL 15m",
+    "Take Profit Buy TP2 alcanzado",
+    "TAKE PROFIT SELL (TP3)",
+    "Take Profit TP2 Buy",
+]
+
+# + señales incompletas: "TPn Buy/Sell" nunca fue TP para ningún consumidor
+EXTRA = SUFIJOS + [
+    "TP2 Buy",
+    "TP3 Sell",
+    "tp1",
+    "Take Profit",
+    "Alerta custom 1 up",
+    "",
+]
+
+# título de main.py por label (ver main._TITULOS)
+_TITULO_MAIN = {
+    "BUY_NORMAL_SMART": "COMPRA CONFIRMADA",
+    "SELL_NORMAL_SMART": "VENTA CONFIRMADA",
+    "POSIBLE_BUY": "POSIBLE COMPRA",
+    "POSIBLE_SELL": "POSIBLE VENTA",
+    "TP_BUY": "TAKE PROFIT BUY",
+    "TP_SELL": "TAKE PROFIT SELL",
+}
+
+# Diferencias buscadas con la clasificación vieja (texto -> motivo)
+_CAMBIOS_MAIN = {
+    # main_notify ya las aceptaba; main.py solo miraba "buy/compra normal" con barra
+    "Compra Normal o Smart": "entrada sin barra",
+    "Venta  normal  o  smart": "entrada sin barra",
+}
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("Buy/Compra Normal o Smart", ("entry", "buy", None, "BUY_NORMAL_SMART")),
+    ("sell/venta normal o smart", ("entry", "sell", None, "SELL_NORMAL_SMART")),
+    ("Posible Sell", ("posible", "sell", None, "POSIBLE_SELL")),
+    ("Take Profit Buy TP2", ("take_profit", "buy", 2, "TP_BUY")),
+    ("TAKE PROFIT SHORT TP4", ("take_profit", "sell", 4, "TP_SELL")),
+    ("TAKE PROFIT LONG", ("take_profit", "buy", None, "TP_BUY")),
+    ("buy", ("entry", "buy", None, "BUY")),
+    ("TP2 Buy", ("unknown", None, None, "UNKNOWN")),
+    ("Sell TP2 Buy", ("unknown", None, None, "UNKNOWN")),
+    ("Posible Buy XAUUSD", ("posible", "buy", None, "POSIBLE_BUY")),
+    ("TAKE PROFIT SELL (TP3)", ("take_profit", "sell", 3, "TP_SELL")),
+    ("Take Profit TP2 Buy", ("take_profit", None, 2, "TP")),
+])
+def test_clasificar(texto, esperado):
+    assert tuple(clasificar(texto)) == esperado
+
+
+@pytest.mark.parametrize("texto", CORPUS + EXTRA)
+def test_notify_como_antes(texto):
+    label = clasificar(texto).label
+    assert (label if label in ("BUY_NORMAL_SMART", "SELL_NORMAL_SMART") else "UNKNOWN") == _ref_notify(texto)
+
+
+@pytest.mark.parametrize("texto", [t for t in CORPUS + EXTRA if t not in _CAMBIOS_MAIN])
+def test_main_como_antes(texto):
+    assert _TITULO_MAIN.get(clasificar(texto).label, "SEÑAL") == _ref_main(texto)
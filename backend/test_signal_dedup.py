@@ -0,0 +1,67 @@
+# test_signal_dedup.py
+"""
+Dedup del webhook: una señal que no se pudo encolar (cola llena => 429) no queda
+registrada, así el reintento del emisor entra en vez de contestarse "duplicate".
+
+    python -m pytest backend/test_signal_dedup.py -q
+"""
+import threading
+import time
+
+import pytest
+
+import main
+from signal_dedup import SignalDedup
+from signal_queue import SignalWorkerPool
+
+PAYLOAD = {"signal": "Buy/Compra Normal o Smart", "symbol": "OANDA:XAUUSD", "price": 2400.5}
+
+
+def test_olvidar_deshace_check():
+    d = SignalDedup(window_sec=10, coalesce_sec=10)
+    args = dict(symbol="XAUUSD", signal="buy", price=2400.0, lado="buy", idempotency_key="k1")
+    assert d.check(**args) == (True, "ok")
+    assert d.check(**args) == (False, "idempotent")
+    d.olvidar(**args)
+    assert d.check(**args) == (True, "ok")
+    assert d.stats()["released"] == 1
+
+
+@pytest.fixture
+def cola_llena(monkeypatch):
+    """Pool reject de 1 worker y 1 lugar, con el worker trabado y la cola ocupada."""
+    soltar = threading.Event()
+    procesadas = []
+
+    def _handler(data):
+        soltar.wait(5)
+        procesadas.append(data)
+
+    pool = SignalWorkerPool(_handler, workers=1, maxsize=1, policy="reject", name="test")
+    assert pool.submit({"relleno": 1})
+    while pool.stats()["busy_workers"] == 0:
+        time.sleep(0.01)
+    assert pool.submit({"relleno": 2})
+    monkeypatch.setattr(main, "_signal_pool", pool)
+    monkeypatch.setattr(main, "_dedup", SignalDedup(window_sec=10, coalesce_sec=10))
+    yield soltar, pool
+    soltar.set()
+
+
+@pytest.mark.parametrize("headers", [{}, {"Idempotency-Key": "alerta-1"}])
+def test_reintento_tras_429_se_acepta(cola_llena, headers):
+    soltar, pool = cola_llena
+    client = main.app.test_client()
+
+    r = client.post("/webhook", json=PAYLOAD, headers=headers)
+    assert r.status_code == 429 and r.get_json()["status"] == "busy"
+
+    soltar.set()
+    while pool.stats()["queue_depth"] or pool.stats()["busy_workers"]:
+        time.sleep(0.01)
+
+    r = client.post("/webhook", json=PAYLOAD, headers=headers)
+    assert r.status_code == 200 and r.get_json()["status"] == "ok"
+    # y el siguiente re-disparo sí es duplicado
+    r = client.post("/webhook", json=PAYLOAD, headers=headers)
+    assert r.get_json()["status"] in ("duplicate", "idempotent")
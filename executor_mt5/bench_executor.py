@@ -0,0 +1,199 @@
+# bench_executor.py
+"""
+Benchmarks de latencia del executor sobre el simulador (no necesita MT5 ni MySQL):
+
+  1) signal -> fill: ejecutar_orden de una señal con N parciales
+  2) aplanar_simbolo con N posiciones abiertas; /closeall sobre varios símbolos
+  3) mover SL en TAKE PROFIT con N posiciones (modificación masiva)
+  4) throughput del loop principal: ingest -> route -> lanes, M órdenes
+  5) reconciliador: N trades abiertos en trades_log, 3/4 ya cerrados en MT5
+
+    python bench_executor.py --fill-latency-ms 2 --orders 200
+
+Las escrituras a la DB quedan en un journal en memoria (no se drenan).
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["BROKER_BACKEND"] = "sim"
+os.environ.setdefault("JOURNAL_PATH", ":memory:")
+os.environ.setdefault("RECONCILE_STATE_FILE", os.path.join(tempfile.gettempdir(), "bench-reconcile.json"))
+os.environ.pop("TELEGRAM_TOKEN", None)  # nada de Telegram real en el benchmark
+os.environ.pop("BACKEND_URL", None)
+
+import mt5_sim  # noqa: E402
+import mt5_utils  # noqa: E402
+import mt5_executor as ex  # noqa: E402
+from reconciliador import Reconciliador  # noqa: E402
+
+SIM = mt5_sim.broker
+
+
+def _pct(values, p):
+    data = sorted(values)
+    k = max(0, min(len(data) - 1, math.ceil(p / 100.0 * len(data)) - 1))
+    return data[k]
+
+
+def _fila(nombre, tiempos_ms, extra=""):
+    print(f"{nombre:<38} n={len(tiempos_ms):<5} p50={statistics.median(tiempos_ms):8.2f} ms "
+          f"p95={_pct(tiempos_ms, 95):8.2f} ms max={max(tiempos_ms):8.2f} ms {extra}")
+
+
+def _escenario(fill_latency_ms: float):
+    SIM.reset()
+    SIM.initialize()
+    SIM.configure(fill_latency_ms=fill_latency_ms)
+    SIM.add_symbol("GOLD", 2400.00, spread=0.20)
+    SIM.add_symbol("BTCUSD", 65000.00, spread=5.0)
+    ex._book.refresh()  # el libro del executor vuelve a cero con el simulador
+
+
+@contextlib.contextmanager
+def _silencio():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_signal_to_fill(reps: int, fill_latency_ms: float):
+    tiempos = []
+    for i in range(reps):
+        _escenario(fill_latency_ms)
+        order = {"id": i + 1, "symbol": "XAUUSD", "order_type": "Buy/Compra Normal o Smart",
+                 "price": 2400.0}
+        t0 = time.perf_counter()
+        with _silencio():
+            ok = ex.ejecutar_orden(order, "1000001")
+        tiempos.append((time.perf_counter() - t0) * 1000.0)
+        assert ok, "ejecutar_orden falló en el simulador"
+    _fila("signal->fill (1ª entrada, 3 parciales)", tiempos, f"[order_send={SIM.calls.get('order_send')}]")
+
+
+def bench_cerrar(sizes, fill_latency_ms: float):
+    for n in sizes:
+        _escenario(fill_latency_ms)
+        SIM.configure(reject_every=7)  # algunos rechazos => se reintentan solo esos tickets
+        for _ in range(n):
+            SIM.open_position("GOLD", "sell", volume=0.01)
+        t0 = time.perf_counter()
+        with _silencio():
+            rep = mt5_utils.aplanar_simbolo("GOLD", tipo=mt5_sim.POSITION_TYPE_SELL, backoff_base=0.01)
+        ms = (time.perf_counter() - t0) * 1000.0
+        quedan = len(SIM.positions_get(symbol="GOLD"))
+        print(f"aplanar_simbolo N={n:<5} {ms:10.2f} ms  cerradas={len(rep['cerradas'])} "
+              f"fallidas={len(rep['fallidas'])} intentos={rep['intentos']} quedan={quedan} "
+              f"ticks={SIM.calls.get('symbol_info_tick', 0)} sends={SIM.calls.get('order_send', 0)}")
+
+
+def bench_closeall(n_por_simbolo: int, fill_latency_ms: float):
+    _escenario(fill_latency_ms)
+    simbolos = ["GOLD", "BTCUSD", "EURUSD", "US30"]
+    for s in simbolos[2:]:
+        SIM.add_symbol(s, 100.0, spread=0.01)
+    for s in simbolos:
+        for _ in range(n_por_simbolo):
+            SIM.open_position(s, "buy", volume=0.01)
+    t0 = time.perf_counter()
+    with _silencio():
+        rep = ex._cerrar_todo()
+    ms = (time.perf_counter() - t0) * 1000.0
+    print(f"/closeall {len(simbolos)} símbolos x {n_por_simbolo:<4} {ms:10.2f} ms  "
+          f"cerradas={len(rep['cerradas'])} fallidas={len(rep['fallidas'])} "
+          f"quedan={len(SIM.positions_get())}")
+
+
+def bench_mover_sl(sizes, fill_latency_ms: float):
+    for n in sizes:
+        _escenario(fill_latency_ms)
+        for i in range(n):
+            # Parciales apiladas: pocas entradas distintas
+            SIM.open_position("GOLD", "buy", volume=0.01, price=2400.00 + (i // 3) * 0.50)
+        t0 = time.perf_counter()
+        with _silencio():
+            rep = mt5_utils.mover_sl_en_take_profit_lote("GOLD", "buy", [0.2, 0.5, 1, 2, 3, 5], tp_index=2)
+            # Segunda alerta igual: todo es no-op, no debe tocar el broker
+            rep2 = mt5_utils.mover_sl_en_take_profit_lote("GOLD", "buy", [0.2, 0.5, 1, 2, 3, 5], tp_index=2)
+        ms = (time.perf_counter() - t0) * 1000.0
+        ok = sum(1 for r in rep["resultados"] if r["ok"])
+        print(f"mover SL TP2 N={n:<5} {rep['ms_total']:10.2f} ms  ok={ok}/{rep['enviadas']} "
+              f"re-alerta: enviadas={rep2['enviadas']} omitidas={len(rep2['omitidas'])} "
+              f"({ms - rep['ms_total']:.2f} ms)")
+
+
+def bench_pipeline(n_orders: int, fill_latency_ms: float):
+    _escenario(fill_latency_ms)
+    for w in (ex._route_worker, ex._tg_worker):
+        w.start()
+    tipos = ["Buy/Compra Normal o Smart", "Sell/Venta Normal o Smart", "Posible Buy",
+             "Take Profit Buy TP1"]
+    orders = [{"id": 10_000 + i, "symbol": "XAUUSD" if i % 2 else "BTCUSD",
+               "order_type": tipos[i % len(tipos)], "price": 2400.0 if i % 2 else 65000.0}
+              for i in range(n_orders)]
+    ids = {o["id"] for o in orders}
+
+    t0 = time.perf_counter()
+    with _silencio():
+        for o in ex._marcar_en_vuelo(orders):
+            ex._route_worker.submit(ex._rutear_orden, o, "1000001")
+        # Terminada = ya pasó por execute/route y tiene su seq de journal asignado
+        while True:
+            with ex._in_flight_lock:
+                pendientes = sum(1 for oid in ids if ex._in_flight.get(oid, 0) is None)
+            if pendientes == 0:
+                break
+            time.sleep(0.001)
+    secs = time.perf_counter() - t0
+    print(f"pipeline ingest->route->execute      {n_orders} órdenes en {secs*1000:8.1f} ms "
+          f"=> {n_orders / secs:8.1f} órdenes/s  [order_send={SIM.calls.get('order_send', 0)}]")
+
+
+def bench_reconciliar(sizes, fill_latency_ms: float):
+    for n in sizes:
+        _escenario(0.0)
+        tickets = [SIM.open_position("GOLD", "buy", volume=0.01) for _ in range(n)]
+        for t in tickets[: n * 3 // 4]:  # TP/SL del broker: MT5 los cerró, trades_log no se enteró
+            SIM.order_send({"action": mt5_sim.TRADE_ACTION_DEAL, "symbol": "GOLD", "volume": 0.01,
+                            "type": mt5_sim.ORDER_TYPE_SELL, "position": t})
+        abiertos = set(tickets)  # lo que trades_log todavía tiene como 'open'
+        cierres = []
+        estado = os.environ["RECONCILE_STATE_FILE"]
+        if os.path.exists(estado):
+            os.remove(estado)
+        rec = Reconciliador(lambda: abiertos, lambda t, *_: cierres.append(t), estado)
+        SIM.calls.clear()
+        with _silencio():
+            r1 = rec.reconciliar()
+            abiertos.difference_update(cierres)  # el journal drenó los cierres
+            r2 = rec.reconciliar()
+        print(f"reconciliar N={n:<5} 1ª pasada {r1['ms']:8.2f} ms cerrados={r1['cerrados']} deals={r1['deals']} | "
+              f"siguiente {r2['ms']:6.2f} ms cerrados={r2['cerrados']} "
+              f"[history_deals_get={SIM.calls.get('history_deals_get', 0)}]")
+        os.remove(estado)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fill-latency-ms", type=float, default=2.0)
+    ap.add_argument("--reps", type=int, default=30)
+    ap.add_argument("--close-sizes", default="10,100,500")
+    ap.add_argument("--orders", type=int, default=200)
+    args = ap.parse_args()
+
+    print(f"Simulador: fill_latency={args.fill_latency_ms} ms\n")
+    bench_signal_to_fill(args.reps, args.fill_latency_ms)
+    bench_cerrar([int(x) for x in args.close_sizes.split(",") if x.strip()], args.fill_latency_ms)
+    bench_closeall(max(int(x) for x in args.close_sizes.split(",") if x.strip()), args.fill_latency_ms)
+    bench_mover_sl([int(x) for x in args.close_sizes.split(",") if x.strip()], args.fill_latency_ms)
+    bench_pipeline(args.orders, args.fill_latency_ms)
+    bench_reconciliar([int(x) for x in args.close_sizes.split(",") if x.strip()] + [5000], args.fill_latency_ms)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
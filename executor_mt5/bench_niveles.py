@@ -0,0 +1,69 @@
+# bench_niveles.py
+"""
+Micro-benchmark: motor vectorizado (niveles.calcular_niveles) vs las funciones
+escalares que existían antes (calcular_tps_porcentaje / calcular_tps_sl, copiadas
+abajo como referencia). También verifica que ambos den los mismos niveles.
+
+    python bench_niveles.py --sizes 1,10,100,1000,100000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from niveles import calcular_niveles, niveles_porcentaje
+
+TPS = [0.2, 0.5, 1, 2, 3, 5]
+SL = 0.40
+
+
+# ---------------- Referencia escalar (implementación anterior) ----------------
+def _ref_calcular_tps_porcentaje(price, tps_percent, sl_percent, side="buy"):
+    price = float(price)
+    if side == "buy":
+        niveles = [round(price * (1 + tp / 100), 2) for tp in tps_percent]
+        sl = round(price * (1 - sl_percent / 100), 2)
+    else:
+        niveles = [round(price * (1 - tp / 100), 2) for tp in tps_percent]
+        sl = round(price * (1 + sl_percent / 100), 2)
+    return niveles, sl
+
+
+def _tiempo(fn, reps):
+    mejor = float("inf")
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1,10,100,1000,10000,100000")
+    ap.add_argument("--reps", type=int, default=5)
+    args = ap.parse_args()
+
+    rnd = random.Random(42)
+    print(f"{'N':>8} | {'escalar ms':>11} | {'vector ms':>10} | {'envoltorio ms':>13} | {'speedup':>8} | iguales")
+    print("-" * 75)
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        entradas = [round(rnd.uniform(1800, 2600), 2) for _ in range(n)]
+        lados = [rnd.choice(("buy", "sell")) for _ in range(n)]
+
+        t_ref = _tiempo(lambda: [_ref_calcular_tps_porcentaje(e, TPS, SL, s) for e, s in zip(entradas, lados)],
+                        args.reps)
+        t_vec = _tiempo(lambda: calcular_niveles(entradas, lados, TPS, SL, digits=2), args.reps)
+        t_env = _tiempo(lambda: [niveles_porcentaje(e, TPS, SL, s) for e, s in zip(entradas, lados)],
+                        max(1, args.reps // 2)) if n <= 10_000 else float("nan")
+
+        ref = [_ref_calcular_tps_porcentaje(e, TPS, SL, s) for e, s in zip(entradas, lados)]
+        tps, sl = calcular_niveles(entradas, lados, TPS, SL, digits=2)
+        iguales = (np.array_equal(np.round(tps, 2), np.round(np.array([r[0] for r in ref]), 2))
+                   and np.array_equal(np.round(sl, 2), np.round(np.array([r[1] for r in ref]), 2)))
+        print(f"{n:>8} | {t_ref:>11.3f} | {t_vec:>10.3f} | {t_env:>13.3f} | {t_ref / t_vec:>7.1f}x | {iguales}")
+
+
+if __name__ == "__main__":
+    main()
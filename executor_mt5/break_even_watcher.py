@@ -1,8 +1,13 @@
 # break_even_watcher.py (Corregido y Optimizado)
 
-import MetaTrader5 as mt5
+from broker import mt5
 import time
 
+import numpy as np
+
+from mt5_utils import precision_simbolo
+from niveles import niveles_dict
+
 # Parámetros BreakEven
 BE_PIPS_TRIGGER = 50  # Ajustado recomendado para GOLD
 SYMBOLS = ["GOLD"]
@@ -14,17 +19,14 @@ TPS = [0.2, 0.5, 1, 2, 3, 5]  # (% del precio de entrada)
 SL_BUY = 0.40
 SL_SELL = 0.40
 
-def calcular_tps_sl(price, tps, sl, side="buy"):
-    niveles = {}
-    if side == "buy":
-        for i, tp in enumerate(tps, 1):
-            niveles[f"TP{i}"] = round(price * (1 + tp / 100), 2)
-        niveles["SL"] = round(price * (1 - sl / 100), 2)
-    else:
-        for i, tp in enumerate(tps, 1):
-            niveles[f"TP{i}"] = round(price * (1 - tp / 100), 2)
-        niveles["SL"] = round(price * (1 + sl / 100), 2)
-    return niveles
+# Polling adaptativo: cerca de un trigger se revisa rápido; lejos, se espacia.
+# intervalo = distancia (pips) al trigger más cercano / BE_MAX_PIPS_PER_SEC, acotado.
+BE_MIN_INTERVAL = 0.25
+BE_MAX_INTERVAL = 5.0
+BE_MAX_PIPS_PER_SEC = 20.0
+
+def calcular_tps_sl(price, tps, sl, side="buy", digits=2, tick_size=None):
+    return niveles_dict(price, tps, sl, side=side, digits=digits, tick_size=tick_size)
 
 
 def mover_sl_break_even(symbol, ticket, entry_price, tp):
@@ -40,33 +42,103 @@ def mover_sl_break_even(symbol, ticket, entry_price, tp):
     result = mt5.order_send(sl_request)
     if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
         print(f"[BE] SL movido a BE para posición {ticket}")
-    else:
-        print(f"[BE-ERROR] Fallo mover SL a BE {ticket}: {getattr(result, 'comment', '')}")
+        return True
+    print(f"[BE-ERROR] Fallo mover SL a BE {ticket}: {getattr(result, 'comment', '')}")
+    return False
+
+
+# ---------------- Cache de triggers por ticket ----------------
+# ticket -> (firma, trigger, tp_1). La firma (entrada, tipo) cambia solo si la posición cambia,
+# así los niveles TP se calculan una vez por ticket y no en cada vuelta.
+_cache_triggers = {}
+
+def _trigger_de(pos):
+    firma = (pos.price_open, pos.type)
+    hit = _cache_triggers.get(pos.ticket)
+    if hit is not None and hit[0] == firma:
+        return hit[1], hit[2]
+    entry = pos.price_open
+    es_buy = pos.type == mt5.POSITION_TYPE_BUY
+    tipo_posicion = "buy" if es_buy else "sell"
+    digits, tick_size = precision_simbolo(pos.symbol)
+    niveles = calcular_tps_sl(entry, TPS, SL_BUY if es_buy else SL_SELL, side=tipo_posicion,
+                              digits=digits, tick_size=tick_size)
+    delta = BE_PIPS_TRIGGER / 100.0
+    trigger = entry + delta if es_buy else entry - delta
+    _cache_triggers[pos.ticket] = (firma, trigger, niveles["TP1"])
+    return trigger, niveles["TP1"]
+
+
+def _evaluar(es_buy, entradas, sls, triggers, bid, ask):
+    """
+    Evalúa todas las posiciones de un símbolo de una vez contra UN tick.
+    Devuelve (índices a mover, distancia mínima en pips a un trigger pendiente).
+    """
+    es_buy = np.asarray(es_buy, dtype=bool)
+    entradas = np.asarray(entradas, dtype=float)
+    sls = np.asarray(sls, dtype=float)
+    triggers = np.asarray(triggers, dtype=float)
+    precio = np.where(es_buy, bid, ask)
+    faltan = np.where(es_buy, triggers - precio, precio - triggers)  # <= 0 => alcanzado
+    sin_be = np.abs(sls - entradas) > tolerancia_sl
+    mover = np.nonzero((faltan <= 0) & sin_be)[0].tolist()
+    pendientes = faltan[(faltan > 0) & sin_be]
+    dist = float(pendientes.min()) * 100 if pendientes.size else None
+    return mover, dist
+
+
+def revisar_una_vez():
+    """
+    Una vuelta: UN positions_get y UN tick por símbolo; evaluación vectorizada.
+    Devuelve la distancia mínima (pips) a un trigger pendiente, o None si no hay.
+    """
+    posiciones = mt5.positions_get()
+    if posiciones is None:
+        return None
+    por_simbolo = {}
+    vivos = set()
+    for pos in posiciones:
+        vivos.add(pos.ticket)
+        if pos.symbol in SYMBOLS:
+            por_simbolo.setdefault(pos.symbol, []).append(pos)
+    # Olvidar tickets cerrados
+    for t in [t for t in _cache_triggers if t not in vivos]:
+        del _cache_triggers[t]
+
+    dist_min = None
+    for symbol, lista in por_simbolo.items():
+        tick = mt5.symbol_info_tick(symbol)
+        if not tick:
+            continue
+        triggers, tps1 = zip(*(_trigger_de(p) for p in lista))
+        mover, dist = _evaluar(
+            [p.type == mt5.POSITION_TYPE_BUY for p in lista],
+            [p.price_open for p in lista],
+            [p.sl for p in lista],
+            triggers, tick.bid, tick.ask,
+        )
+        for i in mover:
+            p = lista[i]
+            mover_sl_break_even(symbol, p.ticket, p.price_open, tps1[i])
+        if dist is not None and (dist_min is None or dist < dist_min):
+            dist_min = dist
+    return dist_min
+
+
+def _siguiente_intervalo(dist_pips):
+    if dist_pips is None:
+        return BE_MAX_INTERVAL
+    return max(BE_MIN_INTERVAL, min(BE_MAX_INTERVAL, dist_pips / BE_MAX_PIPS_PER_SEC))
 
 
 def revisar_posiciones():
     while True:
-        for symbol in SYMBOLS:
-            posiciones = mt5.positions_get(symbol=symbol)
-            if posiciones is None:
-                continue
-            for pos in posiciones:
-                entry = pos.price_open
-                tipo_posicion = "buy" if pos.type == mt5.POSITION_TYPE_BUY else "sell"
-                niveles = calcular_tps_sl(entry, TPS, SL_BUY if tipo_posicion == "buy" else SL_SELL, side=tipo_posicion)
-                tp_1 = niveles["TP1"]
-
-                current_price = mt5.symbol_info_tick(symbol).bid if pos.type == mt5.POSITION_TYPE_BUY else mt5.symbol_info_tick(symbol).ask
-
-                pips_ganados = (current_price - entry) if pos.type == mt5.POSITION_TYPE_BUY else (entry - current_price)
-                pips_ganados *= 100
-
-                sl_actual = pos.sl
-
-                if pips_ganados >= BE_PIPS_TRIGGER and abs(sl_actual - entry) > tolerancia_sl:
-                    mover_sl_break_even(symbol, pos.ticket, entry, tp_1)
-
-        time.sleep(5)
+        try:
+            dist = revisar_una_vez()
+        except Exception as e:
+            print(f"[BE-ERROR] {e}")
+            dist = None
+        time.sleep(_siguiente_intervalo(dist))
 
 
 def main():
@@ -78,4 +150,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,19 @@
+# broker.py
+"""
+Adaptador de broker. Todos los módulos del executor importan `mt5` desde acá:
+
+    from broker import mt5
+
+BROKER_BACKEND=mt5 (default) -> paquete MetaTrader5 real (Windows + terminal)
+BROKER_BACKEND=sim           -> mt5_sim, simulador en memoria (Linux/CI/benchmarks)
+"""
+import os
+
+BROKER_BACKEND = os.getenv("BROKER_BACKEND", "mt5").lower()
+
+if BROKER_BACKEND == "sim":
+    import mt5_sim as mt5
+else:
+    import MetaTrader5 as mt5
+
+__all__ = ["mt5", "BROKER_BACKEND"]
@@ -1,7 +1,13 @@
 from dotenv import load_dotenv
-import mysql.connector
 import os
+import threading
 from datetime import datetime
+from itertools import groupby
+
+from mysql.connector import errors as mysql_errors
+
+from db_pool import MySQLPool, PoolTimeout
+from rollups import refrescar_rollups
 
 load_dotenv()
 
@@ -12,21 +18,53 @@ MYSQL_USER = os.environ.get("MYSQL_USER")
 MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD")
 MYSQL_DATABASE = os.environ.get("MYSQL_DATABASE")
 
+# Pool de conexiones (lo comparten el loop principal y los threads auxiliares)
+MYSQL_POOL_SIZE     = int(os.environ.get("MYSQL_POOL_SIZE", "4"))
+MYSQL_POOL_TIMEOUT  = float(os.environ.get("MYSQL_POOL_TIMEOUT", "10"))
+MYSQL_POOL_IDLE_SEC = float(os.environ.get("MYSQL_POOL_IDLE_SEC", "300"))
+MYSQL_POOL_PING_SEC = float(os.environ.get("MYSQL_POOL_PING_SEC", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> MySQLPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = MySQLPool(
+                    dict(
+                        host=MYSQL_HOST,
+                        port=MYSQL_PORT,
+                        user=MYSQL_USER,
+                        password=MYSQL_PASSWORD,
+                        database=MYSQL_DATABASE,
+                    ),
+                    max_size=MYSQL_POOL_SIZE,
+                    timeout=MYSQL_POOL_TIMEOUT,
+                    idle_timeout=MYSQL_POOL_IDLE_SEC,
+                    ping_interval=MYSQL_POOL_PING_SEC,
+                )
+    return _pool
+
 def get_db():
-    return mysql.connector.connect(
-        host=MYSQL_HOST,
-        port=MYSQL_PORT,
-        user=MYSQL_USER,
-        password=MYSQL_PASSWORD,
-        database=MYSQL_DATABASE
-    )
+    """
+    Conexión del pool. conn.close() la devuelve al pool (no la cierra).
+    """
+    return _get_pool().acquire()
+
+def get_pool_stats() -> dict:
+    """
+    Métricas del pool: checkouts, esperas, tamaño, conexiones en uso/ociosas.
+    """
+    return _get_pool().stats()
 
 # ---------- OPERACIONES EN TABLA orders ----------
 
 def insert_order(order_type, price, symbol, source_order_id=None, account_login=None, status='pending'):
     """
     Helper opcional para insertar una orden específica.
-    Para fan-out usar INSERT ... SELECT desde tu backend.
+    Para fan-out el backend usa insert_orders_fanout (INSERT ... SELECT).
     """
     try:
         conn = get_db()
@@ -47,20 +85,30 @@ def insert_order(order_type, price, symbol, source_order_id=None, account_login=
         except:
             pass
 
-def get_pending_orders(account_login: str):
+# Columnas que usan el loop principal y ejecutar_orden (evita SELECT *)
+PENDING_ORDER_COLUMNS = "id, order_type, price, symbol, account_login, created_at"
+
+def get_pending_orders(account_login: str, after_id: int = None):
     """
-    Devuelve órdenes 'pending' SOLO de esta cuenta.
+    Devuelve órdenes 'pending' SOLO de esta cuenta, ordenadas por id.
+    Con after_id trae solo las de id > after_id (fetch incremental por watermark).
+    Usa el índice (account_login, status, id) de migrations/001.
     """
     try:
         conn = get_db()
         cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT *
+        query = f"""
+            SELECT {PENDING_ORDER_COLUMNS}
             FROM orders
             WHERE account_login = %s
               AND status = 'pending'
-            ORDER BY created_at ASC
-        """, (account_login,))
+        """
+        params = [account_login]
+        if after_id is not None:
+            query += " AND id > %s"
+            params.append(int(after_id))
+        query += " ORDER BY id ASC"
+        cur.execute(query, params)
         rows = cur.fetchall()
         return rows
     except Exception as e:
@@ -72,6 +120,179 @@ def get_pending_orders(account_login: str):
         except:
             pass
 
+def get_pending_orders_multi(account_logins, after_id: int = None):
+    """
+    Como get_pending_orders pero para varias cuentas en UNA consulta (supervisor.py).
+    Cada fila trae account_login para repartirlas entre los workers.
+    """
+    logins = [str(l) for l in account_logins]
+    if not logins:
+        return []
+    try:
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        marks = ", ".join(["%s"] * len(logins))
+        query = f"""
+            SELECT {PENDING_ORDER_COLUMNS}
+            FROM orders
+            WHERE account_login IN ({marks})
+              AND status = 'pending'
+        """
+        params = list(logins)
+        if after_id is not None:
+            query += " AND id > %s"
+            params.append(int(after_id))
+        query += " ORDER BY id ASC"
+        cur.execute(query, params)
+        return cur.fetchall()
+    except Exception as e:
+        print(f"[DB ERROR] get_pending_orders_multi({logins}): {e}")
+        return []
+    finally:
+        try:
+            cur.close(); conn.close()
+        except:
+            pass
+
+def claim_pending_orders(account_login: str, owner: str, limit: int = 50, lease_sec: int = 60,
+                         excluir=()):
+    """
+    Reclama atómicamente hasta `limit` órdenes de esta cuenta para `owner`:
+    'pending' (o 'claimed' con lease vencido) -> 'claimed' + claimed_by + lease_expires_at.
+    FOR UPDATE SKIP LOCKED: varios executors de la MISMA cuenta nunca toman la misma orden.
+    `excluir`: ids que el llamador todavía tiene en curso (no se re-reclaman aunque
+    su lease haya vencido). El lease se mantiene vivo con renovar_leases().
+    Requiere migrations/002 (y MySQL 8.0+).
+    """
+    return claim_pending_orders_multi([account_login], owner, limit=limit, lease_sec=lease_sec,
+                                      excluir=excluir)
+
+def claim_pending_orders_multi(account_logins, owner: str, limit: int = 50, lease_sec: int = 60,
+                               excluir=()):
+    """claim_pending_orders para varias cuentas en una sola transacción (supervisor.py)."""
+    logins = [str(l) for l in account_logins]
+    if not logins:
+        return []
+    excluir = [int(i) for i in excluir if i is not None]
+    try:
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        conn.start_transaction()
+        marks = ", ".join(["%s"] * len(logins))
+        sin = f"AND id NOT IN ({', '.join(['%s'] * len(excluir))})" if excluir else ""
+        cur.execute(f"""
+            SELECT {PENDING_ORDER_COLUMNS}, status AS prev_status, claimed_by AS prev_owner
+            FROM orders
+            WHERE account_login IN ({marks})
+              AND status IN ('pending', 'claimed')
+              AND (status = 'pending' OR lease_expires_at < NOW())
+              {sin}
+            ORDER BY id ASC
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (*logins, *excluir, int(limit)))
+        rows = cur.fetchall()
+        if rows:
+            ids = [r["id"] for r in rows]
+            marks = ", ".join(["%s"] * len(ids))
+            cur.execute(f"""
+                UPDATE orders
+                   SET status='claimed', claimed_by=%s,
+                       lease_expires_at=NOW() + INTERVAL %s SECOND, updated_at=NOW()
+                 WHERE id IN ({marks})
+            """, (owner, int(lease_sec), *ids))
+        conn.commit()
+        reclaimed = [r["id"] for r in rows if r["prev_status"] == "claimed"]
+        if reclaimed:
+            print(f"[DB] Leases vencidos reclamados por {owner}: {reclaimed}")
+        return rows
+    except Exception as e:
+        print(f"[DB ERROR] claim_pending_orders({logins},{owner}): {e}")
+        try:
+            conn.rollback()
+        except:
+            pass
+        return []
+    finally:
+        try:
+            cur.close(); conn.close()
+        except:
+            pass
+
+def renovar_leases(order_ids, owner: str, lease_sec: int = 60):
+    """
+    Heartbeat del claim: extiende lease_expires_at de las órdenes que `owner` todavía
+    tiene en 'claimed'. Devuelve el set de ids que siguen reclamadas por `owner` (las
+    que ya pasaron a un estado final, o que otro reclamó, no vuelven), o None si falló.
+    """
+    ids = sorted({int(i) for i in order_ids if i is not None})
+    if not ids:
+        return set()
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        conn.start_transaction()
+        marks = ", ".join(["%s"] * len(ids))
+        cur.execute(f"""
+            SELECT id FROM orders
+             WHERE id IN ({marks}) AND status = 'claimed' AND claimed_by = %s
+             FOR UPDATE
+        """, (*ids, owner))
+        vigentes = {int(r[0]) for r in cur.fetchall()}
+        if vigentes:
+            marks = ", ".join(["%s"] * len(vigentes))
+            cur.execute(f"""
+                UPDATE orders
+                   SET lease_expires_at=NOW() + INTERVAL %s SECOND
+                 WHERE id IN ({marks})
+            """, (int(lease_sec), *vigentes))
+        conn.commit()
+        return vigentes
+    except Exception as e:
+        print(f"[DB ERROR] renovar_leases({owner}): {e}")
+        try:
+            conn.rollback()
+        except:
+            pass
+        return None
+    finally:
+        try:
+            cur.close(); conn.close()
+        except:
+            pass
+
+def expirar_ordenes_viejas(account_logins, max_age_sec: int) -> int:
+    """
+    Backlog viejo (p. ej. tras un reinicio): pasa a 'expired' en UNA sentencia las
+    'pending' de estas cuentas con created_at de hace más de max_age_sec, para que
+    no se ejecuten tarde ni se vuelvan a traer. Devuelve cuántas expiró.
+    Si orders.status es ENUM ver migrations/004.
+    """
+    logins = [str(l) for l in account_logins]
+    if not logins or max_age_sec <= 0:
+        return 0
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        marks = ", ".join(["%s"] * len(logins))
+        cur.execute(f"""
+            UPDATE orders
+               SET status='expired', updated_at=NOW()
+             WHERE account_login IN ({marks})
+               AND status = 'pending'
+               AND created_at < NOW() - INTERVAL %s SECOND
+        """, (*logins, int(max_age_sec)))
+        conn.commit()
+        return cur.rowcount or 0
+    except Exception as e:
+        print(f"[DB ERROR] expirar_ordenes_viejas({logins}): {e}")
+        return 0
+    finally:
+        try:
+            cur.close(); conn.close()
+        except:
+            pass
+
 def update_order_status(order_id: int, account_login: str, new_status: str):
     """
     Actualiza el estado de ESA orden para ESTA cuenta.
@@ -107,6 +328,7 @@ def insertar_ejecucion(order_id, ticket, symbol, side, volume, entry_price, tp,
             INSERT INTO trades_log (order_id, ticket, symbol, side, volume, entry_price, tp, sl, open_time, status)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'open')
         """, (order_id, ticket, symbol, side, volume, entry_price, tp, sl, open_time))
+        refrescar_rollups(cur, order_ids=[order_id])
         conn.commit()
         # print(f"[DB] Trade ABIERTO. Ticket {ticket} | {side} {symbol} @ {entry_price}")
     except Exception as e:
@@ -126,6 +348,7 @@ def registrar_trade_cerrado(ticket, exit_price, close_time, comment=""):
                SET exit_price=%s, close_time=%s, status='closed', comment=%s
              WHERE ticket=%s
         """, (exit_price, close_time, comment, ticket))
+        refrescar_rollups(cur, tickets=[ticket])
         conn.commit()
     except Exception as e:
         print(f"[DB ERROR] registrar_trade_cerrado: {e}")
@@ -135,6 +358,131 @@ def registrar_trade_cerrado(ticket, exit_price, close_time, comment=""):
         except:
             pass
 
+# ---------- APLICACIÓN DEL JOURNAL WRITE-BEHIND ----------
+# Errores de conexión / bloqueo: el journal reintenta el lote entero sin contar intentos.
+# Cualquier otro (constraint, payload inválido, SQL) se aísla por entrada (journal.py).
+_ERRNO_TRANSITORIOS = {1040, 1053, 1205, 1213, 2002, 2003, 2005, 2006, 2013, 2055}
+
+def error_transitorio(e: Exception) -> bool:
+    if getattr(e, "errno", None) in _ERRNO_TRANSITORIOS:
+        return True
+    return isinstance(e, (PoolTimeout, mysql_errors.InterfaceError, mysql_errors.OperationalError,
+                          ConnectionError, TimeoutError, OSError))
+
+# kind -> (sentencia, params(key, payload)). Todas son idempotentes ante un replay:
+# trades_log usa journal_key UNIQUE (migrations/003); los UPDATE reescriben el mismo valor.
+_JOURNAL_SQL = {
+    "trade_open": (
+        """
+        INSERT INTO trades_log (order_id, ticket, symbol, side, volume, entry_price, tp, sl, open_time, status, journal_key)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'open', %s)
+        ON DUPLICATE KEY UPDATE journal_key = journal_key
+        """,
+        lambda key, p: (p["order_id"], p["ticket"], p["symbol"], p["side"], p["volume"],
+                        p["entry_price"], p["tp"], p["sl"], p["open_time"], key),
+    ),
+}
+
+# Estados de órdenes / cierres de trades por UPDATE con CASE: hasta este número de filas por sentencia
+ORDER_STATUS_CHUNK = int(os.environ.get("ORDER_STATUS_CHUNK", "500"))
+
+def _aplicar_estados_orden(cur, estados):
+    """
+    Todos los cambios de estado del lote en un UPDATE ... CASE por cada
+    ORDER_STATUS_CHUNK órdenes (executemany de UPDATE son N sentencias).
+    Si una orden cambió dos veces en el lote gana el último estado.
+    """
+    ultimo = {}
+    for p in estados:
+        ultimo[(p["order_id"], str(p["account_login"]))] = p["status"]
+    items = list(ultimo.items())
+    for i in range(0, len(items), ORDER_STATUS_CHUNK):
+        chunk = items[i:i + ORDER_STATUS_CHUNK]
+        casos = " ".join(["WHEN id=%s AND account_login=%s THEN %s"] * len(chunk))
+        pares = ", ".join(["(%s, %s)"] * len(chunk))
+        params = [v for (oid, acc), st in chunk for v in (oid, acc, st)]
+        params += [v for (oid, acc), _st in chunk for v in (oid, acc)]
+        cur.execute(f"""
+            UPDATE orders
+               SET status = CASE {casos} ELSE status END, updated_at=NOW()
+             WHERE (id, account_login) IN ({pares})
+        """, params)
+
+def _aplicar_cierres(cur, cierres):
+    """
+    trade_closed del lote (p. ej. una pasada del reconciliador) en un UPDATE ... CASE
+    por cada ORDER_STATUS_CHUNK tickets, en vez de un UPDATE por ticket.
+    """
+    ultimo = {}
+    for p in cierres:
+        ultimo[p["ticket"]] = (p["exit_price"], p["close_time"], p.get("comment", ""))
+    items = list(ultimo.items())
+    for i in range(0, len(items), ORDER_STATUS_CHUNK):
+        chunk = items[i:i + ORDER_STATUS_CHUNK]
+        caso = " ".join(["WHEN %s THEN %s"] * len(chunk))
+        params = []
+        for campo in range(3):
+            params += [v for ticket, vals in chunk for v in (ticket, vals[campo])]
+        params += [ticket for ticket, _vals in chunk]
+        cur.execute(f"""
+            UPDATE trades_log
+               SET exit_price = CASE ticket {caso} END,
+                   close_time = CASE ticket {caso} END,
+                   comment    = CASE ticket {caso} END,
+                   status='closed'
+             WHERE ticket IN ({", ".join(["%s"] * len(chunk))})
+        """, params)
+
+def aplicar_journal(entries):
+    """
+    Aplica un lote del journal [(seq, kind, key, payload), ...] en UNA transacción,
+    agrupando entradas consecutivas del mismo tipo en un executemany.
+    Los order_status (solo tocan `orders`) y los trade_closed se juntan de todo el
+    lote y van al final, cada tipo en un único UPDATE con CASE (los cierres después
+    de los trade_open del mismo lote). Después se recalculan los rollups
+    (rollups.py) de los trades abiertos/cerrados en el lote.
+    A diferencia de los demás helpers, LANZA la excepción: el journal reintenta el lote.
+    """
+    estados = [payload for _, kind, _, payload in entries if kind == "order_status"]
+    cierres = [payload for _, kind, _, payload in entries if kind == "trade_closed"]
+    entries = [e for e in entries if e[1] not in ("order_status", "trade_closed")]
+    conn = get_db()
+    cur = None
+    try:
+        cur = conn.cursor()
+        conn.start_transaction()
+        for kind, grupo in groupby(entries, key=lambda e: e[1]):
+            spec = _JOURNAL_SQL.get(kind)
+            grupo = list(grupo)
+            if spec is None:
+                print(f"[DB ERROR] aplicar_journal: tipo desconocido '{kind}' ({len(grupo)} entradas descartadas)")
+                continue
+            sql, params = spec
+            cur.executemany(sql, [params(key, payload) for _, _, key, payload in grupo])
+        if cierres:
+            _aplicar_cierres(cur, cierres)
+        if estados:
+            _aplicar_estados_orden(cur, estados)
+        refrescar_rollups(
+            cur,
+            tickets={p["ticket"] for p in cierres},
+            order_ids={p["order_id"] for _, kind, _, p in entries if kind == "trade_open"},
+        )
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except:
+            pass
+        raise
+    finally:
+        try:
+            if cur is not None:
+                cur.close()
+            conn.close()
+        except:
+            pass
+
 def get_open_trades(symbol=None, side=None):
     try:
         conn = get_db()
@@ -159,6 +507,33 @@ def get_open_trades(symbol=None, side=None):
         except:
             pass
 
+def get_open_tickets(account_login: str):
+    """
+    Tickets con status='open' en trades_log de ESTA cuenta (vía orders.account_login),
+    para el reconciliador. Devuelve un set; None si la consulta falló.
+    Usa idx_trades_log_status_ticket de migrations/006.
+    """
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT t.ticket
+              FROM trades_log t
+              JOIN orders o ON o.id = t.order_id
+             WHERE t.status = 'open'
+               AND t.ticket IS NOT NULL
+               AND o.account_login = %s
+        """, (account_login,))
+        return {int(r[0]) for r in cur.fetchall()}
+    except Exception as e:
+        print(f"[DB ERROR] get_open_tickets({account_login}): {e}")
+        return None
+    finally:
+        try:
+            cur.close(); conn.close()
+        except:
+            pass
+
 # --- NUEVO: cuentas activas (tabla counts) ---
 def get_active_counts():
     try:
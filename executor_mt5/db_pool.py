@@ -0,0 +1,254 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import errors as mysql_errors
+
+
+class PoolTimeout(Exception):
+    """No se liberó ninguna conexión del pool dentro del timeout."""
+
+
+# Errores que indican que la conexión quedó inservible (se descarta al devolverla)
+_CONN_ERRORS = (mysql_errors.OperationalError, mysql_errors.InterfaceError)
+
+
+class _PooledCursor:
+    """Cursor delegado: si falla por conexión caída, marca la conexión para descartarla."""
+
+    def __init__(self, owner, cursor):
+        self._owner = owner
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        try:
+            return self._cursor.execute(*args, **kwargs)
+        except _CONN_ERRORS:
+            self._owner._broken = True
+            raise
+
+    def executemany(self, *args, **kwargs):
+        try:
+            return self._cursor.executemany(*args, **kwargs)
+        except _CONN_ERRORS:
+            self._owner._broken = True
+            raise
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _PooledConnection:
+    """
+    Proxy de la conexión real. close() la devuelve al pool en lugar de cerrarla,
+    así los helpers de db.py siguen con su patrón conn = get_db() ... conn.close().
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._broken = False
+        self._released = False
+
+    def cursor(self, *args, **kwargs):
+        try:
+            return _PooledCursor(self, self._conn.cursor(*args, **kwargs))
+        except _CONN_ERRORS:
+            self._broken = True
+            raise
+
+    def commit(self):
+        try:
+            return self._conn.commit()
+        except _CONN_ERRORS:
+            self._broken = True
+            raise
+
+    def invalidate(self):
+        """Marca la conexión como rota: al cerrarla se descarta en vez de reutilizarse."""
+        self._broken = True
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._conn, broken=self._broken)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, _CONN_ERRORS):
+            self._broken = True
+        self.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class MySQLPool:
+    """
+    Pool acotado de conexiones mysql.connector.
+      - max_size: máximo de conexiones abiertas (en uso + ociosas)
+      - timeout: segundos que acquire() espera una conexión libre
+      - idle_timeout: se cierran las conexiones ociosas más viejas que esto
+      - ping_interval: si una conexión estuvo ociosa más que esto, se hace ping
+        antes de entregarla (y se reconecta si el ping falla)
+    """
+
+    def __init__(self, connect_kwargs: dict, max_size: int = 5, timeout: float = 5.0,
+                 idle_timeout: float = 300.0, ping_interval: float = 30.0):
+        self._kwargs = dict(connect_kwargs)
+        self.max_size = max(1, int(max_size))
+        self.timeout = float(timeout)
+        self.idle_timeout = float(idle_timeout)
+        self.ping_interval = float(ping_interval)
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, last_used) — derecha = más reciente
+        self._size = 0        # conexiones abiertas (ociosas + en uso)
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "evicted": 0,
+            "reconnects": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+        }
+
+    # ---------------- API ----------------
+    def acquire(self) -> _PooledConnection:
+        t0 = time.monotonic()
+        deadline = t0 + self.timeout
+        conn, last_used = None, None
+        waited = False
+        with self._cond:
+            stale = self._pop_expired_locked(t0)
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()  # LIFO: la más caliente
+                    break
+                if self._size < self.max_size:
+                    self._size += 1  # reservamos el hueco; conectamos fuera del lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    self._close_quietly(stale)
+                    raise PoolTimeout(f"pool agotado ({self.max_size} conexiones en uso)")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+        self._close_quietly(stale)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - last_used > self.ping_interval:
+                conn = self._validate(conn)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        wait_ms = (time.monotonic() - t0) * 1000.0
+        with self._cond:
+            st = self._stats
+            st["checkouts"] += 1
+            if waited:
+                st["waits"] += 1
+            st["wait_ms_total"] += wait_ms
+            if wait_ms > st["wait_ms_max"]:
+                st["wait_ms_max"] = wait_ms
+        return _PooledConnection(self, conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            st = dict(self._stats)
+            st["size"] = self._size
+            st["idle"] = len(self._idle)
+            st["in_use"] = self._in_use
+            st["max_size"] = self.max_size
+        st["wait_ms_avg"] = round(st["wait_ms_total"] / st["checkouts"], 3) if st["checkouts"] else 0.0
+        st["wait_ms_total"] = round(st["wait_ms_total"], 3)
+        st["wait_ms_max"] = round(st["wait_ms_max"], 3)
+        return st
+
+    def close_all(self):
+        with self._cond:
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        self._close_quietly(idle)
+
+    # ---------------- internos ----------------
+    def _connect(self):
+        conn = mysql.connector.connect(**self._kwargs)
+        with self._cond:
+            self._stats["created"] += 1
+        return conn
+
+    def _validate(self, conn):
+        try:
+            conn.ping(reconnect=False)
+            return conn
+        except Exception:
+            self._close_quietly([conn])
+            with self._cond:
+                self._stats["reconnects"] += 1
+            return self._connect()
+
+    def _release(self, conn, broken: bool = False):
+        if not broken:
+            # Un SELECT sin commit deja la transacción (y su snapshot REPEATABLE READ)
+            # abierta; si no se cierra, el siguiente usuario vería datos viejos.
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                broken = True
+
+        now = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._size -= 1
+                self._stats["discarded"] += 1
+                stale = []
+            else:
+                self._idle.append((conn, now))
+                stale = self._pop_expired_locked(now)
+            self._cond.notify()
+        if broken:
+            self._close_quietly([conn])
+        self._close_quietly(stale)
+
+    def _pop_expired_locked(self, now: float):
+        stale = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            stale.append(conn)
+        if stale:
+            self._size -= len(stale)
+            self._stats["evicted"] += len(stale)
+        return stale
+
+    @staticmethod
+    def _close_quietly(conns):
+        for c in conns or []:
+            try:
+                c.close()
+            except Exception:
+                pass
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+# Fallbacks para símbolos no configurados o claves faltantes (mismos valores que antes)
+TPS_DEFAULT = (0.2, 0.5, 1, 2, 3, 5)
+VOLUMES_DEFAULT = (0.01, 0.02, 0.03)
+SL_DEFAULT = 10.0
+
+
+class Estrategia(namedtuple("Estrategia", "raw mt5 enabled allow_safety tps_1 vol_1 tps_otros vol_otros tps_tp sl_percent")):
+    """
+    Config de un símbolo ya resuelta e inmutable (tuplas): los fallbacks de
+    tps_percent_1 / volumes_1 / *_OTROS se resuelven UNA vez al compilar.
+    tps_tp es el schedule con el que un TAKE PROFIT mueve el SL; su fallback es
+    tps_percent_1 -> tps_percent_OTROS (no tps_percent), como siempre lo resolvió ese camino.
+    """
+    __slots__ = ()
+
+    def sets(self, order_idx: int):
+        """order_idx=1 => (tps_1, vol_1); order_idx>=2 => (tps_otros, vol_otros)."""
+        if order_idx <= 1:
+            return self.tps_1, self.vol_1
+        return self.tps_otros, self.vol_otros
+
+
+def _tupla(v):
+    return tuple(float(x) for x in v) if v else None
+
+
+def compilar(raw: str, cfg: dict) -> Estrategia:
+    tps_1 = _tupla(cfg.get("tps_percent_1") or cfg.get("tps_percent")) or TPS_DEFAULT
+    vol_1 = _tupla(cfg.get("volumes_1") or cfg.get("volumes")) or VOLUMES_DEFAULT
+    return Estrategia(
+        raw=raw,
+        mt5=cfg.get("mt5", raw),
+        enabled=bool(cfg.get("enabled", True)),
+        allow_safety=bool(cfg.get("allow_safety_updates_when_off", False)),
+        tps_1=tps_1,
+        vol_1=vol_1,
+        tps_otros=_tupla(cfg.get("tps_percent_OTROS")) or tps_1,
+        vol_otros=_tupla(cfg.get("volumes_OTROS")) or vol_1,
+        tps_tp=_tupla(cfg.get("tps_percent_1") or cfg.get("tps_percent_OTROS")) or TPS_DEFAULT,
+        sl_percent=float(cfg.get("sl_percent", SL_DEFAULT)),
+    )
+
+
+def _passthrough(raw: str) -> Estrategia:
+    # Símbolo no configurado: se opera con su mismo nombre en MT5 y los valores por defecto
+    return Estrategia(raw, raw, True, False, TPS_DEFAULT, VOLUMES_DEFAULT,
+                      TPS_DEFAULT, VOLUMES_DEFAULT, TPS_DEFAULT, SL_DEFAULT)
+
+
+class TablaEstrategias:
+    """Snapshot inmutable de todas las estrategias (se reemplaza entero, nunca se edita)."""
+
+    def __init__(self, symbols: dict, origen: str = "default", version: str = ""):
+        self._por_raw = {raw: compilar(raw, cfg) for raw, cfg in symbols.items()}
+        self._passthrough = {}
+        self.origen = origen
+        self.version = version
+
+    def get(self, symbol_raw: str) -> Estrategia:
+        est = self._por_raw.get(symbol_raw)
+        if est is None:
+            est = self._passthrough.get(symbol_raw)
+            if est is None:
+                est = self._passthrough.setdefault(symbol_raw, _passthrough(symbol_raw))
+        return est
+
+    def __contains__(self, symbol_raw) -> bool:
+        return symbol_raw in self._por_raw
+
+    def __iter__(self):
+        return iter(self._por_raw.values())
+
+    def __len__(self) -> int:
+        return len(self._por_raw)
+
+
+class EstrategiasStore:
+    """
+    Tabla actual + hot-reload desde un JSON con el mismo formato que SYMBOLS:
+
+        {"XAUUSD": {"mt5": "GOLD", "enabled": true, "tps_percent_1": [...], ...}, ...}
+
+    Un thread revisa (mtime, tamaño) cada `interval` segundos; si cambió y el
+    contenido (hash) también, compila una tabla NUEVA y la publica con una sola
+    asignación. Quien hizo `store.actual` sigue con su snapshot completo: nunca ve
+    una config a medias. Si el archivo no existe o es inválido se queda la tabla anterior.
+    """
+
+    def __init__(self, path: str, defaults: dict, interval: float = 2.0):
+        self.path = path
+        self.interval = float(interval)
+        self._firma = None
+        self._hash = None
+        self._started = False
+        self.recargas = 0
+        self.errores = 0
+        self.actual = TablaEstrategias(defaults, origen="default")
+        self.recargar_si_cambio()
+
+    def get(self, symbol_raw: str) -> Estrategia:
+        return self.actual.get(symbol_raw)
+
+    def recargar_si_cambio(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        firma = (st.st_mtime_ns, st.st_size)
+        if firma == self._firma:
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                contenido = f.read()
+            h = hashlib.sha1(contenido).hexdigest()
+            if h == self._hash:
+                self._firma = firma
+                return False
+            data = json.loads(contenido.decode("utf-8"))
+            if not isinstance(data, dict):
+                raise ValueError("se esperaba un objeto {símbolo: config}")
+            tabla = TablaEstrategias(data, origen=self.path, version=h[:10])
+        except Exception as e:
+            self.errores += 1
+            self._firma = firma  # no reintentar hasta que el archivo vuelva a cambiar
+            print(f"[CFG] {self.path} inválido; sigo con la config anterior: {e}")
+            return False
+        self.actual = tabla
+        self._firma, self._hash = firma, h
+        self.recargas += 1
+        print(f"[CFG] Estrategias recargadas desde {self.path} ({len(tabla)} símbolos, v={tabla.version})")
+        return True
+
+    def start(self):
+        if self._started:
+            return self
+        self._started = True
+        threading.Thread(target=self._loop, name="estrategias-reload", daemon=True).start()
+        return self
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.recargar_si_cambio()
@@ -0,0 +1,247 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from metricas import observar
+
+
+class WriteJournal:
+    """
+    Journal local append-only (SQLite en modo WAL) para escrituras write-behind.
+      - append() commitea en disco local y vuelve en microsegundos
+      - un thread flusher drena por lotes con apply_batch(entries) (MySQL, una transacción)
+      - si apply_batch falla por un error transitorio (MySQL caído), reintenta el lote
+        con backoff exponencial sin perder nada
+      - si falla por otra cosa, aplica el lote de a una entrada: las buenas se drenan y
+        solo la mala queda retenida (con su propio backoff); a los max_attempts intentos
+        pasa a la tabla journal_dead y el drenado sigue
+      - cada entrada lleva una idempotency key para que un replay no duplique filas
+    entries = [(seq, kind, key, payload_dict), ...] en orden de llegada.
+    es_transitorio(exc) -> bool decide si un error es de conexión (no cuenta intentos).
+    """
+
+    def __init__(self, path: str, apply_batch, batch_size: int = 200,
+                 flush_interval: float = 0.5, max_backoff: float = 30.0,
+                 max_attempts: int = 5, es_transitorio=None):
+        self.path = path
+        self.apply_batch = apply_batch
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.max_backoff = float(max_backoff)
+        self.max_attempts = max(1, int(max_attempts))
+        self.es_transitorio = es_transitorio or _es_transitorio
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS journal (
+                seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind     TEXT NOT NULL,
+                key      TEXT NOT NULL,
+                payload  TEXT NOT NULL,
+                created  REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        columnas = {r[1] for r in self._conn.execute("PRAGMA table_info(journal)")}
+        if "retry_at" not in columnas:  # journal de una versión anterior
+            self._conn.execute("ALTER TABLE journal ADD COLUMN retry_at REAL NOT NULL DEFAULT 0")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS journal_dead (
+                seq      INTEGER PRIMARY KEY,
+                kind     TEXT NOT NULL,
+                key      TEXT NOT NULL,
+                payload  TEXT NOT NULL,
+                created  REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                error    TEXT,
+                dead_at  REAL NOT NULL
+            )
+        """)
+        # Todo lo que quedó en disco de una corrida anterior se considera sin drenar
+        row = self._conn.execute("SELECT MIN(seq) FROM journal").fetchone()
+        self._flushed_seq = (row[0] - 1) if row and row[0] is not None else self._max_seq()
+        self._started = False
+        self.flushed = 0
+        self.failures = 0
+        self.dead = 0
+        self.last_error = None
+
+    # ---------------- API ----------------
+    def append(self, kind: str, payload: dict, key: str = None) -> int:
+        """Guarda la escritura en el journal local. Devuelve su seq."""
+        key = key or uuid.uuid4().hex
+        t0 = time.perf_counter()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO journal (kind, key, payload, created) VALUES (?, ?, ?, ?)",
+                (kind, key, json.dumps(payload, default=str), time.time()),
+            )
+            seq = cur.lastrowid
+        observar("journal.append", (time.perf_counter() - t0) * 1000.0)
+        self._wake.set()
+        return seq
+
+    def last_seq(self) -> int:
+        """Seq de la última entrada emitida (drenada o no)."""
+        with self._lock:
+            return self._max_seq()
+
+    @property
+    def flushed_seq(self) -> int:
+        """Toda entrada con seq <= flushed_seq ya está en MySQL."""
+        return self._flushed_seq
+
+    def pending_entries(self, kind: str = None):
+        """Entradas aún no drenadas (para reconstruir estado al arrancar)."""
+        q = "SELECT seq, kind, key, payload FROM journal"
+        params = ()
+        if kind:
+            q += " WHERE kind = ?"
+            params = (kind,)
+        q += " ORDER BY seq"
+        with self._lock:
+            rows = self._conn.execute(q, params).fetchall()
+        return [(seq, k, key, json.loads(p)) for seq, k, key, p in rows]
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+    def start(self):
+        if not self._started:
+            self._started = True
+            threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True).start()
+        return self
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Pide un drenado y espera hasta timeout. True si quedó vacío."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.pending() == 0:
+                return True
+            self._wake.set()
+            time.sleep(0.05)
+        return self.pending() == 0
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending(),
+            "flushed": self.flushed,
+            "failures": self.failures,
+            "dead": self.dead,
+            "dead_total": self.dead_letters(),
+            "flushed_seq": self._flushed_seq,
+            "last_error": self.last_error,
+        }
+
+    def dead_letters(self) -> int:
+        """Entradas descartadas tras max_attempts (quedan en journal_dead para revisar a mano)."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal_dead").fetchone()[0]
+
+    # ---------------- internos ----------------
+    def _max_seq(self) -> int:
+        row = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name='journal'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _actualizar_flushed(self):
+        # Bajo self._lock. Todo lo anterior a la entrada pendiente más vieja ya está en MySQL
+        # (o en journal_dead): así una entrada retenida no frena a las posteriores más de lo debido.
+        row = self._conn.execute("SELECT MIN(seq) FROM journal").fetchone()
+        if row and row[0] is not None:
+            self._flushed_seq = max(self._flushed_seq, row[0] - 1)
+        else:
+            self._flushed_seq = max(self._flushed_seq, self._max_seq())
+
+    def _read_batch(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, kind, key, payload FROM journal WHERE retry_at <= ? ORDER BY seq LIMIT ?",
+                (time.time(), self.batch_size),
+            ).fetchall()
+            if not rows:
+                # Vacío bajo el mismo lock que append(): todo lo emitido ya está drenado
+                self._actualizar_flushed()
+        return [(seq, kind, key, json.loads(p)) for seq, kind, key, p in rows]
+
+    def _borrar(self, seqs):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM journal WHERE seq IN ({','.join('?' * len(seqs))})", seqs)
+            self._actualizar_flushed()
+        self.flushed += len(seqs)
+
+    def _retener(self, entry, error: Exception):
+        """Una entrada que falla sola: +1 intento y reintento diferido; a los max_attempts, a journal_dead."""
+        seq, kind, key, _payload = entry
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM journal WHERE seq = ?", (seq,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            if attempts >= self.max_attempts:
+                self._conn.execute("""
+                    INSERT OR REPLACE INTO journal_dead (seq, kind, key, payload, created, attempts, error, dead_at)
+                    SELECT seq, kind, key, payload, created, ?, ?, ? FROM journal WHERE seq = ?
+                """, (attempts, str(error), time.time(), seq))
+                self._conn.execute("DELETE FROM journal WHERE seq = ?", (seq,))
+                self._actualizar_flushed()
+            else:
+                espera = min(self.max_backoff, 2.0 ** attempts)
+                self._conn.execute("UPDATE journal SET attempts = ?, retry_at = ? WHERE seq = ?",
+                                   (attempts, time.time() + espera, seq))
+        if attempts >= self.max_attempts:
+            self.dead += 1
+            print(f"[JOURNAL] Entrada {seq} ({kind}, key={key}) descartada tras {attempts} intentos "
+                  f"-> journal_dead: {error}")
+        else:
+            print(f"[JOURNAL] Entrada {seq} ({kind}) falló ({error}); intento {attempts}/{self.max_attempts}")
+
+    def _aplicar_de_a_una(self, batch) -> bool:
+        """Aísla la(s) entrada(s) mala(s) del lote. False si apareció un error transitorio."""
+        for entry in batch:
+            try:
+                self.apply_batch([entry])
+            except Exception as e:
+                if self.es_transitorio(e):
+                    return False
+                self._retener(entry, e)
+                continue
+            self._borrar([entry[0]])
+        return True
+
+    def _flush_loop(self):
+        backoff = 0.0
+        while True:
+            if backoff:
+                time.sleep(backoff)  # MySQL caído: no martillar aunque sigan llegando appends
+            else:
+                self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while True:
+                batch = self._read_batch()
+                if not batch:
+                    backoff = 0.0
+                    break
+                t0 = time.perf_counter()
+                try:
+                    self.apply_batch(batch)
+                    observar("db.journal_apply", (time.perf_counter() - t0) * 1000.0)
+                except Exception as e:
+                    self.failures += 1
+                    self.last_error = str(e)
+                    if not self.es_transitorio(e) and self._aplicar_de_a_una(batch):
+                        continue  # malas retenidas, el resto ya drenó
+                    backoff = min(self.max_backoff, max(1.0, backoff * 2))
+                    print(f"[JOURNAL] Error drenando {len(batch)} entradas ({e}); reintento en {backoff:.0f}s")
+                    break
+                self._borrar([b[0] for b in batch])
+                backoff = 0.0
+
+
+def _es_transitorio(e: Exception) -> bool:
+    """Default sin conocer el driver: errores de red/timeout son transitorios."""
+    return isinstance(e, (ConnectionError, TimeoutError, OSError))
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+
+from broker import mt5
+
+_ON = ("1", "true", "yes", "activo", "active")
+_OFF = ("0", "false", "no", "inactivo")
+
+
+def _parsear_flag(raw: str) -> bool:
+    if "on" in raw or raw in _ON:
+        return True
+    if "off" in raw or raw in _OFF:
+        return False
+    return False
+
+
+class ModoAuto:
+    """
+    Estado ON/OFF del bot resuelto en segundo plano. leer() devuelve la última
+    tupla (valor, src, det) ya calculada: una lectura de atributo, sin IPC ni disco.
+
+    Prioridad (igual que antes): override de Telegram > MT5 trade_allowed (si
+    use_mt5) > auto_mode.flag > AUTO_MODE del entorno.
+
+      - el flag se relee solo cuando cambia su (mtime, tamaño), cada file_interval s
+      - terminal_info() se consulta cada probe_interval s (no en cada vuelta del loop)
+      - set_override() (/pause, /resume) escribe el flag y publica al instante
+      - subscribe(fn): fn(valor, src, det) se llama en cada cambio de valor
+    """
+
+    def __init__(self, flag_file: str, use_mt5: bool, env_default: bool,
+                 file_interval: float = 0.5, probe_interval: float = 5.0):
+        self.flag_file = flag_file
+        self.use_mt5 = use_mt5
+        self.env_default = env_default
+        self.file_interval = float(file_interval)
+        self.probe_interval = float(probe_interval)
+        self._lock = threading.Lock()
+        self._override = None           # None = sin override, True=ON, False=OFF
+        self._mt5 = (None, "mt5", "sin-probar")
+        self._file = (None, "file", "missing")
+        self._file_firma = None
+        self._estado = None             # (valor, src, det) publicado
+        self._subs = []
+        self._started = False
+        self.probes = 0
+        self.file_reads = 0
+
+    # ---------------- fuentes ----------------
+    def _probar_mt5(self):
+        try:
+            term = mt5.terminal_info()
+            if term is None:
+                r = (None, "mt5", "no-terminal-info")
+            else:
+                val = bool(getattr(term, "trade_allowed", False))
+                r = (val, "mt5", f"trade_allowed={val}")
+        except Exception as e:
+            r = (None, "mt5", f"error:{e}")
+        self.probes += 1
+        self._mt5 = r
+
+    def _leer_flag_si_cambio(self):
+        try:
+            st = os.stat(self.flag_file)
+        except OSError:
+            self._file_firma = None
+            self._file = (None, "file", "missing")
+            return
+        firma = (st.st_mtime_ns, st.st_size)
+        if firma == self._file_firma:
+            return
+        try:
+            with open(self.flag_file, "r", encoding="utf-8", errors="ignore") as f:
+                raw = f.read().strip().lower()
+            self._file = (_parsear_flag(raw), "file", raw)
+            self._file_firma = firma
+            self.file_reads += 1
+        except Exception as e:
+            self._file = (None, "file", f"error:{e}")
+
+    def _resolver(self):
+        if self._override is not None:
+            return self._override, "manual", "telegram"
+        if self.use_mt5 and self._mt5[0] is not None:
+            return self._mt5
+        if self._file[0] is not None:
+            return self._file
+        return self.env_default, "env", str(self.env_default)
+
+    def _publicar(self):
+        with self._lock:
+            nuevo = self._resolver()
+            previo = self._estado
+            self._estado = nuevo
+            subs = list(self._subs)
+        if previo is None or previo[0] != nuevo[0]:
+            for fn in subs:
+                try:
+                    fn(*nuevo)
+                except Exception as e:
+                    print(f"[MODO] Error en subscriber: {e}")
+
+    # ---------------- API ----------------
+    def refresh(self, probar_mt5: bool = True):
+        if probar_mt5 and self.use_mt5:
+            self._probar_mt5()
+        self._leer_flag_si_cambio()
+        self._publicar()
+
+    def leer(self):
+        estado = self._estado
+        if estado is None:
+            self.refresh()
+            estado = self._estado
+        return estado
+
+    @property
+    def activo(self) -> bool:
+        return self.leer()[0]
+
+    @property
+    def override(self):
+        return self._override
+
+    def set_override(self, on: bool) -> bool:
+        """Override manual (Telegram) + persistencia en el flag. Efecto inmediato."""
+        with self._lock:
+            self._override = bool(on)
+            ok = self._escribir_flag(on)
+        self._publicar()
+        return ok
+
+    def subscribe(self, fn):
+        with self._lock:
+            self._subs.append(fn)
+
+    def _escribir_flag(self, on: bool) -> bool:
+        # tmp por proceso: en modo supervisor varios workers comparten el mismo flag
+        tmp = f"{self.flag_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("on" if on else "off")
+            os.replace(tmp, self.flag_file)
+            return True
+        except Exception as e:
+            print(f"[FILE] Error al escribir auto_mode.flag: {e}")
+            return False
+
+    def start(self):
+        if self._started:
+            return self
+        self._started = True
+        self.refresh()
+        threading.Thread(target=self._loop, name="modo-auto", daemon=True).start()
+        return self
+
+    def _loop(self):
+        ultimo_probe = time.monotonic()
+        while True:
+            time.sleep(self.file_interval)
+            probar = time.monotonic() - ultimo_probe >= self.probe_interval
+            if probar:
+                ultimo_probe = time.monotonic()
+            try:
+                self.refresh(probar_mt5=probar)
+            except Exception as e:
+                print(f"[MODO] Error refrescando: {e}")
@@ -1,21 +1,36 @@
 # -*- coding: utf-8 -*-
 import os
+import queue
+import socket
 import time
 import threading
-import re
 from datetime import datetime
 from typing import Optional
 
 import requests
-import MetaTrader5 as mt5
+from broker import mt5
 
 # === Dependencias del proyecto (db en mismo folder) ===
-from db import insertar_ejecucion, get_pending_orders, update_order_status
+from db import (get_pending_orders, claim_pending_orders, renovar_leases, aplicar_journal,
+                expirar_ordenes_viejas, get_open_tickets, error_transitorio)
 from mt5_utils import (
-    cerrar_posiciones_hasta_vacio,
+    aplanar_simbolo,
+    fusionar_reportes,
     calcular_tps_porcentaje,
-    mover_sl_en_take_profit_inmediato,  # Mueve SL de inmediato según TP recibido
+    precision_simbolo,
+    mover_sl_en_take_profit_lote,  # Mueve SL de inmediato según TP recibido (masivo)
 )
+from order_wakeup import OrderWakeup
+from pipeline import StageWorker, KeyedLanes
+from journal import WriteJournal
+from position_book import PositionBook
+from senales import clasificar
+from estrategias import EstrategiasStore, Estrategia
+import metricas
+from metricas import observar, span
+from modo_auto import ModoAuto
+from telegram_listener import escuchar_comandos
+from reconciliador import Reconciliador
 
 # =====================================================================
 # ===============            CONFIG RÁPIDA            ==================
@@ -24,6 +39,8 @@ from mt5_utils import (
 # *** SIMPLE PARA ÓRDENES MÚLTIPLES ***
 #   La 1ª orden usa *_1
 #   Las siguientes (2ª, 3ª, …) usan *_OTROS
+# Estos son los valores por defecto: si existe STRATEGIES_FILE (JSON con el mismo formato)
+# lo reemplaza y se recarga en caliente al editarlo, sin reiniciar (ver estrategias.py).
 SYMBOLS = {
     "XAUUSD": {
         "mt5": "GOLD",
@@ -60,76 +77,161 @@ USE_MT5_AUTOTRADING = os.getenv("USE_MT5_AUTOTRADING", "true").lower() == "true"
 BASE_DIR       = os.path.dirname(os.path.abspath(__file__))
 AUTO_MODE_FILE = os.getenv("AUTO_MODE_FILE") or os.path.join(BASE_DIR, "auto_mode.flag")
 AUTO_MODE_ENV_DEFAULT = os.getenv("AUTO_MODE", "false").lower() == "true"
+# El flag se revisa por mtime cada AUTO_MODE_FILE_SEC; terminal_info() cada AUTO_MODE_PROBE_SEC
+AUTO_MODE_FILE_SEC  = float(os.getenv("AUTO_MODE_FILE_SEC", "0.5"))
+AUTO_MODE_PROBE_SEC = float(os.getenv("AUTO_MODE_PROBE_SEC", "5"))
 
 EXPECTED_MT5_LOGIN   = os.getenv("EXPECTED_MT5_LOGIN")
 STRICT_ACCOUNT_CHECK = os.getenv("STRICT_ACCOUNT_CHECK", "true").lower() == "true"
 
+STRATEGIES_FILE       = os.getenv("STRATEGIES_FILE") or os.path.join(BASE_DIR, "estrategias.json")
+STRATEGIES_RELOAD_SEC = float(os.getenv("STRATEGIES_RELOAD_SEC", "2"))
+_estrategias = EstrategiasStore(STRATEGIES_FILE, SYMBOLS, interval=STRATEGIES_RELOAD_SEC)
+
 # DEFAULT_SYMBOL para checks de arranque
-DEFAULT_SYMBOL_RAW = next(iter(SYMBOLS.keys())) if SYMBOLS else "XAUUSD"
-DEFAULT_SYMBOL_MT5 = SYMBOLS.get(DEFAULT_SYMBOL_RAW, {}).get("mt5", DEFAULT_SYMBOL_RAW)
+_primera = next(iter(_estrategias.actual), None)
+DEFAULT_SYMBOL_RAW = _primera.raw if _primera else "XAUUSD"
+DEFAULT_SYMBOL_MT5 = _primera.mt5 if _primera else DEFAULT_SYMBOL_RAW
 
 OFF_ALERT_INTERVAL_SEC = int(os.getenv("OFF_ALERT_INTERVAL_SEC", "900"))  # 15 min
+
+# Entrega push: long-poll al backend para despertar al instante; el polling queda de fallback
+BACKEND_URL       = os.getenv("BACKEND_URL", "")
+ORDERS_WAIT_TOKEN = os.getenv("ORDERS_WAIT_TOKEN", "")
+POLL_INTERVAL_SEC = float(os.getenv("POLL_INTERVAL_SEC", "5"))
+_wakeup = OrderWakeup(BACKEND_URL, ORDERS_WAIT_TOKEN)
+
+# Fetch incremental: solo órdenes con id > watermark. Cada FULL_RESYNC_EVERY vueltas se
+# hace un fetch completo (atrapa ids que se commitearon fuera de orden y pendientes que
+# otro proceso devolvió a 'pending'). Los fallos propios se reintentan en cada poll (_reintentar).
+FULL_RESYNC_EVERY = int(os.getenv("FULL_RESYNC_EVERY", "12"))
+_last_order_id: Optional[int] = None
+_loops_since_resync = 0
+
+# Backlog viejo: en cada resync completo las 'pending' con más de ORDER_MAX_AGE_SEC pasan
+# a 'expired' en una sola sentencia (0 = nunca expiran, como antes).
+ORDER_MAX_AGE_SEC = int(os.getenv("ORDER_MAX_AGE_SEC", "0"))
+
+# Claim atómico (migrations/002): permite varios executors por cuenta sin doble ejecución.
+# La orden pasa a 'claimed' con lease; mientras está en el pipeline un heartbeat lo renueva
+# cada CLAIM_LEASE_SEC/3, así que solo vence (y otro la reclama) si el proceso muere.
+CLAIM_ORDERS    = os.getenv("CLAIM_ORDERS", "false").lower() == "true"
+CLAIM_BATCH     = int(os.getenv("CLAIM_BATCH", "50"))
+CLAIM_LEASE_SEC = int(os.getenv("CLAIM_LEASE_SEC", "60"))
+EXECUTOR_ID     = os.getenv("EXECUTOR_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Pipeline: ingest (loop principal) -> route -> ejecución serializada por símbolo
+# -> efectos laterales (journal local para la DB, worker propio para Telegram).
+# Un Telegram lento o un write a la DB nunca retrasa el order_send de la siguiente orden.
+_route_worker = StageWorker("route")
+_tg_worker    = StageWorker("side-tg")
+_lanes        = KeyedLanes("exec")
+
+# Journal write-behind: trades_log y estados de órdenes se guardan al instante en un
+# SQLite local (WAL) y un flusher los drena a MySQL por lotes, con reintentos.
+JOURNAL_PATH = os.getenv("JOURNAL_PATH") or os.path.join(BASE_DIR, "journal.db")
+# Una entrada que falla por algo que no es de conexión se reintenta sola hasta
+# JOURNAL_MAX_ATTEMPTS veces y después pasa a journal_dead (sin frenar al resto).
+JOURNAL_MAX_ATTEMPTS = int(os.getenv("JOURNAL_MAX_ATTEMPTS", "5"))
+_journal = WriteJournal(JOURNAL_PATH, aplicar_journal, max_attempts=JOURNAL_MAX_ATTEMPTS,
+                        es_transitorio=error_transitorio)
+
+# Libro de posiciones en memoria (conteos/volumen/entrada media por símbolo y lado).
+# Se refresca por diff de tickets cada BOOK_REFRESH_SEC y con cada order_send confirmado;
+# si quedó más viejo que BOOK_MAX_AGE_SEC (p. ej. el thread no arrancó) se refresca en el momento.
+BOOK_REFRESH_SEC = float(os.getenv("BOOK_REFRESH_SEC", "1.0"))
+BOOK_MAX_AGE_SEC = float(os.getenv("BOOK_MAX_AGE_SEC", "5.0"))
+_book = PositionBook(BOOK_REFRESH_SEC)
+
+# Reconciliador: cada RECONCILE_SEC cierra en trades_log lo que MT5 ya cerró (TP/SL,
+# /closeall, a mano), leyendo solo los deals nuevos desde la marca guardada en
+# RECONCILE_STATE_FILE. La primera vez mira RECONCILE_LOOKBACK_DAYS hacia atrás. 0 = apagado.
+RECONCILE_SEC           = float(os.getenv("RECONCILE_SEC", "30"))
+RECONCILE_LOOKBACK_DAYS = float(os.getenv("RECONCILE_LOOKBACK_DAYS", "7"))
+RECONCILE_STATE_FILE    = os.getenv("RECONCILE_STATE_FILE") or f"{os.path.splitext(JOURNAL_PATH)[0]}-reconcile.json"
+_reconciliador = Reconciliador(
+    lambda: get_open_tickets(ACCOUNT_LOGIN),
+    lambda *args: registrar_cierre(*args),
+    RECONCILE_STATE_FILE,
+    interval=RECONCILE_SEC or 30.0,
+    lookback_sec=RECONCILE_LOOKBACK_DAYS * 86400,
+)
+
+# Latencias por etapa (metricas.py): GET http://127.0.0.1:METRICS_PORT/metrics y/o
+# un JSON en METRICS_FILE reescrito cada METRICS_FILE_SEC. Vacíos = sin exportar.
+METRICS_PORT     = int(os.getenv("METRICS_PORT", "0") or 0)
+METRICS_FILE     = os.getenv("METRICS_FILE", "")
+METRICS_FILE_SEC = float(os.getenv("METRICS_FILE_SEC", "10"))
+
+# Órdenes dentro del pipeline: id -> None (en proceso) o seq del journal que debe
+# llegar a MySQL antes de soltarla (así un resync no la re-ingesta como 'pending').
+_in_flight: dict = {}
+_in_flight_lock = threading.Lock()
+# Órdenes que salieron del pipeline sin estado final (falló MT5, /pause a mitad de camino):
+# siguen 'pending' por debajo del watermark, así que cada poll las vuelve a pedir
+# en vez de esperar al resync completo. Se limpian solas cuando dejan de estar pendientes.
+_reintentar: set = set()
 _last_off_alert_ts = 0
 _prev_auto_mode = None
 
-# Override manual desde Telegram (/pause, /resume)
-_manual_override: Optional[bool] = None  # None = sin override, True=ON, False=OFF
+# Modo ON/OFF (override de Telegram /pause /resume, MT5, flag, env) resuelto en segundo plano
+_modo = ModoAuto(AUTO_MODE_FILE, USE_MT5_AUTOTRADING, AUTO_MODE_ENV_DEFAULT,
+                 file_interval=AUTO_MODE_FILE_SEC, probe_interval=AUTO_MODE_PROBE_SEC)
 
 # Guarda el login de la cuenta MT5 que está ejecutando este bot
 ACCOUNT_LOGIN: Optional[str] = None
+
+# En modo supervisor (supervisor.py) los mensajes no salen de acá: se pasan al
+# supervisor, que los consolida y los envía. None = envío directo.
+_tg_sink = None
+# Idem para las órdenes que quedan para reintentar: el supervisor las vuelve a pedir
+_reintento_sink = None
 # ========================================================================
 
 
 # ---------------- Helper de acceso a config por símbolo -----------------
-def get_symbol_cfg(symbol_raw: str):
+def _estrategia(symbol_raw: str) -> Estrategia:
     """
-    Devuelve (cfg, symbol_mt5, enabled) para symbol_raw (ej: 'XAUUSD').
-    Si no existe en SYMBOLS, crea uno por defecto 'passthrough'.
+    Estrategia compilada para symbol_raw (ej: 'XAUUSD') desde la tabla vigente.
+    Si no está configurado, una 'passthrough' con valores por defecto (cacheada).
     """
-    base = SYMBOLS.get(symbol_raw)
-    if base:
-        return base, base.get("mt5", symbol_raw), bool(base.get("enabled", True))
-    # Fallback si llega un símbolo no configurado:
-    cfg = {
-        "mt5": symbol_raw,
-        "enabled": True,
-        "allow_safety_updates_when_off": False,
-        "tps_percent_1":    [0.2, 0.5, 1, 2, 3, 5],
-        "volumes_1":        [0.01, 0.02, 0.03],
-        "tps_percent_OTROS":[0.2, 0.5, 1, 2, 3, 5],
-        "volumes_OTROS":    [0.01, 0.02, 0.03],
-        "sl_percent": 10.0,
-    }
-    return cfg, symbol_raw, True
+    return _estrategias.get(symbol_raw)
 
 
-# --------- Resolver set según índice de orden (1ª vs OTROS) -------------
-def _get_sets(cfg: dict, order_idx: int):
-    """
-    order_idx=1 => usa *_1; order_idx>=2 => usa *_OTROS
-    Con fallback si faltara alguna clave (no se rompe).
-    """
-    tps_1 = cfg.get("tps_percent_1") or cfg.get("tps_percent") or [0.2, 0.5, 1, 2, 3, 5]
-    vol_1 = cfg.get("volumes_1")     or cfg.get("volumes")     or [0.01, 0.02, 0.03]
+# --------------- Utilidades ---------------
+# --------- Escrituras a la DB vía journal (no bloquean) ----------
+def registrar_ejecucion(order_id, ticket, symbol, side, volume, entry_price, tp, sl, open_time) -> int:
+    payload = dict(order_id=order_id, ticket=ticket, symbol=symbol, side=side, volume=volume,
+                   entry_price=entry_price, tp=tp, sl=sl, open_time=open_time)
+    key = f"open:{ticket}" if ticket else None
+    return _journal.append("trade_open", payload, key=key)
 
-    tps_otros = cfg.get("tps_percent_OTROS") or tps_1
-    vol_otros = cfg.get("volumes_OTROS")     or vol_1
+def registrar_estado_orden(order_id, account_login, new_status) -> int:
+    payload = dict(order_id=order_id, account_login=account_login, status=new_status)
+    return _journal.append("order_status", payload)
 
-    if order_idx <= 1:
-        return tps_1, vol_1
-    return tps_otros, vol_otros
+def registrar_cierre(ticket, exit_price, close_time, comment="") -> int:
+    payload = dict(ticket=ticket, exit_price=exit_price, close_time=close_time, comment=comment)
+    return _journal.append("trade_closed", payload, key=f"close:{ticket}")
 
 
-# --------------- Utilidades ---------------
 def enviar_mensaje_telegram(texto: str):
+    """Encola el mensaje en el worker de Telegram (no bloquea)."""
+    if _tg_sink is not None:
+        _tg_sink(texto)
+        return
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
         return
+    _tg_worker.submit(_enviar_telegram_ahora, texto)
+
+def _enviar_telegram_ahora(texto: str):
     try:
-        requests.post(
-            f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
-            data={"chat_id": TELEGRAM_CHAT_ID, "text": texto},
-            timeout=8,
-        )
+        with span("telegram.http"):
+            requests.post(
+                f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
+                data={"chat_id": TELEGRAM_CHAT_ID, "text": texto},
+                timeout=8,
+            )
     except Exception as e:
         print(f"[ERROR] Telegram: {e}")
 
@@ -145,58 +247,10 @@ def _fmt(n):
         return str(n)
 
 
-# --------- Lectura/escritura de AUTO_MODE ----------
-def _from_mt5_auto_mode():
-    try:
-        term = mt5.terminal_info()
-        if term is None:
-            return None, "mt5", "no-terminal-info"
-        val = bool(getattr(term, "trade_allowed", False))
-        return val, "mt5", f"trade_allowed={val}"
-    except Exception as e:
-        return None, "mt5", f"error:{e}"
-
-def _from_file_auto_mode():
-    try:
-        if os.path.isfile(AUTO_MODE_FILE):
-            raw = open(AUTO_MODE_FILE, "r", encoding="utf-8", errors="ignore").read().strip().lower()
-            if "on" in raw or raw in ("1", "true", "yes", "activo", "active"):
-                return True, "file", raw
-            if "off" in raw or raw in ("0", "false", "no", "inactivo"):
-                return False, "file", raw
-            return False, "file", raw
-        return None, "file", "missing"
-    except Exception as e:
-        return None, "file", f"error:{e}"
-
-def _write_auto_mode_file(on: bool) -> bool:
-    try:
-        with open(AUTO_MODE_FILE, "w", encoding="utf-8") as f:
-            f.write("on" if on else "off")
-        return True
-    except Exception as e:
-        print(f"[FILE] Error al escribir auto_mode.flag: {e}")
-        return False
-
+# --------- Lectura de AUTO_MODE (cacheada, ver modo_auto.py) ----------
 def leer_auto_mode():
-    # 0) Override manual desde Telegram
-    global _manual_override
-    if _manual_override is not None:
-        return _manual_override, "manual", "telegram"
-
-    # 1) Info de MT5 si así se configuró
-    if USE_MT5_AUTOTRADING:
-        val, src, det = _from_mt5_auto_mode()
-        if val is not None:
-            return val, src, det
-
-    # 2) Flag en archivo
-    val, src, det = _from_file_auto_mode()
-    if val is not None:
-        return val, src, det
-
-    # 3) Valor por ENV como fallback
-    return AUTO_MODE_ENV_DEFAULT, "env", str(AUTO_MODE_ENV_DEFAULT)
+    """(valor, src, det) ya resuelto por _modo; no toca MT5 ni el disco."""
+    return _modo.leer()
 
 
 # --------- Chequeo de símbolo en MT5 ----------
@@ -243,157 +297,108 @@ def _recordatorio_off_si_corresponde(src: str):
 
 # ============== Resumen de símbolos al iniciar ===================
 def _symbols_status_summary() -> str:
-    if not SYMBOLS:
+    tabla = _estrategias.actual
+    if not len(tabla):
         return "Sin símbolos configurados."
     parts = []
-    for raw, cfg in SYMBOLS.items():
-        mt5_name = cfg.get("mt5", raw)
-        on = "ON" if cfg.get("enabled", True) else "OFF"
-        seg = " [seg]" if cfg.get("allow_safety_updates_when_off", False) else ""
-        parts.append(f"{raw} ({mt5_name})={on}{seg}")
+    for est in tabla:
+        on = "ON" if est.enabled else "OFF"
+        seg = " [seg]" if est.allow_safety else ""
+        parts.append(f"{est.raw} ({est.mt5})={on}{seg}")
     return " | ".join(parts)
 
 
+def _book_fresco() -> PositionBook:
+    if _book.edad() > BOOK_MAX_AGE_SEC:
+        _book.refresh()
+    return _book
+
+
 # ======= Helpers cierre posiciones para comandos Telegram =======
-def _cerrar_todo() -> int:
-    """Cierra todas las posiciones de todos los símbolos. Devuelve cuántas cerró (aprox)."""
-    before = len(mt5.positions_get() or [])
-    posiciones = mt5.positions_get() or []
-    symbols = sorted({p.symbol for p in posiciones})
-    for s in symbols:
-        cerrar_posiciones_hasta_vacio(s, tipo=None)
-    after = len(mt5.positions_get() or [])
-    cerradas = max(0, before - after)
-    return cerradas
-
-def _cerrar_por_simbolo(symbol_mt5: str, side: Optional[str]) -> int:
-    """Cierra por símbolo y opcionalmente por lado ('buy'/'sell'). Devuelve cuántas cerró (aprox)."""
+def _cerrar_todo() -> dict:
+    """
+    Cierra todas las posiciones de todos los símbolos. Cada símbolo se aplana en su
+    lane (en paralelo entre símbolos, sin competir con órdenes en curso); la lane
+    lista sus posiciones al arrancar, así no se escapa una entrada que estaba en cola.
+    Devuelve el reporte fusionado (ver mt5_utils.fusionar_reportes).
+    """
+    _book.refresh()  # /closeall no puede fiarse de un libro de hace un segundo
+    symbols = _book.simbolos()
+    futs = [_lanes.submit(s, _cerrar_por_simbolo, s, None) for s in symbols]
+    reportes = []
+    for f in futs:
+        try:
+            reportes.append(f.result())
+        except Exception as e:
+            print(f"[TG] Error cerrando: {e}")
+    return fusionar_reportes(reportes)
+
+def _cerrar_por_simbolo(symbol_mt5: str, side: Optional[str]) -> dict:
+    """Cierra por símbolo y opcionalmente por lado ('buy'/'sell'). Devuelve el reporte de aplanar_simbolo."""
     side_map = {"buy": mt5.POSITION_TYPE_BUY, "sell": mt5.POSITION_TYPE_SELL}
     tipo = side_map.get((side or "").lower(), None)
-    before = len([p for p in (mt5.positions_get() or []) if p.symbol == symbol_mt5 and (tipo is None or p.type == tipo)])
-    cerrar_posiciones_hasta_vacio(symbol_mt5, tipo=tipo)
-    after = len([p for p in (mt5.positions_get() or []) if p.symbol == symbol_mt5 and (tipo is None or p.type == tipo)])
-    return max(0, before - after)
+    rep = aplanar_simbolo(symbol_mt5, tipo=tipo)
+    _book.cerrar(rep["cerradas"])
+    if rep["cerradas"]:
+        _reconciliador.despertar()  # registra los cierres en trades_log sin esperar la vuelta
+    return rep
 
+def _texto_fallidas(fallidas: dict) -> str:
+    if not fallidas:
+        return ""
+    muestra = ", ".join(f"#{t} ({e})" for t, e in list(fallidas.items())[:5])
+    return f"\n⚠️ Sin cerrar {len(fallidas)}: {muestra}"
 
-# ================== Listener de comandos Telegram ==================
-def _telegram_authorized(chat_id) -> bool:
-    if not TELEGRAM_CHAT_ID:
-        return True  # si no está seteado, no filtramos (útil para pruebas)
-    try:
-        return str(chat_id) == str(TELEGRAM_CHAT_ID)
-    except:
-        return False
 
+# ================== Comandos Telegram ==================
 def _tg_send(text: str):
     enviar_mensaje_telegram(text)
 
-def _parse_cmd(text: str):
-    """
-    /closeall | /panic
-    /close <SYMBOL>
-    /close <SYMBOL> buy|sell
-    /positions
-    /pause
-    /resume
-    /status
-    /help
-    """
-    text = (text or "").strip()
-    if re.match(r"^/(closeall|panic)\b", text, flags=re.I):
-        return {"cmd": "closeall"}
-    m = re.match(r"^/close\s+([A-Za-z0-9\._-]+)(?:\s+(buy|sell))?\s*$", text, flags=re.I)
-    if m:
-        return {"cmd": "close", "symbol": m.group(1), "side": (m.group(2) or "").lower() or None}
-    if re.match(r"^/positions\b", text, flags=re.I):
-        return {"cmd": "positions"}
-    if re.match(r"^/pause\b", text, flags=re.I):
-        return {"cmd": "pause"}
-    if re.match(r"^/resume\b", text, flags=re.I):
-        return {"cmd": "resume"}
-    if re.match(r"^/status\b", text, flags=re.I):
-        return {"cmd": "status"}
-    if re.match(r"^/help\b", text, flags=re.I):
-        return {"cmd": "help"}
-    return None
-
 def _positions_summary() -> str:
-    pos = mt5.positions_get() or []
-    if not pos:
+    # resumen por símbolo y side, desde el libro (sin ir al terminal)
+    agg = _book_fresco().resumen()
+    if not agg:
         return "Sin posiciones abiertas."
-    # resumen por símbolo y side
-    agg = {}
-    for p in pos:
-        side = "BUY" if p.type == mt5.POSITION_TYPE_BUY else "SELL"
-        key = (p.symbol, side)
-        agg.setdefault(key, 0.0)
-        agg[key] += float(p.volume)
-    parts = [f"{sym} {side}: {vol}" for (sym, side), vol in agg.items()]
+    parts = []
+    for (sym, side), a in agg.items():
+        media = f", entrada media {a['entrada_media']:.2f}" if a["entrada_media"] is not None else ""
+        parts.append(f"{sym} {side.upper()}: {a['volumen']} ({a['n']} pos{media})")
     return " | ".join(parts)
 
-def _telegram_listener_loop():
-    global _manual_override  # declarar al inicio de la función
-
-    if not TELEGRAM_TOKEN:
-        print("[TG] TELEGRAM_TOKEN no definido; listener desactivado.")
-        return
-    print("[TG] Listener de Telegram iniciado. Comandos: /closeall, /close <SYMBOL> [buy|sell], /positions, /pause, /resume, /status, /help")
-    last_update_id = None
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/getUpdates"
-    while True:
-        try:
-            params = {"timeout": 25}
-            if last_update_id is not None:
-                params["offset"] = last_update_id + 1
-            r = requests.get(url, params=params, timeout=35)
-            data = r.json()
-            if not data.get("ok"):
-                time.sleep(2)
-                continue
-            for upd in data.get("result", []):
-                last_update_id = upd.get("update_id", last_update_id)
-                msg = upd.get("message") or upd.get("edited_message")
-                if not msg or "text" not in msg:
-                    continue
-                chat_id = msg.get("chat", {}).get("id")
-                if not _telegram_authorized(chat_id):
-                    continue
-                text = msg.get("text", "")
-                parsed = _parse_cmd(text)
-                if not parsed:
-                    continue
-
-                cmd = parsed["cmd"]
-                if cmd == "help":
-                    _tg_send("Comandos:\n/closeall – cerrar TODO\n/close <SIMBOLO> [buy|sell]\n/positions – resumen\n/pause – pausar bot\n/resume – reanudar bot\n/status – estado actual\n")
-                elif cmd == "positions":
-                    _tg_send(_positions_summary())
-                elif cmd == "closeall":
-                    cerradas = _cerrar_todo()
-                    _tg_send(f"🔒 Cerradas {cerradas} posiciones (todas).")
-                elif cmd == "close":
-                    sym_raw = parsed["symbol"]
-                    cfg, symbol_mt5, _ = get_symbol_cfg(sym_raw if sym_raw in SYMBOLS else sym_raw)
-                    cerradas = _cerrar_por_simbolo(symbol_mt5, parsed.get("side"))
-                    side_txt = f" {parsed.get('side').upper()}" if parsed.get("side") else ""
-                    _tg_send(f"🔒 {symbol_mt5}{side_txt}: cerradas {cerradas} posiciones.")
-                elif cmd == "pause":
-                    _manual_override = False
-                    _write_auto_mode_file(False)
-                    _tg_send("⏸️ Pausado por Telegram (/pause).")
-                elif cmd == "resume":
-                    _manual_override = True
-                    _write_auto_mode_file(True)
-                    _tg_send("▶️ Reanudado por Telegram (/resume).")
-                elif cmd == "status":
-                    val, src, det = leer_auto_mode()
-                    _tg_send(f"Estado: {'ON' if val else 'OFF'} (src={src}; det={det})")
-        except Exception as e:
-            print(f"[TG] Error listener: {e}")
-            time.sleep(3)
+def _ejecutar_comando(parsed: dict) -> str:
+    """Ejecuta un comando ya parseado (telegram_listener.parse_cmd) y devuelve la respuesta."""
+    cmd = parsed["cmd"]
+    if cmd == "positions":
+        return _positions_summary()
+    if cmd == "closeall":
+        rep = _cerrar_todo()
+        return (f"🔒 Cerradas {len(rep['cerradas'])} posiciones (todas) en {rep['ms']:.0f} ms."
+                + _texto_fallidas(rep["fallidas"]))
+    if cmd == "close":
+        symbol_mt5 = _estrategia(parsed["symbol"]).mt5
+        rep = _lanes.submit(symbol_mt5, _cerrar_por_simbolo,
+                            symbol_mt5, parsed.get("side")).result()
+        side_txt = f" {parsed.get('side').upper()}" if parsed.get("side") else ""
+        return (f"🔒 {symbol_mt5}{side_txt}: cerradas {len(rep['cerradas'])} posiciones."
+                + _texto_fallidas(rep["fallidas"]))
+    if cmd == "pause":
+        _modo.set_override(False)
+        return "⏸️ Pausado por Telegram (/pause)."
+    if cmd == "resume":
+        _modo.set_override(True)
+        return "▶️ Reanudado por Telegram (/resume)."
+    if cmd == "status":
+        val, src, det = leer_auto_mode()
+        texto = f"Estado: {'ON' if val else 'OFF'} (src={src}; det={det})"
+        if RECONCILE_SEC > 0:
+            rs = _reconciliador.stats()
+            texto += f"\nReconciliador: {rs['cerrados']} cierres en {rs['pasadas']} pasadas, {rs['errores']} errores"
+        return texto
+    return ""
 
 def start_telegram_listener():
-    t = threading.Thread(target=_telegram_listener_loop, daemon=True)
+    t = threading.Thread(target=escuchar_comandos, daemon=True,
+                         args=(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, _ejecutar_comando, _tg_send))
     t.start()
 # =======================================================================
 
@@ -438,55 +443,49 @@ def startup_checks() -> bool:
 def ejecutar_orden(order: dict, account_login: str) -> bool:
     # Config por símbolo
     symbol_raw = order["symbol"]
-    cfg, symbol_mt5, _enabled = get_symbol_cfg(symbol_raw)
+    est = _estrategia(symbol_raw)
+    symbol_mt5 = est.mt5
 
     order_type = order["order_type"]
     price      = float(order["price"])
-    side       = "buy" if "buy" in order_type.lower() else "sell"
+    side       = clasificar(order_type).side or ("buy" if "buy" in order_type.lower() else "sell")
     tipo_mt5   = mt5.ORDER_TYPE_BUY if side == "buy" else mt5.ORDER_TYPE_SELL
-
-    side_map = {
-        "BUY/COMPRA NORMAL O SMART": "buy",
-        "POSIBLE BUY": "buy",
-        "SELL/VENTA NORMAL O SMART": "sell",
-        "POSIBLE SELL": "sell",
-        "TAKE PROFIT BUY": "buy",
-        "TAKE PROFIT LONG": "buy",
-        "TAKE PROFIT SELL": "sell",
-        "TAKE PROFIT SHORT": "sell",
-        "buy": "buy", "sell": "sell"
-    }
-    side_db = side_map.get(order_type.upper(), order_type if order_type in ["buy", "sell"] else "buy")
+    side_db    = side
 
     # 1) Cierra posiciones del lado opuesto ANTES de contar las del mismo lado
     opposite_type = mt5.POSITION_TYPE_SELL if side == "buy" else mt5.POSITION_TYPE_BUY
     print(f"[LOG] Cerrando posiciones {'SELL' if opposite_type==1 else 'BUY'} antes de abrir {order_type.upper()}...")
-    if not cerrar_posiciones_hasta_vacio(symbol_mt5, tipo=opposite_type):
-        print("[CRÍTICO] No se lograron cerrar todas las posiciones.")
+    rep_cierre = aplanar_simbolo(symbol_mt5, tipo=opposite_type)
+    _book.cerrar(rep_cierre["cerradas"])
+    if rep_cierre["cerradas"]:
+        _reconciliador.despertar()
+    if rep_cierre["fallidas"]:
+        print(f"[CRÍTICO] No se lograron cerrar todas las posiciones: {rep_cierre['fallidas']}")
         return False
 
-    # 2) Contar posiciones del MISMO lado para decidir 1ª vs OTROS
-    pos_all = mt5.positions_get(symbol=symbol_mt5) or []
-    side_code = mt5.POSITION_TYPE_BUY if side == "buy" else mt5.POSITION_TYPE_SELL
-    existing_same_side = sum(1 for p in pos_all if p.type == side_code)
+    # 2) Contar posiciones del MISMO lado para decidir 1ª vs OTROS (libro en memoria, O(1))
+    existing_same_side = _book_fresco().count(symbol_mt5, side)
     order_idx = existing_same_side + 1
 
     # 3) Elegir sets (1ª u OTROS)
-    tps_percent, volumes = _get_sets(cfg, order_idx)
-    sl_percent  = float(cfg.get("sl_percent", 10.0))
+    tps_percent, volumes = est.sets(order_idx)
+    sl_percent  = est.sl_percent
 
     # 4) Calcular niveles TP/SL con el set elegido
-    tps, sl = calcular_tps_porcentaje(price, tps_percent, sl_percent, side=side)
-
-    success = False
-    for i, (tp, volume) in enumerate(zip(tps, volumes), 1):
-        tick = mt5.symbol_info_tick(symbol_mt5)
-        if not tick:
-            print("[ERROR] Sin tick de símbolo.")
-            continue
-
+    digits, tick_size = precision_simbolo(symbol_mt5)
+    tps, sl = calcular_tps_porcentaje(price, tps_percent, sl_percent, side=side,
+                                      digits=digits, tick_size=tick_size)
+
+    # 5) Preparar TODAS las parciales con un solo snapshot de tick y dispararlas seguidas.
+    #    Los INSERT a trades_log se difieren a un solo batch al final.
+    tick = mt5.symbol_info_tick(symbol_mt5)
+    if not tick:
+        print("[ERROR] Sin tick de símbolo.")
+    set_txt = '1' if order_idx == 1 else 'OTROS'
+    requests_legs = []
+    for i, (tp, volume) in enumerate(zip(tps, volumes) if tick else [], 1):
         price_exec = tick.ask if side == "buy" else tick.bid
-        request = {
+        requests_legs.append((i, tp, volume, {
             "action": mt5.TRADE_ACTION_DEAL,
             "symbol": symbol_mt5,
             "volume": volume,
@@ -496,56 +495,303 @@ def ejecutar_orden(order: dict, account_login: str) -> bool:
             "tp": tp,
             "deviation": 10,
             "magic": 20240725,
-            "comment": f"TP{i}-{'1' if order_idx==1 else 'OTROS'}",
+            "comment": f"TP{i}-{set_txt}",
             "type_time": mt5.ORDER_TIME_GTC,
             "type_filling": mt5.ORDER_FILLING_IOC
-        }
+        }))
 
+    success = False
+    filas_log = []
+    latencias = []
+    t_burst = time.perf_counter()
+    for i, tp, volume, request in requests_legs:
+        t0 = time.perf_counter()
         result = mt5.order_send(request)
+        leg_ms = (time.perf_counter() - t0) * 1000.0
+        observar("mt5.order_send.open", leg_ms)
+        latencias.append((i, leg_ms, (time.perf_counter() - t_burst) * 1000.0))
         now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
-            print(f"[OK] Parcial {i} ({'1' if order_idx==1 else 'OTROS'}) ejecutada. Ticket: {result.order}")
-            insertar_ejecucion(order.get("id"), result.order, symbol_raw, side_db,
-                               volume, request["price"], tp, sl, now_str)
+            print(f"[OK] Parcial {i} ({set_txt}) ejecutada. Ticket: {result.order} ({leg_ms:.1f} ms)")
+            filas_log.append((order.get("id"), result.order, symbol_raw, side_db,
+                              volume, request["price"], tp, sl, now_str))
+            _book.abrir(result.order, symbol_mt5, side, result.volume or volume,
+                        result.price or request["price"])
             success = True
         else:
-            print(f"[ERROR] Parcial {i} ({'1' if order_idx==1 else 'OTROS'}) no ejecutada: {getattr(result, 'retcode', 'No result')} result={result}")
+            print(f"[ERROR] Parcial {i} ({set_txt}) no ejecutada: {getattr(result, 'retcode', 'No result')} result={result}")
+
+    if success and "_t_ingest" in order:
+        # desde que el loop la leyó de la DB hasta la última parcial enviada
+        observar("order.ingest_to_fill", (time.perf_counter() - order["_t_ingest"]) * 1000.0)
+    if latencias:
+        detalle = " ".join(f"TP{i}={leg:.1f}ms@+{acc:.1f}" for i, leg, acc in latencias)
+        print(f"[LAT] Parciales {symbol_mt5}: {detalle}")
+    # Escrituras a la DB vía journal (fuera del camino de order_send; se drenan en lote)
+    for fila in filas_log:
+        registrar_ejecucion(*fila)
 
     if not success:
         now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        insertar_ejecucion(order.get("id"), None, symbol_raw, side_db,
-                           sum(volumes), price, None, sl, now_str)
+        registrar_ejecucion(order.get("id"), None, symbol_raw, side_db,
+                            sum(volumes), price, None, sl, now_str)
     else:
         # ⬅️ Estado por CUENTA
-        update_order_status(order.get("id"), account_login, "executed")
+        registrar_estado_orden(order.get("id"), account_login, "executed")
 
     return success
 
 
 # ---------------------- MAIN ----------------------
+def _expirar_backlog(logins):
+    """Con ORDER_MAX_AGE_SEC > 0, las pendientes más viejas pasan a 'expired' (una sentencia)."""
+    if ORDER_MAX_AGE_SEC <= 0:
+        return 0
+    n = expirar_ordenes_viejas(logins, ORDER_MAX_AGE_SEC)
+    if n:
+        print(f"[LOG] {n} órdenes pendientes con más de {ORDER_MAX_AGE_SEC}s pasaron a 'expired'")
+    return n
+
+def _fetch_pending_orders(account_login: str):
+    """
+    Pendientes de la cuenta. Con CLAIM_ORDERS las reclama atómicamente para este
+    executor; si no, fetch incremental por watermark con resync completo periódico.
+    """
+    global _last_order_id, _loops_since_resync
+    full = _last_order_id is None or _loops_since_resync >= FULL_RESYNC_EVERY
+    if full:
+        _loops_since_resync = 0
+        _expirar_backlog([account_login])
+    else:
+        _loops_since_resync += 1
+    if CLAIM_ORDERS:
+        if _last_order_id is None:
+            _last_order_id = 0  # sin watermark: solo marca que ya hubo una primera vuelta
+        with _in_flight_lock:
+            en_curso = list(_in_flight)
+        return claim_pending_orders(account_login, EXECUTOR_ID, limit=CLAIM_BATCH,
+                                    lease_sec=CLAIM_LEASE_SEC, excluir=en_curso)
+    with _in_flight_lock:
+        reintentos = set(_reintentar)
+    if full:
+        orders = get_pending_orders(account_login)
+    else:
+        # Con reintentos el watermark baja hasta el más viejo (el resto lo filtra _marcar_en_vuelo)
+        desde = min(_last_order_id, min(reintentos) - 1) if reintentos else _last_order_id
+        orders = get_pending_orders(account_login, after_id=desde)
+    if reintentos:
+        vistos = {o["id"] for o in orders}
+        with _in_flight_lock:
+            _reintentar.difference_update(reintentos - vistos)
+    if orders:
+        max_id = max(int(o["id"]) for o in orders)
+        _last_order_id = max(_last_order_id or 0, max_id)
+    elif _last_order_id is None:
+        _last_order_id = 0
+    return orders
+
+
+# ---------------------- PIPELINE ----------------------
+def _marcar_en_vuelo(orders):
+    """Filtra las órdenes que ya están dentro del pipeline y marca las nuevas."""
+    flushed = _journal.flushed_seq
+    nuevas = []
+    with _in_flight_lock:
+        # Soltar las que ya terminaron y cuyo estado ya llegó a MySQL
+        for oid, seq in list(_in_flight.items()):
+            if seq is not None and seq <= flushed:
+                del _in_flight[oid]
+        for o in orders:
+            oid = o.get("id")
+            if oid in _in_flight:
+                continue
+            _in_flight[oid] = None
+            o["_t_ingest"] = time.perf_counter()
+            nuevas.append(o)
+    return nuevas
+
+def _finalizar_orden(order_id, reintentar: bool = False):
+    # La orden sale del pipeline cuando el journal drene todo lo emitido hasta ahora
+    # (incluido su cambio de estado). reintentar=True: terminó sin estado final.
+    if reintentar and CLAIM_ORDERS:
+        # Suelta el claim: vuelve a 'pending' y el próximo claim la toma sin esperar al lease
+        registrar_estado_orden(order_id, ACCOUNT_LOGIN, "pending")
+    seq = _journal.last_seq()
+    with _in_flight_lock:
+        _in_flight[order_id] = seq
+        if reintentar and not CLAIM_ORDERS:
+            _reintentar.add(order_id)
+    if reintentar and _reintento_sink is not None:
+        _reintento_sink(order_id)
+
+def _renovar_leases_loop():
+    """Heartbeat del claim: renueva el lease de todo lo que sigue en _in_flight."""
+    intervalo = max(1.0, CLAIM_LEASE_SEC / 3.0)
+    while True:
+        time.sleep(intervalo)
+        with _in_flight_lock:
+            ids = list(_in_flight)
+        if ids:
+            renovar_leases(ids, EXECUTOR_ID, CLAIM_LEASE_SEC)
+
+def _restaurar_en_vuelo():
+    """Al arrancar: estados aún en el journal => esas órdenes no se re-ingestan."""
+    for seq, _kind, _key, payload in _journal.pending_entries("order_status"):
+        with _in_flight_lock:
+            _in_flight[payload.get("order_id")] = seq
+
+def _ejecutar_take_profit(order: dict, est: Estrategia, account_login: str):
+    """Etapa execute (lane del símbolo): mueve SL según el TP recibido."""
+    symbol_raw = order.get("symbol", "")
+    senal = clasificar(str(order.get("order_type", "")))
+    # Sin lado pegado a "Take Profit" ("Take Profit TP2 Buy"): el de siempre, por substring
+    t_upper = str(order.get("order_type", "")).upper()
+    side = senal.side or ("buy" if ("BUY" in t_upper or "LONG" in t_upper) else "sell")
+    tp_index = senal.tp_index or 1
+    ok = False
+    try:
+        symbol_mt5 = est.mt5
+        base_tps = est.tps_tp
+        rep = mover_sl_en_take_profit_lote(symbol_mt5, side, base_tps, tp_index=tp_index)
+        moved = any(r["ok"] for r in rep["resultados"])
+        fallidas = [r["ticket"] for r in rep["resultados"] if not r["ok"]]
+        print(f"[LAT] TP{tp_index} {symbol_mt5} posiciones={rep['posiciones']} enviadas={rep['enviadas']} "
+              f"omitidas={len(rep['omitidas'])} fallidas={len(fallidas)} total={rep['ms_total']:.1f}ms")
+        registrar_estado_orden(order.get("id"), account_login, "take_profit")
+        ok = True
+        if moved:
+            enviar_mensaje_telegram(f"🎯 TAKE PROFIT {side.upper()} TP{tp_index} ⇒ SL actualizado ({symbol_raw})")
+        else:
+            enviar_mensaje_telegram(f"ℹ️ TAKE PROFIT {side.upper()} TP{tp_index} ⇒ SL ya estaba protegido ({symbol_raw})")
+    except Exception as e:
+        print("[TP-IMMED] Error:", e)
+    finally:
+        _finalizar_orden(order.get("id"), reintentar=not ok)
+
+def _ejecutar_entrada(order: dict, account_login: str):
+    """Etapa execute (lane del símbolo): señal ejecutable normal."""
+    ok = False
+    try:
+        ok = ejecutar_orden(order, account_login)
+    finally:
+        _finalizar_orden(order.get("id"), reintentar=not ok)
+
+def _rutear_orden(order: dict, account_login: str):
+    """
+    Etapa route: decide qué hacer con la orden. Los descartes se resuelven acá
+    (solo efectos laterales); lo que toca MT5 va a la lane de su símbolo.
+    """
+    symbol_raw = order.get("symbol", "")
+    if not _modo.activo:
+        # /pause llegó con la orden ya en el pipeline: no se toca; queda pendiente para cuando vuelva ON
+        print(f"[MODO] OFF: orden {order.get('id')} queda pendiente")
+        _finalizar_orden(order.get("id"), reintentar=True)
+        return
+    est = _estrategia(symbol_raw)  # un snapshot para toda la orden
+    symbol_mt5 = est.mt5
+    senal = clasificar(str(order.get("order_type", "")))
+
+    # ---------- GATE POR SÍMBOLO (ON/OFF desde CONFIG) ----------
+    if not est.enabled:
+        if senal.kind == "take_profit" and est.allow_safety:
+            # Permitimos solo acciones de seguridad (mover SL/BE en TP)
+            print(f"[TOGGLE] {symbol_raw}=OFF pero se permite seguridad (TP/SL).")
+        else:
+            registrar_estado_orden(order.get("id"), account_login, "symbol_off")
+            enviar_mensaje_telegram(f"⏸️ {symbol_raw} OFF — señal ignorada")
+            _finalizar_orden(order.get("id"))
+            return
+    # ------------------------------------------------------------
+
+    # 1) "Posible ..." = informativas
+    if senal.kind == "posible":
+        registrar_estado_orden(order.get("id"), account_login, "informativa")
+        print(f"[INFO] Aviso detectado, no se ejecuta: {order.get('order_type')}")
+        _finalizar_orden(order.get("id"))
+        return
+
+    # 2) TAKE PROFIT inmediato: mover SL según TP alcanzado
+    if senal.kind == "take_profit":
+        _lanes.submit(symbol_mt5, _ejecutar_take_profit, order, est, account_login)
+        return
+
+    # 3) Lo que la gramática no reconoce nunca abre posición
+    if senal.kind != "entry":
+        registrar_estado_orden(order.get("id"), account_login, "informativa")
+        print(f"[WARN] Señal desconocida, no se ejecuta: {order.get('order_type')}")
+        enviar_mensaje_telegram(f"❓ Señal desconocida en {symbol_raw}, no se ejecuta: {order.get('order_type')}")
+        _finalizar_orden(order.get("id"))
+        return
+
+    # 4) Señal ejecutable normal
+    _lanes.submit(symbol_mt5, _ejecutar_entrada, order, account_login)
+
+
+def _iniciar_workers():
+    for w in (_route_worker, _tg_worker):
+        w.start()
+    _restaurar_en_vuelo()
+    _journal.start()
+    _estrategias.start()
+    if METRICS_PORT:
+        try:
+            metricas.exportar_http(METRICS_PORT)
+        except OSError as e:
+            print(f"[METRICS] No se pudo abrir el puerto {METRICS_PORT}: {e}")
+    if METRICS_FILE:
+        metricas.exportar_archivo(METRICS_FILE, METRICS_FILE_SEC)
+    pendientes = _journal.pending()
+    if pendientes:
+        print(f"[JOURNAL] {pendientes} escrituras pendientes de una corrida anterior; drenando...")
+
+def _salir():
+    # Da tiempo a que salgan los últimos mensajes/escrituras antes de terminar
+    _journal.flush(5.0)
+    _tg_worker.drain(10.0)
+
+
 def main():
     global _prev_auto_mode, _last_off_alert_ts, ACCOUNT_LOGIN
 
+    _iniciar_workers()
     print("[LOG] Iniciando MT5 Executor...")
     if not mt5.initialize():
         enviar_mensaje_telegram("❌ No se pudo iniciar MT5")
+        _salir()
         return
 
     acc = mt5.account_info()
     ACCOUNT_LOGIN = str(acc.login) if acc else "unknown"
     print(f"[MTS] Conectado como {ACCOUNT_LOGIN}. Balance: {acc.balance if acc else 'N/A'}.")
+    if CLAIM_ORDERS:
+        print(f"[LOG] Claim de órdenes activo (executor={EXECUTOR_ID}, lease={CLAIM_LEASE_SEC}s)")
+        threading.Thread(target=_renovar_leases_loop, name="claim-lease", daemon=True).start()
+
+    # Modo ON/OFF en segundo plano; un cambio (p. ej. /pause) despierta al loop al instante
+    _modo.start()
+    _modo.subscribe(lambda *_: _wakeup.notify())
 
     if not startup_checks():
         print("[CRÍTICO] Startup checks fallaron. Saliendo.")
+        _salir()
         return
 
+    # Libro de posiciones (refresh por diff en su propio thread)
+    _book.start()
+    if RECONCILE_SEC > 0:
+        _reconciliador.start()
+
     # Hilo de keepalive
     threading.Thread(target=notificador_activo, daemon=True).start()
 
     # Hilo listener de Telegram (comandos /closeall, /pause, etc.)
     start_telegram_listener()
 
-    print("[LOG] Loop principal...")
+    # Long-poll de órdenes nuevas (si BACKEND_URL está configurado)
+    _wakeup.start()
+
+    # Etapa ingest: lee modo + pendientes y las pasa a route; nunca espera a MT5 ni a la DB de escritura
+    print("[LOG] Loop principal (pipeline)...")
     while True:
         auto_mode, src, det = leer_auto_mode()
 
@@ -561,58 +807,107 @@ def main():
 
         if not auto_mode:
             _recordatorio_off_si_corresponde(src)
-            time.sleep(5)
+            _wakeup.wait(5)  # /resume (o el flag) despierta antes
             continue
 
         # ⬇️ AHORA: pendientes SOLO de esta cuenta
-        orders = get_pending_orders(ACCOUNT_LOGIN)
-        print(f"[LOG] Órdenes pendientes para {ACCOUNT_LOGIN}: {len(orders)}")
+        with span("executor.fetch"):
+            orders = _marcar_en_vuelo(_fetch_pending_orders(ACCOUNT_LOGIN))
+        if orders:
+            print(f"[LOG] Órdenes nuevas para {ACCOUNT_LOGIN}: {len(orders)}")
         for order in orders:
-            symbol_raw = order.get("symbol", "")
-            cfg, symbol_mt5, enabled = get_symbol_cfg(symbol_raw)
-            t_upper = str(order.get("order_type", "")).upper()
-
-            # ---------- GATE POR SÍMBOLO (ON/OFF desde CONFIG) ----------
-            if not enabled:
-                allow_safety = bool(cfg.get("allow_safety_updates_when_off", False))
-                if ("TAKE PROFIT" in t_upper) and allow_safety:
-                    # Permitimos solo acciones de seguridad (mover SL/BE en TP)
-                    print(f"[TOGGLE] {symbol_raw}=OFF pero se permite seguridad (TP/SL).")
-                else:
-                    update_order_status(order.get("id"), ACCOUNT_LOGIN, "symbol_off")
-                    enviar_mensaje_telegram(f"⏸️ {symbol_raw} OFF — señal ignorada")
-                    continue
-            # ------------------------------------------------------------
-
-            # 1) "Posible ..." = informativas
-            if "POSIBLE BUY" in t_upper or "POSIBLE SELL" in t_upper:
-                update_order_status(order.get("id"), ACCOUNT_LOGIN, "informativa")
-                print(f"[INFO] Aviso detectado, no se ejecuta: {t_upper}")
-                continue
+            _route_worker.submit(_rutear_orden, order, ACCOUNT_LOGIN)
+
+        # Despierta al instante si el backend avisa; si no, polling cada POLL_INTERVAL_SEC
+        _wakeup.wait(POLL_INTERVAL_SEC)
 
-            # 2) TAKE PROFIT inmediato: mover SL según TP alcanzado
-            if "TAKE PROFIT" in t_upper:
-                side = "buy" if ("BUY" in t_upper or "LONG" in t_upper) else "sell"
-                m = re.search(r'(?:TAKE\s*PROFIT|TP)\s*(\d+)', t_upper)
-                tp_index = int(m.group(1)) if m else 1
-                try:
-                    base_tps = (cfg.get("tps_percent_1")
-                                or cfg.get("tps_percent_OTROS")
-                                or [0.2, 0.5, 1, 2, 3, 5])
-                    moved, npos = mover_sl_en_take_profit_inmediato(symbol_mt5, side, base_tps, tp_index=tp_index)
-                    update_order_status(order.get("id"), ACCOUNT_LOGIN, "take_profit")
-                    if moved:
-                        enviar_mensaje_telegram(f"🎯 TAKE PROFIT {side.upper()} TP{tp_index} ⇒ SL actualizado ({symbol_raw})")
-                    else:
-                        enviar_mensaje_telegram(f"ℹ️ TAKE PROFIT {side.upper()} TP{tp_index} ⇒ SL ya estaba protegido ({symbol_raw})")
-                except Exception as e:
-                    print("[TP-IMMED] Error:", e)
-                continue
 
-            # 3) Señal ejecutable normal
-            ejecutar_orden(order, ACCOUNT_LOGIN)
+# ---------------------- WORKER (modo supervisor) ----------------------
+METRICS_PUSH_SEC = float(os.getenv("METRICS_PUSH_SEC", "10"))
+
+def _empujar_metricas(login: str, outbox):
+    while True:
+        time.sleep(METRICS_PUSH_SEC)
+        try:
+            outbox.put(("metrics", login, metricas.snapshot()))
+        except Exception as e:
+            print(f"[WORKER {login}] Error enviando métricas: {e}")
+
+def _responder_comando(login: str, cmd_id, parsed: dict, outbox):
+    try:
+        texto = _ejecutar_comando(parsed)
+    except Exception as e:
+        texto = f"❌ Error: {e}"
+    outbox.put(("reply", cmd_id, login, texto))
 
-        time.sleep(5)
+def run_worker(login: str, terminal_path: Optional[str], inbox, outbox):
+    """
+    Un proceso por terminal MT5, manejado por supervisor.py. No consulta la DB de
+    órdenes ni escucha Telegram: recibe por `inbox`
+        ("orders", [order, ...]) | ("cmd", cmd_id, parsed) | ("stop",)
+    y reporta por `outbox`
+        ("ready", login, info) | ("error", login, texto) | ("tg", login, texto)
+        ("reply", cmd_id, login, texto) | ("metrics", login, snapshot) | ("modo", login, on)
+        ("reintentar", login, order_id)
+    El resto (pipeline, journal propio, libro de posiciones, modo) es igual que main().
+    """
+    global ACCOUNT_LOGIN, _tg_sink, _reintento_sink, _prev_auto_mode, _last_off_alert_ts
+    _tg_sink = lambda texto: outbox.put(("tg", login, texto))
+    _reintento_sink = lambda order_id: outbox.put(("reintentar", login, order_id))
+    _iniciar_workers()
+    ok = mt5.initialize(path=terminal_path) if terminal_path else mt5.initialize()
+    if not ok:
+        outbox.put(("error", login, f"No se pudo iniciar MT5 ({terminal_path or 'default'})"))
+        _salir()
+        return
+    acc = mt5.account_info()
+    ACCOUNT_LOGIN = str(acc.login) if acc else "unknown"
+    if ACCOUNT_LOGIN != str(login):
+        outbox.put(("error", login, f"El terminal está logueado en {ACCOUNT_LOGIN}, no en {login}"))
+        _salir()
+        return
+
+    _modo.start()
+    if not startup_checks():
+        outbox.put(("error", login, "Startup checks fallaron"))
+        _salir()
+        return
+    _prev_auto_mode = _modo.activo
+
+    def _aviso_modo(val, src, det):
+        global _last_off_alert_ts
+        enviar_mensaje_telegram(_msg_on() if val else _msg_off(src))
+        if not val:
+            _last_off_alert_ts = time.time()
+        outbox.put(("modo", login, bool(val)))
+        print(f"[MODO] {'ON ' if val else 'OFF'} [src={src} det={det}]")
+    _modo.subscribe(_aviso_modo)
+    _aviso_modo(*_modo.leer())  # estado inicial, como la primera vuelta de main()
+    _book.start()
+    if RECONCILE_SEC > 0:
+        _reconciliador.start()
+    threading.Thread(target=_empujar_metricas, args=(login, outbox), daemon=True).start()
+    outbox.put(("ready", login, {"balance": getattr(acc, "balance", None), "pid": os.getpid()}))
+
+    while True:
+        try:
+            msg = inbox.get(timeout=5)
+        except queue.Empty:
+            auto_mode, src, _det = _modo.leer()
+            if not auto_mode:
+                _recordatorio_off_si_corresponde(src)
+            continue
+        kind = msg[0]
+        if kind == "orders":
+            for order in _marcar_en_vuelo(msg[1]):
+                _route_worker.submit(_rutear_orden, order, ACCOUNT_LOGIN)
+        elif kind == "cmd":
+            # En su propio thread: un /closeall largo no frena la entrada de órdenes
+            threading.Thread(target=_responder_comando, args=(login, msg[1], msg[2], outbox),
+                             daemon=True).start()
+        elif kind == "stop":
+            break
+    _salir()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,301 @@
+# mt5_sim.py
+"""
+Simulador en memoria del subconjunto de MetaTrader5 que usa el proyecto.
+Determinista: los precios solo cambian con set_price(); la latencia de fill y el
+slippage son fijos y configurables con configure(). Pensado para correr el
+executor y los benchmarks en Linux/CI (BROKER_BACKEND=sim, ver broker.py).
+"""
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+# ---------------- Constantes (mismos valores que MetaTrader5) ----------------
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_SLTP = 6
+
+ORDER_TIME_GTC = 0
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+
+TRADE_RETCODE_PLACED = 10008
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_DONE_PARTIAL = 10010
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_NO_MONEY = 10019
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+SYMBOL_TRADE_MODE_DISABLED = 0
+SYMBOL_TRADE_MODE_LONGONLY = 1
+SYMBOL_TRADE_MODE_SHORTONLY = 2
+SYMBOL_TRADE_MODE_CLOSEONLY = 3
+SYMBOL_TRADE_MODE_FULL = 4
+
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+
+# ---------------- Estructuras (atributos como en MetaTrader5) ----------------
+Tick = namedtuple("Tick", "time bid ask last volume time_msc")
+SymbolInfo = namedtuple("SymbolInfo", "name visible trade_mode digits point trade_tick_size "
+                                      "volume_min volume_step")
+TradePosition = namedtuple("TradePosition", "ticket time symbol type volume price_open sl tp "
+                                            "price_current profit magic comment")
+TradeDeal = namedtuple("TradeDeal", "ticket order time time_msc type entry position_id symbol "
+                                    "volume price profit magic comment")
+OrderSendResult = namedtuple("OrderSendResult", "retcode deal order volume price bid ask comment request")
+TerminalInfo = namedtuple("TerminalInfo", "connected trade_allowed name path")
+AccountInfo = namedtuple("AccountInfo", "login balance equity currency server")
+
+
+class SimBroker:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self, login: int = 1000001, balance: float = 10_000.0):
+        with self._lock:
+            self.initialized = False
+            self.login = login
+            self.balance = balance
+            self.trade_allowed = True
+            self.fill_latency_ms = 0.0    # latencia por order_send
+            self.slippage_points = 0      # slippage adverso fijo (en points del símbolo)
+            self.reject_every = 0         # 0 = nunca; N = rechaza 1 de cada N order_send
+            self.calls = {}               # contador de llamadas por función
+            self._prices = {}             # symbol -> (bid, ask)
+            self._symbols = {}            # symbol -> SymbolInfo
+            self._positions = {}          # ticket -> TradePosition
+            self._deals = []              # historial (TradeDeal)
+            self._tickets = itertools.count(100_000_000)
+            self._sends = 0
+            self._last_error = (1, "Success")
+
+    # ---------------- configuración del escenario ----------------
+    def configure(self, **kwargs):
+        with self._lock:
+            for k, v in kwargs.items():
+                if not hasattr(self, k):
+                    raise AttributeError(f"SimBroker no tiene '{k}'")
+                setattr(self, k, v)
+
+    def add_symbol(self, symbol: str, bid: float, spread: float = 0.2, digits: int = 2,
+                   trade_mode: int = SYMBOL_TRADE_MODE_FULL):
+        point = 10 ** -digits
+        with self._lock:
+            self._symbols[symbol] = SymbolInfo(symbol, True, trade_mode, digits, point, point, 0.01, 0.01)
+            self._prices[symbol] = (float(bid), round(float(bid) + spread, digits))
+
+    def set_price(self, symbol: str, bid: float, ask: float = None):
+        with self._lock:
+            old_bid, old_ask = self._prices[symbol]
+            spread = old_ask - old_bid
+            self._prices[symbol] = (float(bid), float(ask) if ask is not None else float(bid) + spread)
+
+    def open_position(self, symbol: str, side: str, volume: float = 0.01, price: float = None,
+                      sl: float = 0.0, tp: float = 0.0, magic: int = 20240725, comment: str = ""):
+        """Atajo para sembrar posiciones sin pasar por order_send."""
+        with self._lock:
+            bid, ask = self._prices[symbol]
+            ptype = POSITION_TYPE_BUY if side == "buy" else POSITION_TYPE_SELL
+            if price is None:
+                price = ask if ptype == POSITION_TYPE_BUY else bid
+            ticket = next(self._tickets)
+            self._positions[ticket] = TradePosition(ticket, int(time.time()), symbol, ptype, float(volume),
+                                                    float(price), float(sl), float(tp), float(price),
+                                                    0.0, magic, comment)
+            return ticket
+
+    # ---------------- API MetaTrader5 ----------------
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def initialize(self, *args, **kwargs):
+        with self._lock:
+            self._count("initialize")
+            self.initialized = True
+            return True
+
+    def shutdown(self):
+        with self._lock:
+            self.initialized = False
+
+    def last_error(self):
+        return self._last_error
+
+    def terminal_info(self):
+        with self._lock:
+            self._count("terminal_info")
+            if not self.initialized:
+                return None
+            return TerminalInfo(True, self.trade_allowed, "SimTerminal", "/sim")
+
+    def account_info(self):
+        with self._lock:
+            self._count("account_info")
+            if not self.initialized:
+                return None
+            equity = self.balance + sum(self._profit(p) for p in self._positions.values())
+            return AccountInfo(self.login, self.balance, equity, "USD", "SimServer")
+
+    def symbol_info(self, symbol):
+        with self._lock:
+            self._count("symbol_info")
+            return self._symbols.get(symbol)
+
+    def symbol_select(self, symbol, enable=True):
+        with self._lock:
+            return symbol in self._symbols
+
+    def symbol_info_tick(self, symbol):
+        with self._lock:
+            self._count("symbol_info_tick")
+            if symbol not in self._prices:
+                return None
+            bid, ask = self._prices[symbol]
+            now = time.time()
+            return Tick(int(now), bid, ask, bid, 0, int(now * 1000))
+
+    def positions_get(self, symbol=None, ticket=None, group=None):
+        with self._lock:
+            self._count("positions_get")
+            out = []
+            for p in self._positions.values():
+                if symbol is not None and p.symbol != symbol:
+                    continue
+                if ticket is not None and p.ticket != ticket:
+                    continue
+                out.append(p._replace(price_current=self._current(p), profit=self._profit(p)))
+            return tuple(out)
+
+    def history_deals_get(self, date_from=None, date_to=None, group=None, position=None, ticket=None):
+        with self._lock:
+            self._count("history_deals_get")
+            t_from = _ts(date_from) if date_from is not None else None
+            t_to = _ts(date_to) if date_to is not None else None
+            out = []
+            for d in self._deals:
+                if t_from is not None and d.time < t_from:
+                    continue
+                if t_to is not None and d.time > t_to:
+                    continue
+                if position is not None and d.position_id != position:
+                    continue
+                out.append(d)
+            return tuple(out)
+
+    def order_send(self, request: dict):
+        # La latencia se simula FUERA del lock (como un terminal real atendiendo otras llamadas)
+        if self.fill_latency_ms:
+            time.sleep(self.fill_latency_ms / 1000.0)
+        with self._lock:
+            self._count("order_send")
+            self._sends += 1
+            if self.reject_every and self._sends % self.reject_every == 0:
+                return self._result(TRADE_RETCODE_REJECT, request, comment="Sim reject")
+            action = request.get("action")
+            if action == TRADE_ACTION_SLTP:
+                return self._modify(request)
+            if action == TRADE_ACTION_DEAL:
+                if request.get("position"):
+                    return self._close(request)
+                return self._open(request)
+            return self._result(TRADE_RETCODE_INVALID, request, comment="Unsupported action")
+
+    # ---------------- internos ----------------
+    def _current(self, p):
+        bid, ask = self._prices.get(p.symbol, (p.price_open, p.price_open))
+        return bid if p.type == POSITION_TYPE_BUY else ask
+
+    def _profit(self, p):
+        cur = self._current(p)
+        diff = (cur - p.price_open) if p.type == POSITION_TYPE_BUY else (p.price_open - cur)
+        return round(diff * p.volume * 100, 2)
+
+    def _fill_price(self, symbol, order_type):
+        bid, ask = self._prices[symbol]
+        slip = self.slippage_points * self._symbols[symbol].point
+        return (ask + slip) if order_type == ORDER_TYPE_BUY else (bid - slip)
+
+    def _result(self, retcode, request, deal=0, order=0, volume=0.0, price=0.0, comment=""):
+        bid, ask = self._prices.get(request.get("symbol"), (0.0, 0.0))
+        return OrderSendResult(retcode, deal, order, volume, price, bid, ask, comment, request)
+
+    def _deal(self, order_type, entry, position_id, symbol, volume, price, profit, magic, comment):
+        now = time.time()
+        deal = TradeDeal(next(self._tickets), position_id, int(now), int(now * 1000),
+                         DEAL_TYPE_BUY if order_type == ORDER_TYPE_BUY else DEAL_TYPE_SELL,
+                         entry, position_id, symbol, volume, price, profit, magic, comment)
+        self._deals.append(deal)
+        return deal
+
+    def _open(self, req):
+        symbol = req.get("symbol")
+        if symbol not in self._prices:
+            return self._result(TRADE_RETCODE_INVALID, req, comment="Unknown symbol")
+        otype = req.get("type")
+        price = self._fill_price(symbol, otype)
+        ticket = next(self._tickets)
+        ptype = POSITION_TYPE_BUY if otype == ORDER_TYPE_BUY else POSITION_TYPE_SELL
+        self._positions[ticket] = TradePosition(ticket, int(time.time()), symbol, ptype,
+                                                float(req.get("volume", 0.0)), price,
+                                                float(req.get("sl", 0.0) or 0.0), float(req.get("tp", 0.0) or 0.0),
+                                                price, 0.0, req.get("magic", 0), req.get("comment", ""))
+        deal = self._deal(otype, DEAL_ENTRY_IN, ticket, symbol, float(req.get("volume", 0.0)), price,
+                          0.0, req.get("magic", 0), req.get("comment", ""))
+        return self._result(TRADE_RETCODE_DONE, req, deal=deal.ticket, order=ticket,
+                            volume=float(req.get("volume", 0.0)), price=price, comment="Request executed")
+
+    def _close(self, req):
+        ticket = int(req.get("position"))
+        pos = self._positions.get(ticket)
+        if pos is None:
+            return self._result(TRADE_RETCODE_POSITION_CLOSED, req, comment="Position doesn't exist")
+        otype = req.get("type")
+        price = self._fill_price(pos.symbol, otype)
+        profit = self._profit(pos)
+        del self._positions[ticket]
+        self.balance += profit
+        deal = self._deal(otype, DEAL_ENTRY_OUT, ticket, pos.symbol, pos.volume, price, profit,
+                          req.get("magic", 0), req.get("comment", ""))
+        return self._result(TRADE_RETCODE_DONE, req, deal=deal.ticket, order=deal.ticket,
+                            volume=pos.volume, price=price, comment="Request executed")
+
+    def _modify(self, req):
+        ticket = int(req.get("position", 0))
+        pos = self._positions.get(ticket)
+        if pos is None:
+            return self._result(TRADE_RETCODE_POSITION_CLOSED, req, comment="Position doesn't exist")
+        self._positions[ticket] = pos._replace(sl=float(req.get("sl", 0.0) or 0.0),
+                                               tp=float(req.get("tp", 0.0) or 0.0))
+        return self._result(TRADE_RETCODE_DONE, req, order=ticket, comment="Request executed")
+
+
+def _ts(value):
+    """datetime | int | float -> epoch (segundos)."""
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    return float(value)
+
+
+# ---------------- Instancia única + funciones a nivel módulo ----------------
+broker = SimBroker()
+
+initialize = broker.initialize
+shutdown = broker.shutdown
+last_error = broker.last_error
+terminal_info = broker.terminal_info
+account_info = broker.account_info
+symbol_info = broker.symbol_info
+symbol_select = broker.symbol_select
+symbol_info_tick = broker.symbol_info_tick
+positions_get = broker.positions_get
+history_deals_get = broker.history_deals_get
+order_send = broker.order_send
@@ -1,85 +1,175 @@
-import MetaTrader5 as mt5
+from broker import mt5
 import time
 
-def calcular_tps(price, tps, side="buy", modo="pips", invertir=False):
-    price = float(price)
-    levels = []
-    if modo == "pips":
-        for tp in tps:
-            if (side == 'buy' and not invertir) or (side == 'sell' and invertir):
-                levels.append(round(price + tp, 2))
-            else:
-                levels.append(round(price - tp, 2))
-        return levels
-    else:
-        if side == "buy":
-            for tp in tps:
-                levels.append(round(price + (price * tp / 100), 2))
-        else:
-            for tp in tps:
-                levels.append(round(price - (price * tp / 100), 2))
-    return levels
+from niveles import calcular_niveles, niveles_porcentaje
+from metricas import observar
 
-def cerrar_posiciones_hasta_vacio(symbol, tipo=None, max_reintentos=3):
-    for intento in range(1, max_reintentos + 1):
-        print(f"[LOG] Intento {intento}: Cerrando posiciones...")
+def calcular_tps(price, tps, side="buy", modo="pips", invertir=False, digits=2, tick_size=None):
+    tps_lvls, _ = calcular_niveles(float(price), side, tps, None, digits=digits, tick_size=tick_size,
+                                   modo="pips" if modo == "pips" else "porcentaje",
+                                   invertir=invertir and modo == "pips")
+    return tps_lvls[0].tolist()
+
+# Precisión por símbolo (dígitos y tick) desde el broker; se consulta una sola vez.
+_precision_cache = {}
+
+def precision_simbolo(symbol, default_digits=2):
+    """Devuelve (digits, tick_size) del símbolo en MT5, cacheado."""
+    hit = _precision_cache.get(symbol)
+    if hit is not None:
+        return hit
+    info = mt5.symbol_info(symbol)
+    if not info:
+        return default_digits, None
+    digits = int(getattr(info, "digits", default_digits))
+    tick = float(getattr(info, "trade_tick_size", 0.0) or 0.0) or None
+    _precision_cache[symbol] = (digits, tick)
+    return digits, tick
+
+# ===================== Cierre (aplanado) de posiciones =====================
+_RETCODES_CERRADA = None  # se arma al primer uso (las constantes vienen del broker)
+
+
+def _retcodes_cerrada():
+    global _RETCODES_CERRADA
+    if _RETCODES_CERRADA is None:
+        _RETCODES_CERRADA = {mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_PLACED}
+        # "Position doesn't exist": otro proceso (o el SL) ya la cerró
+        cerrada = getattr(mt5, "TRADE_RETCODE_POSITION_CLOSED", None)
+        if cerrada is not None:
+            _RETCODES_CERRADA.add(cerrada)
+    return _RETCODES_CERRADA
+
+
+def _close_request(pos, tick):
+    return {
+        "action": mt5.TRADE_ACTION_DEAL,
+        "symbol": pos.symbol,
+        "volume": pos.volume,
+        "type": 1 if pos.type == 0 else 0,
+        "position": pos.ticket,
+        "price": tick.bid if pos.type == 0 else tick.ask,
+        "deviation": 20,
+        "magic": 20240725,
+        "comment": "AutoClose",
+        "type_time": mt5.ORDER_TIME_GTC,
+        "type_filling": mt5.ORDER_FILLING_IOC
+    }
+
+
+def aplanar_simbolo(symbol, tipo=None, posiciones=None, max_reintentos=3,
+                    backoff_base=0.25, backoff_max=2.0):
+    """
+    Cierra las posiciones de `symbol` (opcionalmente solo del `tipo` dado).
+      - UN tick por intento para todas las posiciones del símbolo
+      - los order_send salen seguidos; el log va después
+      - solo se reintentan los tickets que fallaron, con backoff exponencial
+    `posiciones` permite pasar un positions_get() ya hecho (p. ej. desde /closeall).
+
+    Devuelve un reporte exacto:
+        {"symbol", "cerradas": [tickets], "fallidas": {ticket: "retcode comment"},
+         "intentos": n, "ms": ..}
+    """
+    t0 = time.perf_counter()
+    reporte = {"symbol": symbol, "cerradas": [], "fallidas": {}, "intentos": 0, "ms": 0.0}
+    if posiciones is None:
         posiciones = mt5.positions_get(symbol=symbol)
         if posiciones is None:
             print("[ERROR] No se pudieron obtener posiciones de MT5.")
-            return False
-        cerradas = True
-        for pos in posiciones:
-            print(f"[DEBUG-TIPO] ticket={pos.ticket}, symbol={pos.symbol}, type={pos.type}, volume={pos.volume}")
-            if tipo is not None and pos.type != tipo:
-                continue
-            tick = mt5.symbol_info_tick(symbol)
-            if not tick:
-                print("[ERROR] Sin tick de símbolo para cerrar.")
-                return False
-            price = tick.bid if pos.type == 0 else tick.ask
-            close_request = {
-                "action": mt5.TRADE_ACTION_DEAL,
-                "symbol": symbol,
-                "volume": pos.volume,
-                "type": 1 if pos.type == 0 else 0,
-                "position": pos.ticket,
-                "price": price,
-                "deviation": 20,
-                "magic": 20240725,
-                "comment": "AutoClose",
-                "type_time": mt5.ORDER_TIME_GTC,
-                "type_filling": mt5.ORDER_FILLING_IOC
-            }
-            print(f"[DEBUG] close_request: {close_request}")
-            result = mt5.order_send(close_request)
-            print(f"[DEBUG] close result: {result}")
-            if result is None or result.retcode not in [mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_PLACED, mt5.TRADE_RETCODE_DONE_PARTIAL]:
-                cerradas = False
-                print(f"[ERROR] order_send al cerrar. retcode={getattr(result,'retcode',None)} ({getattr(result,'comment','')})")
-        if cerradas:
-            print("[LOG] Todas las posiciones del tipo", tipo, "para", symbol, "están cerradas.")
-            return True
-        time.sleep(2)
-    print("[CRÍTICO] No se lograron cerrar todas las posiciones tras reintentos.")
+            reporte["fallidas"][None] = "positions_get() = None"
+            return reporte
+    pendientes = [p for p in posiciones if p.symbol == symbol and (tipo is None or p.type == tipo)]
+
+    ok_codes = _retcodes_cerrada()
+    for intento in range(1, max_reintentos + 1):
+        if not pendientes:
+            break
+        reporte["intentos"] = intento
+        tick = mt5.symbol_info_tick(symbol)
+        if not tick:
+            print(f"[ERROR] Sin tick de {symbol} para cerrar (intento {intento}).")
+            resultados = [(p, None) for p in pendientes]
+        else:
+            resultados = []
+            for p in pendientes:
+                t_send = time.perf_counter()
+                resultados.append((p, mt5.order_send(_close_request(p, tick))))
+                observar("mt5.order_send.close", (time.perf_counter() - t_send) * 1000.0)
+
+        fallidas = {}
+        for p, result in resultados:
+            retcode = getattr(result, "retcode", None)
+            if retcode in ok_codes:
+                reporte["cerradas"].append(p.ticket)
+                reporte["fallidas"].pop(p.ticket, None)
+            else:
+                fallidas[p.ticket] = f"{retcode} {getattr(result, 'comment', '')}".strip()
+        reporte["fallidas"].update(fallidas)
+        print(f"[CLOSE] {symbol} intento {intento}: enviadas={len(resultados)} "
+              f"ok={len(resultados) - len(fallidas)} fallidas={len(fallidas)}")
+        if not fallidas:
+            break
+        if intento == max_reintentos:
+            break
+
+        time.sleep(min(backoff_max, backoff_base * (2 ** (intento - 1))))
+        # Volumen/estado actual solo de los que fallaron (cierres parciales, etc.)
+        listado = mt5.positions_get(symbol=symbol)
+        if listado is None:
+            pendientes = [p for p, _ in resultados if p.ticket in fallidas]
+            continue
+        actuales = {p.ticket: p for p in listado}
+        pendientes = []
+        for ticket in fallidas:
+            if ticket in actuales:
+                pendientes.append(actuales[ticket])
+            else:
+                reporte["cerradas"].append(ticket)  # ya no existe => cerrada
+                reporte["fallidas"].pop(ticket, None)
+
+    reporte["ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    observar("executor.flatten", reporte["ms"])
+    if reporte["fallidas"]:
+        print(f"[CRÍTICO] {symbol}: no se cerraron {len(reporte['fallidas'])} posiciones: {reporte['fallidas']}")
+    return reporte
+
+
+def fusionar_reportes(reportes):
+    """Junta varios reportes de aplanar_simbolo en uno (para /closeall)."""
+    total = {"cerradas": [], "fallidas": {}, "por_simbolo": {}, "ms": 0.0}
+    for r in reportes:
+        total["cerradas"].extend(r["cerradas"])
+        total["fallidas"].update(r["fallidas"])
+        total["por_simbolo"][r["symbol"]] = (len(r["cerradas"]), len(r["fallidas"]))
+        total["ms"] = max(total["ms"], r["ms"])
+    return total
+
+
+def cerrar_posiciones_hasta_vacio(symbol, tipo=None, max_reintentos=3):
+    """Compatibilidad: True si no quedó ninguna posición (del tipo) sin cerrar."""
+    reporte = aplanar_simbolo(symbol, tipo=tipo, max_reintentos=max_reintentos)
+    if not reporte["fallidas"]:
+        print("[LOG] Todas las posiciones del tipo", tipo, "para", symbol, "están cerradas.")
+        return True
     return False
 
-def calcular_tps_porcentaje(price, tps_percent, sl_percent, side="buy"):
+def calcular_tps_porcentaje(price, tps_percent, sl_percent, side="buy", digits=2, tick_size=None):
     """
     Calcula niveles de TP y SL basados en porcentaje desde el precio.
     """
-    niveles = []
-    price = float(price)
-    if side == "buy":
-        niveles = [round(price * (1 + tp / 100), 2) for tp in tps_percent]
-        sl = round(price * (1 - sl_percent / 100), 2)
-    else:
-        niveles = [round(price * (1 - tp / 100), 2) for tp in tps_percent]
-        sl = round(price * (1 + sl_percent / 100), 2)
-    return niveles, sl
+    return niveles_porcentaje(price, tps_percent, sl_percent, side=side, digits=digits, tick_size=tick_size)
 
 
 # ===================== SL/TP helpers =====================
 
+def _sltp_ok(result):
+    return (result is not None) and (result.retcode in (
+        mt5.TRADE_RETCODE_DONE,
+        mt5.TRADE_RETCODE_PLACED,
+        mt5.TRADE_RETCODE_DONE_PARTIAL
+    ))
+
+
 def _modify_position_sl(position_ticket, symbol, new_sl, keep_tp):
     """Modifica solo el SL de una posición con TRADE_ACTION_SLTP."""
     req = {
@@ -90,61 +180,122 @@ def _modify_position_sl(position_ticket, symbol, new_sl, keep_tp):
         "tp": float(keep_tp) if keep_tp else 0.0,
     }
     result = mt5.order_send(req)
-    ok = (result is not None) and (result.retcode in (
-        mt5.TRADE_RETCODE_DONE,
-        mt5.TRADE_RETCODE_PLACED,
-        mt5.TRADE_RETCODE_DONE_PARTIAL
-    ))
+    ok = _sltp_ok(result)
     print(f"[SL-UPDATE] pos={position_ticket} sl->{new_sl} ok={ok} ret={getattr(result,'retcode',None)}")
     return ok
 
 
-def mover_sl_en_take_profit_inmediato(symbol, side, tps_percent, tp_index=1):
+def modificar_sltp_lote(cambios):
     """
-    Mueve el SL *inmediatamente* al recibir la alerta de TAKE PROFIT (sin validar precio actual).
-    Reglas:
-      - tp_index <= 1 => SL = precio de entrada (break-even)
-      - tp_index >= 2 => SL = TP(tp_index-1) calculado desde la entrada de cada posición
+    Envía varias modificaciones SL/TP seguidas (sin cálculos ni prints entre order_send).
+    cambios: lista de dicts {"ticket", "symbol", "sl", "tp"}.
+    Devuelve una lista de resultados por ticket:
+        {"ticket", "sl", "ok", "retcode", "comment", "ms"}
+    """
+    reqs = [{
+        "action": mt5.TRADE_ACTION_SLTP,
+        "position": int(c["ticket"]),
+        "symbol": c["symbol"],
+        "sl": float(c["sl"]),
+        "tp": float(c["tp"]) if c.get("tp") else 0.0,
+    } for c in cambios]
 
-    Devuelve:
-        (did_update, num_positions)
+    crudos = []
+    for req in reqs:
+        t0 = time.perf_counter()
+        result = mt5.order_send(req)
+        crudos.append((result, (time.perf_counter() - t0) * 1000.0))
+        observar("mt5.order_send.sltp", crudos[-1][1])
+
+    resultados = []
+    for req, (result, ms) in zip(reqs, crudos):
+        ok = _sltp_ok(result)
+        resultados.append({
+            "ticket": req["position"],
+            "sl": req["sl"],
+            "ok": ok,
+            "retcode": getattr(result, "retcode", None),
+            "comment": getattr(result, "comment", ""),
+            "ms": round(ms, 3),
+        })
+        print(f"[SL-UPDATE] pos={req['position']} sl->{req['sl']} ok={ok} "
+              f"ret={getattr(result, 'retcode', None)} {ms:.1f}ms")
+    return resultados
+
+
+def _objetivos_sl(posiciones, side, tps_percent, tp_index, digits, tick_size):
+    """
+    SL objetivo por posición. Los niveles se calculan una sola vez por precio de
+    entrada distinto (las parciales de una señal comparten entrada).
+    """
+    if tp_index <= 1:
+        return [float(p.price_open) for p in posiciones]
+    entradas = sorted({float(p.price_open) for p in posiciones})
+    tps, _ = calcular_niveles(entradas, side, tps_percent, None, digits=digits, tick_size=tick_size)
+    idx = min(max(1, tp_index - 1) - 1, tps.shape[1] - 1)  # 0-based del TP previo
+    por_entrada = dict(zip(entradas, tps[:, idx].tolist()))
+    return [por_entrada[float(p.price_open)] for p in posiciones]
+
+
+def mover_sl_en_take_profit_lote(symbol, side, tps_percent, tp_index=1):
     """
+    Versión masiva de mover_sl_en_take_profit_inmediato: agrupa por entrada,
+    descarta los no-op antes de tocar el broker y despacha todas las
+    modificaciones seguidas.
+
+    Devuelve un dict:
+        {"posiciones": n del lado, "enviadas": k, "omitidas": [tickets],
+         "resultados": [por ticket, ver modificar_sltp_lote], "ms_total": ..}
+    """
+    reporte = {"posiciones": 0, "enviadas": 0, "omitidas": [], "resultados": [], "ms_total": 0.0}
     side = (side or "").lower()
     if side not in ("buy", "sell"):
-        return (False, 0)
+        return reporte
 
+    t0 = time.perf_counter()
     pos_all = mt5.positions_get(symbol=symbol) or []
-    if not pos_all:
-        print("[TP-IMMED] Sin posiciones para", symbol)
-        return (False, 0)
-
     side_code = mt5.POSITION_TYPE_BUY if side == "buy" else mt5.POSITION_TYPE_SELL
     pos_side = [p for p in pos_all if p.type == side_code]
+    reporte["posiciones"] = len(pos_side)
     if not pos_side:
         print(f"[TP-IMMED] No hay posiciones {side.upper()} para", symbol)
-        return (False, 0)
+        return reporte
 
-    did = False
-    for p in pos_side:
-        entry = float(p.price_open)
-        levels, _ = calcular_tps_porcentaje(entry, tps_percent, 0.0, side=side)
-
-        if tp_index <= 1:
-            target = entry
-        else:
-            idx = max(1, tp_index - 1) - 1  # 0-based del TP previo
-            idx = min(idx, len(levels) - 1)
-            target = levels[idx]
+    digits, tick_size = precision_simbolo(symbol)
+    objetivos = _objetivos_sl(pos_side, side, tps_percent, tp_index, digits, tick_size)
 
-        current_sl = float(getattr(p, "sl", 0.0) or 0.0)
+    cambios = []
+    for p, target in zip(pos_side, objetivos):
+        current_sl = round(float(getattr(p, "sl", 0.0) or 0.0), digits)
         # Solo mejorar SL (sube en BUY, baja en SELL)
-        should_update = (side == "buy" and (current_sl < target or current_sl == 0.0)) or \
-                        (side == "sell" and (current_sl > target or current_sl == 0.0))
-
+        should_update = current_sl == 0.0 or \
+            (side == "buy" and current_sl < target) or \
+            (side == "sell" and current_sl > target)
         if should_update:
-            ok = _modify_position_sl(p.ticket, p.symbol, target, getattr(p, "tp", 0.0))
-            did = did or ok
+            cambios.append({"ticket": p.ticket, "symbol": p.symbol, "sl": target,
+                            "tp": getattr(p, "tp", 0.0)})
         else:
-            print(f"[TP-IMMED] SL ya ≥ objetivo (pos {p.ticket}, sl={current_sl}, objetivo={target})")
+            reporte["omitidas"].append(p.ticket)
+
+    if reporte["omitidas"]:
+        print(f"[TP-IMMED] {len(reporte['omitidas'])} posiciones ya tienen SL ≥ objetivo (sin cambios)")
+    if cambios:
+        reporte["resultados"] = modificar_sltp_lote(cambios)
+        reporte["enviadas"] = len(cambios)
+    reporte["ms_total"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    return reporte
+
+
+def mover_sl_en_take_profit_inmediato(symbol, side, tps_percent, tp_index=1):
+    """
+    Mueve el SL *inmediatamente* al recibir la alerta de TAKE PROFIT (sin validar precio actual).
+    Reglas:
+      - tp_index <= 1 => SL = precio de entrada (break-even)
+      - tp_index >= 2 => SL = TP(tp_index-1) calculado desde la entrada de cada posición
 
-    return (did, len(pos_side))
+    Devuelve:
+        (did_update, num_positions)
+    """
+    reporte = mover_sl_en_take_profit_lote(symbol, side, tps_percent, tp_index=tp_index)
+    did = any(r["ok"] for r in reporte["resultados"])
+    return (did, reporte["posiciones"])
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import requests
+
+
+class OrderWakeup:
+    """
+    Long-poll contra /orders/wait del backend. Cuando el backend avisa que hay
+    órdenes nuevas, despierta al loop principal (wait() retorna de inmediato).
+    Si BACKEND_URL no está o el backend no responde, wait() se comporta como
+    time.sleep(timeout): el polling a la DB sigue funcionando como fallback.
+    """
+
+    def __init__(self, base_url: str, token: str = "", poll_timeout: float = 25.0):
+        self.base_url = (base_url or "").rstrip("/")
+        self.token = token or ""
+        self.poll_timeout = float(poll_timeout)
+        self._event = threading.Event()
+        self._seq = None
+        self._session = requests.Session()
+        self.wakeups = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def start(self):
+        if not self.enabled:
+            print("[WAKEUP] BACKEND_URL no definido; solo polling.")
+            return
+        threading.Thread(target=self._loop, name="order-wakeup", daemon=True).start()
+        print(f"[WAKEUP] Long-poll a {self.base_url}/orders/wait")
+
+    def wait(self, timeout: float) -> bool:
+        """Bloquea hasta aviso del backend o timeout. True si hubo aviso."""
+        woke = self._event.wait(timeout)
+        self._event.clear()
+        return woke
+
+    def notify(self):
+        """Despierta al loop manualmente (p. ej. desde el listener de Telegram)."""
+        self._event.set()
+
+    def _loop(self):
+        url = f"{self.base_url}/orders/wait"
+        headers = {"X-Orders-Token": self.token} if self.token else {}
+        errores = 0
+        while True:
+            try:
+                params = {"timeout": self.poll_timeout}
+                if self._seq is not None:
+                    params["since"] = self._seq
+                r = self._session.get(url, params=params, headers=headers,
+                                      timeout=self.poll_timeout + 10)
+                r.raise_for_status()
+                data = r.json()
+                seq = int(data.get("seq", 0))
+                # Reinicio del backend => la secuencia vuelve a 0: resincronizamos y despertamos
+                if data.get("changed") or (self._seq is not None and seq < self._seq):
+                    self.wakeups += 1
+                    self._event.set()
+                self._seq = seq
+                errores = 0
+            except Exception as e:
+                errores += 1
+                espera = min(30.0, 2.0 * errores)
+                if errores == 1 or errores % 10 == 0:
+                    print(f"[WAKEUP] Error long-poll ({e}); reintento en {espera:.0f}s")
+                time.sleep(espera)
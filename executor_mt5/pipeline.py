@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metricas import observar
+
+
+class StageWorker:
+    """
+    Etapa del pipeline: un thread que ejecuta en orden (FIFO) los callables encolados.
+    submit() no bloquea y devuelve un Future por si quien encola necesita el resultado.
+    """
+
+    def __init__(self, name: str, maxsize: int = 0, metric: str = None):
+        self.name = name
+        # Histogramas stage.<metric>.queue_wait / .run (las lanes comparten el del prefijo)
+        self.metric = metric or name
+        self._q = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._started = False
+        self._start_lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        with self._start_lock:
+            if not self._started:
+                self._thread.start()
+                self._started = True
+        return self
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        fut = Future()
+        self._q.put((fut, fn, args, kwargs, time.perf_counter()))
+        return fut
+
+    def qsize(self) -> int:
+        return self._q.qsize()
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """Espera a que la cola se vacíe (p. ej. antes de salir). True si lo logró."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._q.unfinished_tasks == 0:
+                return True
+            time.sleep(0.05)
+        return self._q.unfinished_tasks == 0
+
+    def _loop(self):
+        while True:
+            fut, fn, args, kwargs, t_enq = self._q.get()
+            t0 = time.perf_counter()
+            observar(f"stage.{self.metric}.queue_wait", (t0 - t_enq) * 1000.0)
+            try:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                try:
+                    fut.set_result(fn(*args, **kwargs))
+                    self.processed += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f"[PIPE] {self.name}: error en {getattr(fn, '__name__', fn)}: {e}")
+                    fut.set_exception(e)
+            finally:
+                observar(f"stage.{self.metric}.run", (time.perf_counter() - t0) * 1000.0)
+                self._q.task_done()
+
+
+class KeyedLanes:
+    """
+    Un StageWorker por clave (símbolo MT5): todo lo de un mismo símbolo se serializa
+    (cierres, entradas, SL) y símbolos distintos avanzan en paralelo.
+    """
+
+    def __init__(self, prefix: str = "lane"):
+        self.prefix = prefix
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = StageWorker(f"{self.prefix}-{key}", metric=self.prefix).start()
+                self._lanes[key] = lane
+        return lane.submit(fn, *args, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {k: {"depth": w.qsize(), "processed": w.processed, "failed": w.failed}
+                    for k, w in self._lanes.items()}
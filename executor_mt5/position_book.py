@@ -0,0 +1,159 @@
+import threading
+import time
+
+from broker import mt5
+
+
+class PositionBook:
+    """
+    Libro de posiciones en memoria, por (símbolo, lado). Evita pedirle a MT5
+    positions_get() en cada orden o comando:
+
+      - refresh(): UN positions_get y diff de tickets contra lo que ya había
+        (altas, bajas y cambios de volumen por cierres parciales)
+      - abrir()/cerrar(): se aplican apenas order_send confirma, sin esperar al refresh
+      - count()/volumen()/entrada_media(): O(1), de agregados mantenidos incrementalmente
+
+    Un thread refresca cada `interval` segundos para atrapar lo que cierra el broker
+    (SL/TP) o lo que se abre a mano en el terminal.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = float(interval)
+        self._lock = threading.Lock()
+        self._tickets = {}  # ticket -> (symbol, side, volume, price_open)
+        self._agg = {}      # (symbol, side) -> [n, volumen, volumen * precio]
+        # Cambios aplicados desde order_send: ticket -> instante. Un snapshot tomado antes
+        # no los pisa (si no, el refresh "des-abriría" o "re-abriría" esos tickets).
+        self._tocados = {}
+        self._last_sync = 0.0
+        self._started = False
+        self.refreshes = 0
+        self.errores = 0
+
+    # ---------------- agregados ----------------
+    def _sumar(self, symbol, side, volume, price, signo):
+        a = self._agg.setdefault((symbol, side), [0, 0.0, 0.0])
+        a[0] += signo
+        a[1] += signo * volume
+        a[2] += signo * volume * price
+        if a[0] <= 0:
+            del self._agg[(symbol, side)]
+
+    def _alta(self, ticket, symbol, side, volume, price):
+        self._tickets[ticket] = (symbol, side, volume, price)
+        self._sumar(symbol, side, volume, price, +1)
+
+    def _baja(self, ticket):
+        fila = self._tickets.pop(ticket, None)
+        if fila is not None:
+            symbol, side, volume, price = fila
+            self._sumar(symbol, side, volume, price, -1)
+        return fila is not None
+
+    # ---------------- actualizaciones ----------------
+    @staticmethod
+    def _lado(tipo) -> str:
+        return "buy" if tipo == mt5.POSITION_TYPE_BUY else "sell"
+
+    def sync(self, posiciones, tomado_en: float = None) -> tuple:
+        """
+        Diff contra un positions_get() ya hecho (tomado en `tomado_en`, monotonic).
+        Devuelve (altas, bajas).
+        """
+        tomado_en = time.monotonic() if tomado_en is None else tomado_en
+        vistos = set()
+        altas = bajas = 0
+        with self._lock:
+            recientes = {t for t, ts in self._tocados.items() if ts >= tomado_en}
+            self._tocados = {t: self._tocados[t] for t in recientes}
+            for p in posiciones:
+                vistos.add(p.ticket)
+                if p.ticket in recientes:
+                    continue
+                fila = (p.symbol, self._lado(p.type), float(p.volume), float(p.price_open))
+                actual = self._tickets.get(p.ticket)
+                if actual == fila:
+                    continue
+                if actual is not None:
+                    self._baja(p.ticket)  # cambió el volumen (cierre parcial)
+                else:
+                    altas += 1
+                self._alta(p.ticket, *fila)
+            for t in [t for t in self._tickets if t not in vistos and t not in recientes]:
+                self._baja(t)
+                bajas += 1
+            self._last_sync = time.monotonic()
+        return altas, bajas
+
+    def refresh(self) -> bool:
+        t0 = time.monotonic()
+        posiciones = mt5.positions_get()
+        if posiciones is None:
+            self.errores += 1
+            return False
+        self.sync(posiciones, tomado_en=t0)
+        self.refreshes += 1
+        return True
+
+    def abrir(self, ticket, symbol, side, volume, price):
+        """Alta desde un order_send exitoso (ticket = result.order)."""
+        if not ticket:
+            return
+        with self._lock:
+            self._baja(ticket)
+            self._alta(ticket, symbol, side, float(volume), float(price))
+            self._tocados[ticket] = time.monotonic()
+
+    def cerrar(self, tickets):
+        with self._lock:
+            ahora = time.monotonic()
+            for t in tickets:
+                self._baja(t)
+                self._tocados[t] = ahora
+
+    # ---------------- lecturas O(1) ----------------
+    def edad(self) -> float:
+        """Segundos desde el último refresh completo."""
+        return time.monotonic() - self._last_sync if self._last_sync else float("inf")
+
+    def count(self, symbol, side) -> int:
+        a = self._agg.get((symbol, side))
+        return a[0] if a else 0
+
+    def volumen(self, symbol, side) -> float:
+        a = self._agg.get((symbol, side))
+        return round(a[1], 8) if a else 0.0
+
+    def entrada_media(self, symbol, side):
+        a = self._agg.get((symbol, side))
+        return (a[2] / a[1]) if a and a[1] > 0 else None
+
+    def simbolos(self) -> list:
+        with self._lock:
+            return sorted({s for s, _ in self._agg})
+
+    def resumen(self) -> dict:
+        """{(symbol, side): {"n", "volumen", "entrada_media"}}"""
+        with self._lock:
+            return {k: {"n": a[0], "volumen": round(a[1], 8),
+                        "entrada_media": (a[2] / a[1]) if a[1] > 0 else None}
+                    for k, a in sorted(self._agg.items())}
+
+    # ---------------- thread de refresh ----------------
+    def start(self):
+        if self._started:
+            return self
+        self._started = True
+        self.refresh()
+        threading.Thread(target=self._loop, name="position-book", daemon=True).start()
+        return self
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                self.errores += 1
+                print(f"[BOOK] Error refrescando posiciones: {e}")
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from broker import mt5
+from metricas import observar
+
+_ENTRADAS_CIERRE = (getattr(mt5, "DEAL_ENTRY_OUT", 1), getattr(mt5, "DEAL_ENTRY_OUT_BY", 3))
+
+
+class Reconciliador:
+    """
+    Cierra en trades_log los trades que MT5 ya cerró (TP/SL del broker, /closeall,
+    cierres a mano en el terminal). Por pasada:
+
+      - UN history_deals_get(desde - solape, ahora) con los deals nuevos
+      - UNA consulta de tickets 'open' de la cuenta (tickets_abiertos() -> set)
+      - match por position_id contra ese set (dict, O(1) por deal)
+      - los cierres van al journal (registrar_cierre), que los aplica en un UPDATE por lote
+
+    `desde` es la marca del último deal visto (hora del servidor MT5, como deal.time) y
+    se guarda en `state_path`, así cada pasada solo pide los deals nuevos. El solape
+    cubre deals con time igual a la marca o que el terminal entregó tarde.
+    """
+
+    def __init__(self, tickets_abiertos, registrar_cierre, state_path: str,
+                 interval: float = 30.0, lookback_sec: float = 7 * 86400, overlap_sec: float = 300.0):
+        self.tickets_abiertos = tickets_abiertos
+        self.registrar_cierre = registrar_cierre
+        self.state_path = state_path
+        self.interval = float(interval)
+        self.lookback_sec = float(lookback_sec)
+        self.overlap_sec = float(overlap_sec)
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+        self._enviados = {}  # ticket -> instante: ya encolados, el DB puede no haberlos drenado aún
+        self.desde = self._cargar_marca()
+        self.pasadas = 0
+        self.cerrados = 0
+        self.errores = 0
+        self.ultima = None
+
+    # ---------------- marca ----------------
+    def _cargar_marca(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return float(json.load(f)["desde"])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[RECON] {self.state_path} ilegible ({e}); arranco desde el lookback")
+            return None
+
+    def _guardar_marca(self):
+        tmp = f"{self.state_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"desde": self.desde}, f)
+            os.replace(tmp, self.state_path)
+        except Exception as e:
+            print(f"[RECON] Error guardando {self.state_path}: {e}")
+
+    # ---------------- pasada ----------------
+    @staticmethod
+    def _cierres_por_posicion(deals):
+        """position_id -> (precio de salida ponderado por volumen, time, comment) de los deals OUT."""
+        acum = {}
+        for d in deals:
+            if d.entry not in _ENTRADAS_CIERRE:
+                continue
+            a = acum.setdefault(d.position_id, [0.0, 0.0, 0, ""])
+            a[0] += d.volume
+            a[1] += d.volume * d.price
+            if d.time >= a[2]:
+                a[2], a[3] = d.time, d.comment
+        return {pid: ((a[1] / a[0]) if a[0] else 0.0, a[2], a[3]) for pid, a in acum.items()}
+
+    def reconciliar(self) -> dict:
+        """Una pasada. Devuelve {"deals", "abiertos", "cerrados", "ms"}."""
+        with self._lock:
+            t0 = time.perf_counter()
+            ahora = time.time()
+            desde = self.desde if self.desde is not None else ahora - self.lookback_sec
+            abiertos = self.tickets_abiertos()
+            if abiertos is None:
+                self.errores += 1
+                return {"deals": 0, "abiertos": None, "cerrados": 0, "ms": 0.0}
+            # hasta = ahora + 1 día: deal.time viene en hora del servidor, que puede ir adelantada
+            deals = mt5.history_deals_get(int(desde - self.overlap_sec), int(ahora + 86400))
+            if deals is None:
+                self.errores += 1
+                print(f"[RECON] history_deals_get falló: {mt5.last_error()}")
+                return {"deals": 0, "abiertos": len(abiertos), "cerrados": 0, "ms": 0.0}
+
+            # Lo ya encolado sale del set cuando el DB lo refleja (o a los 10 min, por si acaso)
+            self._enviados = {t: ts for t, ts in self._enviados.items()
+                              if t in abiertos and ahora - ts < 600}
+            cerrados = 0
+            for pid, (precio, t_deal, comment) in self._cierres_por_posicion(deals).items():
+                if pid not in abiertos or pid in self._enviados:
+                    continue
+                close_time = datetime.fromtimestamp(t_deal, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+                self.registrar_cierre(pid, precio, close_time, comment or "mt5-history")
+                self._enviados[pid] = ahora
+                cerrados += 1
+
+            marca = max((d.time for d in deals), default=None)
+            if marca is not None and (self.desde is None or marca > self.desde):
+                self.desde = float(marca)
+                self._guardar_marca()
+            elif self.desde is None:
+                self.desde = desde  # sin deals: la próxima pasada no vuelve a pedir todo el lookback
+            ms = (time.perf_counter() - t0) * 1000.0
+            observar("reconcile.pass", ms)
+            self.pasadas += 1
+            self.cerrados += cerrados
+            self.ultima = {"deals": len(deals), "abiertos": len(abiertos), "cerrados": cerrados,
+                           "ms": round(ms, 2)}
+            if cerrados:
+                print(f"[RECON] {cerrados} trades cerrados en trades_log "
+                      f"({len(deals)} deals, {len(abiertos)} abiertos, {ms:.1f} ms)")
+            return self.ultima
+
+    def despertar(self):
+        """Adelanta la próxima pasada (p. ej. después de un /closeall)."""
+        self._wake.set()
+
+    def stats(self) -> dict:
+        return {"pasadas": self.pasadas, "cerrados": self.cerrados, "errores": self.errores,
+                "desde": self.desde, "ultima": self.ultima}
+
+    def start(self):
+        if self._started:
+            return self
+        self._started = True
+        threading.Thread(target=self._loop, name="reconciliador", daemon=True).start()
+        return self
+
+    def _loop(self):
+        while True:
+            try:
+                self.reconciliar()
+            except Exception as e:
+                self.errores += 1
+                print(f"[RECON] Error: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,86 @@
+# senales.py
+"""
+Gramática única de señales de TradingView (el mismo archivo vive en backend/ y en
+executor_mt5/, igual que niveles.py). Los patrones van en dos regex compiladas al
+importar; el resultado es una tupla tipada y se cachea por texto.
+
+    clasificar("Take Profit Buy TP2")
+    => Senal(kind='take_profit', side='buy', tp_index=2, label='TP_BUY')
+
+kind:
+  - "posible":     Posible Buy / Posible Sell (informativas, no se ejecutan)
+  - "take_profit": Take Profit [Buy/Long/Sell/Short] [... TPn ...]
+  - "entry":       Buy/Compra Normal o Smart, Sell/Venta Normal o Smart, buy, sell
+  - "unknown":     cualquier otra cosa (p. ej. "TP2 Buy"); el executor no la ejecuta
+
+Los avisos (_AVISOS: posible, take profit) se buscan en cualquier parte del texto,
+como los `in` de antes: "Posible Buy XAUUSD" o "Take Profit Buy TP2 alcanzado" siguen
+siendo avisos. Las entradas (_ENTRADAS) van con fullmatch: abren posición, así que el
+texto normalizado tiene que ser la señal entera. test_senales.py fija la clasificación
+contra las implementaciones anteriores.
+
+Para sumar vocabulario: agregar la alternativa en _AVISOS o _ENTRADAS (con sus
+grupos nombrados) y, si hace falta, la palabra de lado en _LADOS.
+"""
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+Senal = namedtuple("Senal", "kind side tp_index label")
+
+_LADOS = {
+    "buy": "buy", "compra": "buy", "long": "buy",
+    "sell": "sell", "venta": "sell", "short": "sell",
+}
+_LADO = r"(?:buy|sell|compra|venta|long|short)"
+
+_AVISOS = re.compile(rf"""
+      (?P<posible>posible\s*(?P<p_lado>{_LADO}))
+    | (?P<tp>take\s*profit\s*(?P<t_lado>{_LADO})?)
+""", re.X)
+
+# Número de TP en cualquier parte del aviso: "... TP2 alcanzado", "(TP3)", "Take Profit 2"
+_TP_N = re.compile(r"(?:take\s*profit|tp)\s*(\d+)")
+
+_ENTRADAS = re.compile(r"""
+      (?P<entry>(?P<e_lado>buy|sell|compra|venta)\s*/?\s*(?:buy|sell|compra|venta)?\s*normal\s*o\s*smart)
+    | (?P<simple>(?P<s_lado>buy|sell))
+""", re.X)
+
+_ESPACIOS = re.compile(r"\s+")
+
+DESCONOCIDA = Senal("unknown", None, None, "UNKNOWN")
+
+
+def _normalizar(texto: str) -> str:
+    t = texto.strip().lower()
+    if not t.isascii():
+        t = "".join(c for c in unicodedata.normalize("NFD", t) if unicodedata.category(c) != "Mn")
+    return _ESPACIOS.sub(" ", t)
+
+
+@lru_cache(maxsize=1024)
+def clasificar(texto: str) -> Senal:
+    """Clasifica el texto de la señal (order_type / signal). Resultado cacheado."""
+    if not texto:
+        return DESCONOCIDA
+    t = _normalizar(str(texto))
+    m = _AVISOS.search(t)
+    if m is not None:
+        if m.group("posible"):
+            side = _LADOS[m.group("p_lado")]
+            return Senal("posible", side, None, f"POSIBLE_{side.upper()}")
+        lado = m.group("t_lado")
+        side = _LADOS[lado] if lado else None
+        n = _TP_N.search(t)
+        return Senal("take_profit", side, int(n.group(1)) if n else None,
+                     f"TP_{side.upper()}" if side else "TP")
+    m = _ENTRADAS.fullmatch(t)
+    if m is None:
+        return DESCONOCIDA
+    if m.group("entry"):
+        side = _LADOS[m.group("e_lado")]
+        return Senal("entry", side, None, f"{side.upper()}_NORMAL_SMART")
+    side = m.group("s_lado")
+    return Senal("entry", side, None, side.upper())
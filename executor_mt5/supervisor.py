@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+# supervisor.py
+"""
+Modo supervisor: varias cuentas/terminales MT5 desde un solo arranque.
+
+La API de Python de MT5 se ata a UN terminal por proceso, así que cada cuenta
+corre en su propio proceso worker (mt5_executor.run_worker) y este proceso hace
+lo que antes se repetía en cada executor:
+
+  - UNA consulta de pendientes por vuelta para todas las cuentas (IN (...)),
+    repartidas a cada worker por su cola
+  - UN long-poll al backend, UN listener de Telegram (los comandos se reenvían a
+    todos los workers y las respuestas vuelven juntas en un solo mensaje) y UN keepalive
+  - mensajes de Telegram de los workers con prefijo [login], enviados por un solo worker
+  - métricas consolidadas {"supervisor": ..., "workers": {login: ...}} en METRICS_PORT/METRICS_FILE
+  - si un worker muere se relanza con backoff exponencial
+
+    TERMINALS='{"12345678": "C:\\\\MT5-A\\\\terminal64.exe", "87654321": "C:\\\\MT5-B\\\\terminal64.exe"}'
+    py supervisor.py
+
+Solo se lanzan las cuentas de TERMINALS que estén habilitadas en `counts`.
+Cada worker usa su propio journal (journal-<login>.db); el auto_mode.flag es compartido.
+"""
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from db import (get_pending_orders_multi, claim_pending_orders_multi, renovar_leases,
+                get_active_counts, expirar_ordenes_viejas)
+from order_wakeup import OrderWakeup
+from pipeline import StageWorker
+from telegram_listener import escuchar_comandos
+import metricas
+from metricas import span
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TELEGRAM_TOKEN   = os.getenv("TELEGRAM_TOKEN")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+
+# {login: ruta del terminal64.exe}; ruta vacía/null = terminal por defecto
+TERMINALS = os.getenv("TERMINALS", "")
+
+BACKEND_URL       = os.getenv("BACKEND_URL", "")
+ORDERS_WAIT_TOKEN = os.getenv("ORDERS_WAIT_TOKEN", "")
+POLL_INTERVAL_SEC = float(os.getenv("POLL_INTERVAL_SEC", "5"))
+FULL_RESYNC_EVERY = int(os.getenv("FULL_RESYNC_EVERY", "12"))
+ORDER_MAX_AGE_SEC = int(os.getenv("ORDER_MAX_AGE_SEC", "0"))
+
+CLAIM_ORDERS    = os.getenv("CLAIM_ORDERS", "false").lower() == "true"
+CLAIM_BATCH     = int(os.getenv("CLAIM_BATCH", "50"))
+CLAIM_LEASE_SEC = int(os.getenv("CLAIM_LEASE_SEC", "60"))
+EXECUTOR_ID     = os.getenv("EXECUTOR_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Respuesta a un comando: se espera a todos los workers hasta este timeout (/closeall puede tardar)
+COMMAND_TIMEOUT_SEC = float(os.getenv("COMMAND_TIMEOUT_SEC", "60"))
+# Relanzar workers caídos: 1s, 2s, 4s... hasta RESTART_MAX_SEC; vuelve a 1s tras RESTART_RESET_SEC estable
+RESTART_MAX_SEC   = float(os.getenv("RESTART_MAX_SEC", "60"))
+RESTART_RESET_SEC = float(os.getenv("RESTART_RESET_SEC", "300"))
+
+METRICS_PORT     = int(os.getenv("METRICS_PORT", "0") or 0)
+METRICS_FILE     = os.getenv("METRICS_FILE", "")
+METRICS_FILE_SEC = float(os.getenv("METRICS_FILE_SEC", "10"))
+
+_ctx = multiprocessing.get_context("spawn")
+_wakeup = OrderWakeup(BACKEND_URL, ORDERS_WAIT_TOKEN)
+_tg_worker = StageWorker("sup-tg")
+
+
+class _Worker:
+    """Estado del proceso de una cuenta, visto desde el supervisor."""
+
+    def __init__(self, login: str, path):
+        self.login = login
+        self.path = path or None
+        self.proc = None
+        self.inbox = None
+        self.listo = False
+        self.listo_desde = 0.0
+        self.activo = False          # modo ON/OFF que reporta el worker
+        self.reinicios = 0
+        self.proximo_inicio = 0.0
+        self.metricas = None
+
+    @property
+    def vivo(self) -> bool:
+        return self.proc is not None and self.proc.is_alive()
+
+    @property
+    def recibe_ordenes(self) -> bool:
+        return self.listo and self.activo and self.vivo
+
+
+_workers = {}                   # login -> _Worker
+_outbox = None                  # cola compartida worker -> supervisor
+_forzar_resync = True
+_last_order_id = None
+_loops_since_resync = 0
+# Con CLAIM_ORDERS: órdenes reclamadas y entregadas a un worker, id -> login. El heartbeat
+# renueva su lease hasta que el worker escribe el estado final (o muere: ahí se sueltan).
+_reclamadas = {}
+_reclamadas_lock = threading.Lock()
+# Sin claim: órdenes que un worker terminó sin estado final; se vuelven a pedir en cada poll
+_reintentar = set()
+_reintentar_lock = threading.Lock()
+
+# Comandos en curso: cmd_id -> {"faltan": set(logins), "respuestas": {login: texto}, "evento": Event}
+_comandos = {}
+_comandos_lock = threading.Lock()
+_cmd_ids = itertools.count(1)
+
+
+# ---------------------- TELEGRAM ----------------------
+def _enviar_telegram_ahora(texto: str):
+    try:
+        with span("telegram.http"):
+            requests.post(
+                f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
+                data={"chat_id": TELEGRAM_CHAT_ID, "text": texto},
+                timeout=8,
+            )
+    except Exception as e:
+        print(f"[ERROR] Telegram: {e}")
+
+def enviar_mensaje_telegram(texto: str):
+    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
+        return
+    _tg_worker.submit(_enviar_telegram_ahora, texto)
+
+def notificador_activo():
+    while True:
+        enviar_mensaje_telegram("Actv Desarrollo")
+        time.sleep(1800)  # 30 min
+
+def _ejecutar_comando(parsed: dict) -> str:
+    """Reenvía el comando a todos los workers listos y junta las respuestas."""
+    destinos = [w for w in _workers.values() if w.listo and w.vivo]
+    caidos = sorted(l for l, w in _workers.items() if not (w.listo and w.vivo))
+    if not destinos:
+        return "⚠️ Ningún worker MT5 disponible."
+    cmd_id = next(_cmd_ids)
+    pendiente = {"faltan": {w.login for w in destinos}, "respuestas": {}, "evento": threading.Event()}
+    with _comandos_lock:
+        _comandos[cmd_id] = pendiente
+    for w in destinos:
+        w.inbox.put(("cmd", cmd_id, parsed))
+    pendiente["evento"].wait(COMMAND_TIMEOUT_SEC)
+    with _comandos_lock:
+        _comandos.pop(cmd_id, None)
+        respuestas = dict(pendiente["respuestas"])
+        faltan = sorted(pendiente["faltan"])
+    partes = [f"[{login}]\n{respuestas[login]}" for login in sorted(respuestas)]
+    if faltan:
+        partes.append(f"⏳ Sin respuesta ({COMMAND_TIMEOUT_SEC:.0f}s): {', '.join(faltan)}")
+    if caidos:
+        partes.append(f"⚠️ Workers caídos: {', '.join(caidos)}")
+    return "\n\n".join(partes)
+
+def _registrar_respuesta(cmd_id, login: str, texto: str):
+    with _comandos_lock:
+        pendiente = _comandos.get(cmd_id)
+        if pendiente is None:
+            return  # llegó tarde: el comando ya se respondió por timeout
+        pendiente["respuestas"][login] = texto
+        pendiente["faltan"].discard(login)
+        if not pendiente["faltan"]:
+            pendiente["evento"].set()
+
+
+# ---------------------- WORKERS ----------------------
+def _proceso_worker(login: str, path, inbox, outbox):
+    """Entrada del proceso hijo (spawn): config propia ANTES de importar mt5_executor."""
+    os.environ["JOURNAL_PATH"] = os.path.join(BASE_DIR, f"journal-{login}.db")
+    os.environ["EXPECTED_MT5_LOGIN"] = str(login)
+    # Las métricas las exporta el supervisor; vacío (no pop) para que load_dotenv no las repise
+    os.environ["METRICS_PORT"] = ""
+    os.environ["METRICS_FILE"] = ""
+    try:
+        import mt5_executor
+        mt5_executor.run_worker(login, path, inbox, outbox)
+    except Exception as e:
+        outbox.put(("error", login, f"Worker terminó con error: {e}"))
+        raise
+
+def _lanzar(w: _Worker):
+    w.inbox = _ctx.Queue()
+    w.listo = False
+    w.activo = False
+    w.proc = _ctx.Process(target=_proceso_worker, args=(w.login, w.path, w.inbox, _outbox),
+                          name=f"mt5-{w.login}", daemon=True)
+    w.proc.start()
+    print(f"[SUP] Worker {w.login} lanzado (pid={w.proc.pid}, terminal={w.path or 'default'})")
+
+def _supervisar():
+    """Relanza workers muertos con backoff exponencial."""
+    ahora = time.monotonic()
+    for w in _workers.values():
+        if w.vivo:
+            if w.reinicios and w.listo and ahora - w.listo_desde >= RESTART_RESET_SEC:
+                w.reinicios = 0
+            continue
+        if w.proc is not None and w.proximo_inicio == 0.0:
+            espera = min(RESTART_MAX_SEC, 2 ** w.reinicios)
+            w.reinicios += 1
+            w.proximo_inicio = ahora + espera
+            w.listo = False
+            _soltar_reclamadas(w.login)
+            print(f"[SUP] Worker {w.login} terminó (exit={w.proc.exitcode}); relanzo en {espera:.0f}s")
+            enviar_mensaje_telegram(f"⚠️ [{w.login}] Worker MT5 caído (exit={w.proc.exitcode}); relanzo en {espera:.0f}s")
+            continue
+        if ahora >= w.proximo_inicio:
+            w.proximo_inicio = 0.0
+            _lanzar(w)
+
+def _consumir_outbox():
+    global _forzar_resync
+    while True:
+        try:
+            msg = _outbox.get()
+        except Exception as e:
+            print(f"[SUP] Error leyendo cola de workers: {e}")
+            time.sleep(1)
+            continue
+        kind = msg[0]
+        if kind == "tg":
+            enviar_mensaje_telegram(f"[{msg[1]}] {msg[2]}")
+        elif kind == "reply":
+            _registrar_respuesta(msg[1], msg[2], msg[3])
+        elif kind == "metrics":
+            w = _workers.get(msg[1])
+            if w:
+                w.metricas = msg[2]
+        elif kind == "modo":
+            w = _workers.get(msg[1])
+            if w:
+                w.activo = bool(msg[2])
+                if w.activo:
+                    _forzar_resync = True
+                    _wakeup.notify()
+        elif kind == "ready":
+            w = _workers.get(msg[1])
+            if w:
+                w.listo = True
+                w.listo_desde = time.monotonic()
+                _forzar_resync = True
+                _wakeup.notify()
+            print(f"[SUP] Worker {msg[1]} listo: {msg[2]}")
+        elif kind == "reintentar":
+            if not CLAIM_ORDERS:  # con claim el worker ya la devolvió a 'pending'
+                with _reintentar_lock:
+                    _reintentar.add(msg[2])
+        elif kind == "error":
+            print(f"[SUP] Worker {msg[1]}: {msg[2]}")
+            enviar_mensaje_telegram(f"❌ [{msg[1]}] {msg[2]}")
+
+def _metricas_consolidadas() -> dict:
+    return {
+        "supervisor": metricas.snapshot(),
+        "workers": {login: w.metricas for login, w in sorted(_workers.items())},
+    }
+
+
+# ---------------------- ÓRDENES ----------------------
+def _fetch_pending_orders(logins):
+    """Una sola consulta para todas las cuentas (watermark + resync, o claim)."""
+    global _last_order_id, _loops_since_resync, _forzar_resync
+    # Un worker que recién arranca (o pasa a ON) necesita también sus pendientes viejas
+    full = _forzar_resync or _last_order_id is None or _loops_since_resync >= FULL_RESYNC_EVERY
+    if full:
+        _forzar_resync = False
+        _loops_since_resync = 0
+        if ORDER_MAX_AGE_SEC > 0:
+            n = expirar_ordenes_viejas(logins, ORDER_MAX_AGE_SEC)
+            if n:
+                print(f"[SUP] {n} órdenes pendientes con más de {ORDER_MAX_AGE_SEC}s pasaron a 'expired'")
+    else:
+        _loops_since_resync += 1
+    if CLAIM_ORDERS:
+        if _last_order_id is None:
+            _last_order_id = 0
+        with _reclamadas_lock:
+            en_curso = list(_reclamadas)
+        orders = claim_pending_orders_multi(logins, EXECUTOR_ID, limit=CLAIM_BATCH,
+                                            lease_sec=CLAIM_LEASE_SEC, excluir=en_curso)
+        with _reclamadas_lock:
+            for o in orders:
+                _reclamadas[int(o["id"])] = str(o.get("account_login"))
+        return orders
+    with _reintentar_lock:
+        reintentos = set(_reintentar)
+    if full:
+        orders = get_pending_orders_multi(logins)
+    else:
+        # Con reintentos el watermark baja hasta el más viejo (los workers filtran lo que ya tienen)
+        desde = min(_last_order_id, min(reintentos) - 1) if reintentos else _last_order_id
+        orders = get_pending_orders_multi(logins, after_id=desde)
+    if reintentos:
+        vistos = {o["id"] for o in orders}
+        with _reintentar_lock:
+            _reintentar.difference_update(reintentos - vistos)
+    if orders:
+        _last_order_id = max(_last_order_id or 0, max(int(o["id"]) for o in orders))
+    elif _last_order_id is None:
+        _last_order_id = 0
+    return orders
+
+def _soltar_reclamadas(login: str):
+    """Worker caído: deja de renovar sus leases para que venzan y se vuelvan a reclamar."""
+    with _reclamadas_lock:
+        for oid in [i for i, l in _reclamadas.items() if l == login]:
+            del _reclamadas[oid]
+
+def _renovar_leases_loop():
+    """Heartbeat del claim: renueva el lease de las reclamadas que siguen en 'claimed'."""
+    intervalo = max(1.0, CLAIM_LEASE_SEC / 3.0)
+    while True:
+        time.sleep(intervalo)
+        with _reclamadas_lock:
+            ids = list(_reclamadas)
+        if not ids:
+            continue
+        vigentes = renovar_leases(ids, EXECUTOR_ID, CLAIM_LEASE_SEC)
+        if vigentes is None:
+            continue
+        with _reclamadas_lock:
+            for oid in ids:
+                if oid not in vigentes:
+                    _reclamadas.pop(oid, None)
+
+def _repartir(orders):
+    por_login = defaultdict(list)
+    for o in orders:
+        por_login[str(o.get("account_login"))].append(o)
+    for login, lote in por_login.items():
+        w = _workers.get(login)
+        if w and w.recibe_ordenes:
+            w.inbox.put(("orders", lote))
+        else:
+            _soltar_reclamadas(login)
+    return por_login
+
+
+# ---------------------- MAIN ----------------------
+def _cargar_terminales() -> dict:
+    try:
+        terminales = json.loads(TERMINALS) if TERMINALS.strip() else {}
+    except ValueError as e:
+        print(f"[SUP] TERMINALS inválido: {e}")
+        return {}
+    if not isinstance(terminales, dict):
+        print('[SUP] TERMINALS debe ser un objeto {"login": "ruta terminal64.exe"}')
+        return {}
+    terminales = {str(k): v for k, v in terminales.items()}
+    activas = {str(l) for l in get_active_counts()}
+    if not activas:
+        print("[SUP] counts no devolvió cuentas habilitadas; se lanzan todas las de TERMINALS")
+        return terminales
+    fuera = sorted(set(terminales) - activas)
+    if fuera:
+        print(f"[SUP] Cuentas deshabilitadas en counts (no se lanzan): {fuera}")
+    return {l: p for l, p in terminales.items() if l in activas}
+
+
+def main():
+    global _outbox
+    terminales = _cargar_terminales()
+    if not terminales:
+        print("[CRÍTICO] Sin terminales para supervisar (TERMINALS vacío o sin cuentas habilitadas).")
+        return
+
+    _tg_worker.start()
+    _outbox = _ctx.Queue()
+    for login, path in terminales.items():
+        _workers[login] = _Worker(login, path)
+        _lanzar(_workers[login])
+
+    threading.Thread(target=_consumir_outbox, name="sup-outbox", daemon=True).start()
+    if CLAIM_ORDERS:
+        threading.Thread(target=_renovar_leases_loop, name="claim-lease", daemon=True).start()
+    threading.Thread(target=notificador_activo, daemon=True).start()
+    threading.Thread(target=escuchar_comandos, name="telegram-listener", daemon=True,
+                     args=(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, _ejecutar_comando,
+                           enviar_mensaje_telegram)).start()
+    if METRICS_PORT:
+        try:
+            metricas.exportar_http(METRICS_PORT, fuente=_metricas_consolidadas)
+        except OSError as e:
+            print(f"[METRICS] No se pudo abrir el puerto {METRICS_PORT}: {e}")
+    if METRICS_FILE:
+        metricas.exportar_archivo(METRICS_FILE, METRICS_FILE_SEC, fuente=_metricas_consolidadas)
+    _wakeup.start()
+
+    print(f"[SUP] Supervisando {len(_workers)} cuentas: {', '.join(sorted(_workers))}")
+    try:
+        while True:
+            _supervisar()
+            logins = [l for l, w in _workers.items() if w.recibe_ordenes]
+            if logins:
+                with span("supervisor.fetch"):
+                    orders = _fetch_pending_orders(logins)
+                if orders:
+                    por_login = _repartir(orders)
+                    print(f"[LOG] Órdenes nuevas: " + ", ".join(f"{l}={len(v)}" for l, v in por_login.items()))
+            _wakeup.wait(POLL_INTERVAL_SEC)
+    except KeyboardInterrupt:
+        print("[SUP] Deteniendo workers...")
+        for w in _workers.values():
+            if w.vivo:
+                w.inbox.put(("stop",))
+        for w in _workers.values():
+            if w.proc is not None:
+                w.proc.join(15)
+        _tg_worker.drain(10.0)
+
+
+if __name__ == "__main__":
+    main()
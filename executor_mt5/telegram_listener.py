@@ -0,0 +1,86 @@
+import re
+import time
+
+import requests
+
+AYUDA = ("Comandos:\n/closeall – cerrar TODO\n/close <SIMBOLO> [buy|sell]\n/positions – resumen\n"
+         "/pause – pausar bot\n/resume – reanudar bot\n/status – estado actual\n")
+
+
+def parse_cmd(text: str):
+    """
+    /closeall | /panic
+    /close <SYMBOL>
+    /close <SYMBOL> buy|sell
+    /positions
+    /pause
+    /resume
+    /status
+    /help
+    """
+    text = (text or "").strip()
+    if re.match(r"^/(closeall|panic)\b", text, flags=re.I):
+        return {"cmd": "closeall"}
+    m = re.match(r"^/close\s+([A-Za-z0-9\._-]+)(?:\s+(buy|sell))?\s*$", text, flags=re.I)
+    if m:
+        return {"cmd": "close", "symbol": m.group(1), "side": (m.group(2) or "").lower() or None}
+    if re.match(r"^/positions\b", text, flags=re.I):
+        return {"cmd": "positions"}
+    if re.match(r"^/pause\b", text, flags=re.I):
+        return {"cmd": "pause"}
+    if re.match(r"^/resume\b", text, flags=re.I):
+        return {"cmd": "resume"}
+    if re.match(r"^/status\b", text, flags=re.I):
+        return {"cmd": "status"}
+    if re.match(r"^/help\b", text, flags=re.I):
+        return {"cmd": "help"}
+    return None
+
+
+def _autorizado(chat_id, chat_permitido) -> bool:
+    if not chat_permitido:
+        return True  # si no está seteado, no filtramos (útil para pruebas)
+    return str(chat_id) == str(chat_permitido)
+
+
+def escuchar_comandos(token: str, chat_permitido, handler, responder):
+    """
+    Long-poll de getUpdates. Por cada comando válido del chat permitido llama
+    handler(parsed) -> texto y lo manda con responder(texto). No retorna.
+    Lo usan el executor (un proceso) y el supervisor (un solo listener para todos).
+    """
+    if not token:
+        print("[TG] TELEGRAM_TOKEN no definido; listener desactivado.")
+        return
+    print("[TG] Listener de Telegram iniciado. Comandos: /closeall, /close <SYMBOL> [buy|sell], /positions, /pause, /resume, /status, /help")
+    last_update_id = None
+    url = f"https://api.telegram.org/bot{token}/getUpdates"
+    while True:
+        try:
+            params = {"timeout": 25}
+            if last_update_id is not None:
+                params["offset"] = last_update_id + 1
+            r = requests.get(url, params=params, timeout=35)
+            data = r.json()
+            if not data.get("ok"):
+                time.sleep(2)
+                continue
+            for upd in data.get("result", []):
+                last_update_id = upd.get("update_id", last_update_id)
+                msg = upd.get("message") or upd.get("edited_message")
+                if not msg or "text" not in msg:
+                    continue
+                if not _autorizado(msg.get("chat", {}).get("id"), chat_permitido):
+                    continue
+                parsed = parse_cmd(msg.get("text", ""))
+                if not parsed:
+                    continue
+                if parsed["cmd"] == "help":
+                    responder(AYUDA)
+                    continue
+                texto = handler(parsed)
+                if texto:
+                    responder(texto)
+        except Exception as e:
+            print(f"[TG] Error listener: {e}")
+            time.sleep(3)
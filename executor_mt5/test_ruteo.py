@@ -0,0 +1,132 @@
+# test_ruteo.py
+"""
+Fija el ruteo de señales del executor (_rutear_orden -> posible / take profit /
+entrada / ignorada) contra el que había antes de senales.py (_ref_executor abajo).
+Corre sobre el simulador, sin MT5 ni MySQL:
+
+    python -m pytest executor_mt5/test_ruteo.py -q
+"""
+import os
+import re
+import tempfile
+from types import SimpleNamespace
+
+os.environ["BROKER_BACKEND"] = "sim"
+os.environ.setdefault("JOURNAL_PATH", ":memory:")
+os.environ.setdefault("RECONCILE_STATE_FILE", os.path.join(tempfile.gettempdir(), "test-reconcile.json"))
+os.environ.pop("TELEGRAM_TOKEN", None)
+os.environ.pop("BACKEND_URL", None)
+
+import pytest  # noqa: E402
+
+import mt5_executor as ex  # noqa: E402
+from broker import mt5  # noqa: E402
+from estrategias import _passthrough  # noqa: E402
+
+# Alertas reales de TradingView (mismo corpus que backend/bench_senales.py)
+CORPUS = [
+    "Buy/Compra Normal o Smart",
+    "Sell/Venta Normal o Smart",
+    "BUY/COMPRA NORMAL O SMART",
+    "sell/venta normal o smart",
+    "Posible Buy",
+    "Posible Sell",
+    "POSIBLE BUY",
+    "Take Profit Buy TP1",
+    "Take Profit Buy TP2",
+    "Take Profit Sell TP1",
+    "Take Profit Sell TP3",
+    "TAKE PROFIT LONG",
+    "TAKE PROFIT SHORT TP4",
+    "Compra Normal o Smart",
+    "Venta  normal  o  smart",
+    "buy",
+    "sell",
+]
+
+# Avisos con texto de más: antes los `in` los reconocían igual
+SUFIJOS = [
+    "Posible Buy XAUUSD",
+    "POSIBLE SELL 15m",
+    "Take Profit Buy TP2 alcanzado",
+    "TAKE PROFIT SELL (TP3)",
+    "Take Profit TP2 Buy",
+]
+
+# Lo que la gramática no reconoce: antes abría una entrada, ahora se ignora
+DESCONOCIDAS = ["TP2 Buy", "TP3 Sell", "tp1", "Alerta custom 1 up", ""]
+
+# Diferencias buscadas con el ruteo viejo (texto -> motivo)
+_CAMBIOS = {
+    # el executor viejo decidía el lado por el substring "buy": una compra salía como sell
+    "Compra Normal o Smart": "lado en español",
+}
+
+
+def _ref_executor(order_type: str):
+    """Ruteo del executor antes de senales.py (_rutear_orden + ejecutar_orden)."""
+    t = order_type.upper()
+    if "POSIBLE BUY" in t or "POSIBLE SELL" in t:
+        return ("posible",)
+    if "TAKE PROFIT" in t:
+        side = "buy" if ("BUY" in t or "LONG" in t) else "sell"
+        m = re.search(r'(?:TAKE\s*PROFIT|TP)\s*(\d+)', t)
+        return ("take_profit", side, int(m.group(1)) if m else 1)
+    return ("entry", "buy" if "buy" in order_type.lower() else "sell")
+
+
+class _Alto(Exception):
+    """Corta ejecutar_orden apenas decidió el lado (antes de tocar posiciones)."""
+
+
+@pytest.fixture
+def rutear(monkeypatch):
+    """Rutea una orden por _rutear_orden real y devuelve qué hizo con ella."""
+    hechos = []
+
+    def _mover_sl(symbol_mt5, side, tps, tp_index=1):
+        hechos.append(("take_profit", side, tp_index))
+        return {"resultados": [], "posiciones": 0, "enviadas": 0, "omitidas": [], "ms_total": 0.0}
+
+    def _aplanar(symbol_mt5, tipo=None):
+        hechos.append(("entry", "buy" if tipo == mt5.POSITION_TYPE_SELL else "sell"))
+        raise _Alto()
+
+    def _estado(order_id, account_login, status):
+        if status == "informativa":
+            hechos.append(("informativa",))
+
+    monkeypatch.setattr(ex, "_modo", SimpleNamespace(activo=True))
+    monkeypatch.setattr(ex, "_estrategia", _passthrough)
+    monkeypatch.setattr(ex, "registrar_estado_orden", _estado)
+    monkeypatch.setattr(ex, "_finalizar_orden", lambda order_id, reintentar=False: None)
+    monkeypatch.setattr(ex, "enviar_mensaje_telegram", lambda texto: None)
+    monkeypatch.setattr(ex, "mover_sl_en_take_profit_lote", _mover_sl)
+    monkeypatch.setattr(ex, "aplanar_simbolo", _aplanar)
+    monkeypatch.setattr(ex._lanes, "submit", lambda key, fn, *args: fn(*args))
+
+    def _rutear(texto):
+        hechos.clear()
+        try:
+            ex._rutear_orden({"id": 1, "symbol": "XAUUSD", "order_type": texto, "price": 2400.0}, "1")
+        except _Alto:
+            pass
+        return hechos[0]
+    return _rutear
+
+
+@pytest.mark.parametrize("texto", [t for t in CORPUS + SUFIJOS if t not in _CAMBIOS])
+def test_ruteo_como_antes(rutear, texto):
+    esperado = _ref_executor(texto)
+    if esperado == ("posible",):
+        esperado = ("informativa",)
+    assert rutear(texto) == esperado
+
+
+@pytest.mark.parametrize("texto", DESCONOCIDAS)
+def test_desconocidas_no_abren_posicion(rutear, texto):
+    assert rutear(texto) == ("informativa",)
+
+
+def test_compra_en_espanol_compra(rutear):
+    assert rutear("Compra Normal o Smart") == ("entry", "buy")
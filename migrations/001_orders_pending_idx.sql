@@ -0,0 +1,9 @@
+-- 001: índice compuesto para el fetch de órdenes pendientes por cuenta.
+-- Sirve tanto el filtro (account_login, status) como el ORDER BY id y el
+-- fetch incremental "id > watermark" de get_pending_orders, sin escanear
+-- el histórico de la tabla orders.
+--
+-- Aplicar una vez:  mysql -h $MYSQL_HOST -u $MYSQL_USER -p $MYSQL_DATABASE < 001_orders_pending_idx.sql
+
+ALTER TABLE orders
+    ADD INDEX idx_orders_acc_status_id (account_login, status, id);
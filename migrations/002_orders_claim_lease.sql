@@ -0,0 +1,10 @@
+-- 002: columnas para el "claim" atómico de órdenes (claim_pending_orders en executor_mt5/db.py).
+-- Un executor pasa las órdenes de 'pending' a 'claimed' con su id y un lease;
+-- si el lease vence sin que la orden llegue a un estado final, otro executor la reclama.
+-- Requiere MySQL 8.0+ (SELECT ... FOR UPDATE SKIP LOCKED).
+--
+-- Si orders.status es ENUM, agregar también el valor 'claimed' al ENUM.
+
+ALTER TABLE orders
+    ADD COLUMN claimed_by VARCHAR(64) NULL,
+    ADD COLUMN lease_expires_at DATETIME NULL;
@@ -0,0 +1,7 @@
+-- 003: idempotency key para el journal write-behind del executor (executor_mt5/journal.py).
+-- Si un lote se aplica en MySQL pero el ACK se pierde, el replay del journal
+-- no duplica filas en trades_log gracias al UNIQUE sobre journal_key.
+
+ALTER TABLE trades_log
+    ADD COLUMN journal_key VARCHAR(64) NULL,
+    ADD UNIQUE INDEX uq_trades_log_journal_key (journal_key);
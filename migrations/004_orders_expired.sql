@@ -0,0 +1,11 @@
+-- 004: estado 'expired' para el backlog viejo (expirar_ordenes_viejas en executor_mt5/db.py).
+-- Con ORDER_MAX_AGE_SEC > 0 el executor/supervisor pasa a 'expired', en una sola
+-- sentencia, las órdenes 'pending' con created_at más viejo que ese límite.
+-- Usa el índice (account_login, status, id) de 001 para el filtro.
+--
+-- Solo hace falta si orders.status es ENUM (si es VARCHAR no hay nada que migrar).
+-- Agregar 'expired' a la lista actual de valores, por ejemplo:
+
+-- ALTER TABLE orders
+--     MODIFY COLUMN status ENUM('pending', 'claimed', 'executed', 'take_profit',
+--                               'informativa', 'symbol_off', 'expired') NOT NULL DEFAULT 'pending';
@@ -0,0 +1,32 @@
+-- 005: resúmenes de trades_log ya agregados (rollups.py en backend/ y executor_mt5/).
+-- Una fila por (día de apertura, cuenta, símbolo, lado). Cada escritura a trades_log
+-- recalcula solo sus grupos en la misma transacción; GET /analytics del backend lee de acá.
+
+CREATE TABLE IF NOT EXISTS trades_rollup (
+    dia           DATE          NOT NULL,
+    account_login VARCHAR(32)   NOT NULL DEFAULT '',
+    symbol        VARCHAR(32)   NOT NULL,
+    side          VARCHAR(8)    NOT NULL,
+    trades        INT           NOT NULL DEFAULT 0,
+    fallidas      INT           NOT NULL DEFAULT 0,
+    abiertas      INT           NOT NULL DEFAULT 0,
+    cerradas      INT           NOT NULL DEFAULT 0,
+    ganadoras     INT           NOT NULL DEFAULT 0,
+    volumen       DOUBLE        NOT NULL DEFAULT 0,
+    pnl           DOUBLE        NOT NULL DEFAULT 0,
+    pnl_pct       DOUBLE        NOT NULL DEFAULT 0,
+    slippage_pct  DOUBLE        NOT NULL DEFAULT 0,
+    slippage_n    INT           NOT NULL DEFAULT 0,
+    actualizado   DATETIME      NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (dia, account_login, symbol, side),
+    KEY idx_trades_rollup_symbol (symbol, dia)
+);
+
+-- Para recalcular solo los grupos tocados sin recorrer trades_log entero
+ALTER TABLE trades_log
+    ADD INDEX idx_trades_log_open_time (open_time, symbol, side),
+    ADD INDEX idx_trades_log_ticket (ticket),
+    ADD INDEX idx_trades_log_order_id (order_id);
+
+-- Carga inicial con el histórico existente (después, rollups.refrescar_rollups la mantiene):
+--   python -c "import db, rollups; c = db.get_db(); cur = c.cursor(); rollups.refrescar_rollups(cur, todo=True); c.commit()"
@@ -0,0 +1,6 @@
+-- 006: índice para el reconciliador (executor_mt5/reconciliador.py).
+-- get_open_tickets() lee en cada pasada los tickets con status='open' de la cuenta;
+-- con este índice no recorre los trades ya cerrados, que son casi toda la tabla.
+
+ALTER TABLE trades_log
+    ADD INDEX idx_trades_log_status_ticket (status, ticket, order_id);